@@ -0,0 +1,187 @@
+"""
+Service-layer micro-benchmarks at production data scale
+
+pytest-benchmark suite for the hot UserService, BalanceService and
+TransactionService calls against a database seeded with BENCH_SCALE users
+and transactions:
+
+    small    10k users,  1M transactions (default)
+    medium  100k users,  3M transactions
+    large     1M users, 10M transactions
+
+Seeded databases are cached in .bench-data/ (seeding the large scale takes
+a few minutes) and copied to a temporary file for each run, so writes made
+by the benchmarks never leak into the cache. The file name doesn't match
+test_*.py, so the regular test run doesn't pick it up.
+
+Usage:
+    make bench-services-baseline     # store a baseline in .benchmarks/
+    make bench-services              # compare against the latest baseline
+    BENCH_SCALE=large python -m pytest benchmarks/bench_services.py --benchmark-only
+"""
+
+import os
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.models.database import Database, init_database
+from bot.services.balance_service import BalanceService
+
+SCALES = {
+    "small": (10_000, 1_000_000),
+    "medium": (100_000, 3_000_000),
+    "large": (1_000_000, 10_000_000)
+}
+
+SCALE = os.getenv("BENCH_SCALE", "small")
+CACHE_DIR = Path(__file__).parent.parent / ".bench-data"
+SEED = 1
+BATCH = 50_000
+GROUPS = 200
+
+
+def seed_database(path: Path, users: int, transactions: int):
+    """Create a database with `users` users and `transactions` transfers"""
+    rng = random.Random(SEED)
+    db = Database(str(path))
+    init_database(db)
+
+    with db.transaction():
+        db.executemany(
+            "INSERT INTO users (telegram_user_id, username, first_name, last_name, balance) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (100_000 + i, f"user{i}" if i % 10 else None, f"First{i}", f"Last{i}", 1e6)
+                for i in range(1, users + 1)
+            )
+        )
+
+    # Spread transfers over the last year so created_at ordering is realistic
+    start = time.time() - 365 * 86400
+    step = 365 * 86400 / transactions
+    for offset in range(0, transactions, BATCH):
+        rows = []
+        for i in range(offset, min(offset + BATCH, transactions)):
+            from_id = rng.randint(1, users)
+            to_id = rng.randint(1, users - 1)
+            to_id += to_id >= from_id
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + i * step))
+            rows.append((from_id, to_id, rng.randint(1, 100), 1e6, 1e6, i, -1000 - i % GROUPS, created))
+        with db.transaction():
+            db.executemany(
+                "INSERT INTO transactions "
+                "(from_user_id, to_user_id, amount, balance_from, balance_to, message_id, group_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    db.execute("ANALYZE")
+    db.close()
+
+
+def cached_database(scale: str) -> Path:
+    """Path of the seeded database for a scale, seeding it on first use"""
+    users, transactions = SCALES[scale]
+    path = CACHE_DIR / f"services_{scale}.db"
+    if not path.exists():
+        CACHE_DIR.mkdir(exist_ok=True)
+        partial = path.with_suffix(".partial")
+        partial.unlink(missing_ok=True)
+        seed_database(partial, users, transactions)
+        partial.rename(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def services(tmp_path_factory):
+    """BalanceService over a private copy of the seeded database"""
+    path = tmp_path_factory.mktemp("bench") / "services.db"
+    shutil.copyfile(cached_database(SCALE), path)
+    db = Database(str(path))
+    init_database(db)
+    yield BalanceService(db)
+    db.close()
+
+
+@pytest.fixture
+def rng():
+    return random.Random(SEED)
+
+
+def user_count() -> int:
+    return SCALES[SCALE][0]
+
+
+def test_get_or_create_existing_user(benchmark, services, rng):
+    user_service = services.user_service
+
+    def run():
+        i = rng.randint(1, user_count())
+        username = f"user{i}" if i % 10 else None
+        return user_service.get_or_create_user(100_000 + i, username, f"First{i}", f"Last{i}")
+
+    assert benchmark(run) is not None
+
+
+def test_get_or_create_new_user(benchmark, services):
+    user_service = services.user_service
+    ids = iter(range(10_000_000, 20_000_000))
+
+    def run():
+        telegram_id = next(ids)
+        return user_service.get_or_create_user(telegram_id, f"new{telegram_id}", "New")
+
+    assert benchmark(run) is not None
+
+
+def test_get_by_username(benchmark, services, rng):
+    user_service = services.user_service
+
+    def run():
+        return user_service.get_by_username(f"@user{rng.randrange(user_count() // 10) * 10 + 1}")
+
+    assert benchmark(run) is not None
+
+
+def test_get_by_username_name_fallback(benchmark, services):
+    # Users without a username are found by first name after the exact lookup misses
+    user = benchmark(services.user_service.get_by_username, f"First{user_count()}")
+    assert user is not None
+
+
+def test_get_all_users(benchmark, services):
+    users = benchmark.pedantic(services.user_service.get_all, rounds=3, iterations=1)
+    assert len(users) >= user_count()
+
+
+def test_transfer_by_user_id(benchmark, services, rng):
+    message_ids = iter(range(100_000_000, 200_000_000))
+
+    def run():
+        from_id = rng.randint(1, user_count())
+        to_id = from_id % user_count() + 1
+        return services.transfer_by_user_id(from_id, to_id, 1.0, message_id=next(message_ids), group_id=-1)
+
+    assert benchmark(run).success
+
+
+def test_get_recent_transactions(benchmark, services):
+    transactions = benchmark(services.transaction_service.get_recent, 10)
+    assert len(transactions) == 10
+
+
+def test_get_transactions_by_user(benchmark, services, rng):
+    def run():
+        return services.transaction_service.get_by_user(rng.randint(1, user_count()), 10)
+
+    assert benchmark(run)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Concurrent update processing benchmark
+
+Feeds synthetic group updates through ChatOrderedUpdateProcessor the way
+Application does and measures throughput as the number of active groups
+grows. Each update simulates one LLM call (a blocking sleep run in the
+default executor, like GroupHandlers does) followed by a real transfer
+against a temporary SQLite database. Per-chat ordering is verified.
+
+Usage:
+    python benchmarks/concurrency_benchmark.py
+    python benchmarks/concurrency_benchmark.py --groups 1 4 16 64 --llm-ms 200 --json out.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from telegram import Chat, Message, Update
+from bot.models.database import Database, init_database
+from bot.services.balance_service import BalanceService
+from bot.utils.update_processor import ChatOrderedUpdateProcessor
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    """Build a minimal group message update"""
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP)
+    message = Message(message_id=update_id, date=None, chat=chat, text="sent $1 to @bob")
+    return Update(update_id=update_id, message=message)
+
+
+async def run(groups: int, args, db_dir: str) -> Dict:
+    """Process args.updates updates spread over `groups` chats"""
+    db = Database(str(Path(db_dir) / f"bench_{groups}.db"))
+    init_database(db)
+    balance_service = BalanceService(db, default_balance=1e9)
+    alice = balance_service.user_service.get_or_create_user(1, "alice")
+    bob = balance_service.user_service.get_or_create_user(2, "bob")
+
+    processor = ChatOrderedUpdateProcessor(args.concurrency, max(args.concurrency, args.updates))
+    await processor.initialize()
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.concurrency))
+    order: Dict[int, List[int]] = {}
+
+    async def handle(update: Update):
+        # Blocking LLM call in a worker thread, then the DB transfer
+        await loop.run_in_executor(None, time.sleep, args.llm_ms / 1000)
+        balance_service.transfer_by_user_id(
+            alice.id, bob.id, 1.0,
+            message_id=update.update_id,
+            group_id=update.effective_chat.id
+        )
+        order.setdefault(update.effective_chat.id, []).append(update.update_id)
+
+    updates = [make_update(i, -1000 - i % groups) for i in range(args.updates)]
+
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        asyncio.ensure_future(processor.process_update(update, handle(update)))
+        for update in updates
+    ])
+    elapsed = time.perf_counter() - started
+
+    await processor.shutdown()
+    db.close()
+
+    ordered = all(ids == sorted(ids) for ids in order.values())
+    return {
+        "groups": groups,
+        "updates": args.updates,
+        "concurrency": args.concurrency,
+        "llm_ms": args.llm_ms,
+        "seconds": round(elapsed, 3),
+        "throughput_per_s": round(args.updates / elapsed, 1),
+        "ordered_per_chat": ordered
+    }
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark concurrent update processing")
+    parser.add_argument("--groups", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--updates", type=int, default=256, help="Updates per run")
+    parser.add_argument("--concurrency", type=int, default=16, help="Global concurrency cap")
+    parser.add_argument("--llm-ms", type=float, default=50, help="Simulated LLM latency")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as db_dir:
+        for groups in args.groups:
+            result = asyncio.run(run(groups, args, db_dir))
+            results.append(result)
+            print(
+                f"groups={groups:>4}: {result['throughput_per_s']:>8.1f} updates/s "
+                f"({result['seconds']:.2f}s, ordered={result['ordered_per_chat']})"
+            )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Update ingest benchmark: webhook vs long polling
+
+Runs a real python-telegram-bot Application against a local stub of the
+Telegram Bot API and measures how fast synthetic updates reach a handler.
+
+- polling: updates are queued in the stub and fetched with getUpdates
+- webhook: updates are POSTed to PTB's built-in webhook server
+
+--rtt-ms adds an artificial delay to every stub API response to model the
+round trip to api.telegram.org that each getUpdates call pays in production.
+The webhook client shares the event loop with the bot, so burst (--rate 0)
+webhook throughput is bounded by the client; paced runs compare latency.
+
+Usage:
+    python benchmarks/ingest_benchmark.py --updates 2000 --rtt-ms 50
+    python benchmarks/ingest_benchmark.py --mode webhook --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import parse_qs
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+TOKEN = "123456:BENCHMARK"
+SECRET_TOKEN = "benchmark-secret"
+
+
+def free_port() -> int:
+    """Find a free local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def make_update(update_id: int, groups: int, users: int) -> Dict:
+    """Build a synthetic group text message update"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": -1000 - (update_id % groups), "type": "supergroup", "title": "Bench"},
+            "from": {"id": 1000 + (update_id % users), "is_bot": False, "first_name": "User"},
+            "text": f"hello {update_id}"
+        }
+    }
+
+
+class StubBotAPI:
+    """Minimal Bot API server supporting the methods PTB needs to start"""
+
+    def __init__(self, rtt_ms: float = 0.0):
+        self.rtt = rtt_ms / 1000
+        self.port = free_port()
+        self._pending: List[Dict] = []
+        self._cond = threading.Condition()
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._cond.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push(self, update: Dict):
+        """Queue an update for getUpdates"""
+        with self._cond:
+            self._pending.append(update)
+            self._cond.notify_all()
+
+    def get_updates(self, offset: int, limit: int, timeout: float) -> List[Dict]:
+        """Long-poll for updates with update_id >= offset"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._pending = [u for u in self._pending if u["update_id"] >= offset]
+            while not self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                self._pending = [u for u in self._pending if u["update_id"] >= offset]
+            return self._pending[:limit]
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode() if length else ""
+                params = {k: v[0] for k, v in parse_qs(body).items()}
+
+                if method == "getMe":
+                    result = {
+                        "id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+                        "can_join_groups": True, "can_read_all_group_messages": True,
+                        "supports_inline_queries": False
+                    }
+                elif method == "getUpdates":
+                    result = api.get_updates(
+                        int(params.get("offset", 0)),
+                        int(params.get("limit", 100)),
+                        float(params.get("timeout", 0))
+                    )
+                else:
+                    result = True
+
+                if api.rtt:
+                    time.sleep(api.rtt)
+
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+class Recorder:
+    """Records when each update reaches the handler"""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.received: Dict[int, float] = {}
+        self.done = asyncio.Event()
+
+    async def __call__(self, update: Update, context):
+        self.received[update.update_id] = time.perf_counter()
+        if len(self.received) >= self.expected:
+            self.done.set()
+
+
+async def run_mode(mode: str, args) -> Dict:
+    """Run one benchmark mode and return its results"""
+    stub = StubBotAPI(args.rtt_ms)
+    stub.start()
+
+    recorder = Recorder(args.updates)
+    application = Application.builder().token(TOKEN).base_url(stub.base_url).build()
+    application.add_handler(TypeHandler(Update, recorder))
+
+    await application.initialize()
+    await application.start()
+
+    webhook_port = free_port()
+    if mode == "polling":
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+    else:
+        await application.updater.start_webhook(
+            listen="127.0.0.1",
+            port=webhook_port,
+            url_path="telegram",
+            webhook_url=f"http://127.0.0.1:{webhook_port}/telegram",
+            secret_token=SECRET_TOKEN,
+            max_connections=args.concurrency
+        )
+
+    sent: Dict[int, float] = {}
+    updates = [make_update(i, args.groups, args.users) for i in range(1, args.updates + 1)]
+    interval = 1 / args.rate if args.rate else 0
+
+    started = time.perf_counter()
+    if mode == "polling":
+        for update in updates:
+            sent[update["update_id"]] = time.perf_counter()
+            stub.push(update)
+            if interval:
+                await asyncio.sleep(interval)
+    else:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        url = f"http://127.0.0.1:{webhook_port}/telegram"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET_TOKEN}
+
+        async with httpx.AsyncClient() as client:
+            async def post(update):
+                async with semaphore:
+                    sent[update["update_id"]] = time.perf_counter()
+                    response = await client.post(url, json=update, headers=headers)
+                    response.raise_for_status()
+
+            tasks = []
+            for update in updates:
+                tasks.append(asyncio.ensure_future(post(update)))
+                if interval:
+                    await asyncio.sleep(interval)
+            await asyncio.gather(*tasks)
+
+    await asyncio.wait_for(recorder.done.wait(), timeout=args.timeout)
+    finished = max(recorder.received.values())
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    stub.stop()
+
+    latencies = [(recorder.received[uid] - sent[uid]) * 1000 for uid in sent]
+    return {
+        "mode": mode,
+        "updates": args.updates,
+        "rtt_ms": args.rtt_ms,
+        "rate": args.rate,
+        "throughput_per_s": round(args.updates / (finished - started), 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2)
+        }
+    }
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark webhook vs polling ingest")
+    parser.add_argument("--mode", choices=["polling", "webhook", "both"], default="both")
+    parser.add_argument("--updates", type=int, default=1000, help="Number of updates to send")
+    parser.add_argument("--rate", type=float, default=0, help="Updates per second (0 = burst)")
+    parser.add_argument("--rtt-ms", type=float, default=0, help="Simulated Bot API round trip")
+    parser.add_argument("--concurrency", type=int, default=40, help="Concurrent webhook posts")
+    parser.add_argument("--groups", type=int, default=10, help="Distinct chats in updates")
+    parser.add_argument("--users", type=int, default=50, help="Distinct senders in updates")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait per mode")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    modes = ["polling", "webhook"] if args.mode == "both" else [args.mode]
+
+    results = [asyncio.run(run_mode(mode, args)) for mode in modes]
+
+    for result in results:
+        latency = result["latency_ms"]
+        print(
+            f"{result['mode']:>8}: {result['throughput_per_s']:>9.1f} updates/s  "
+            f"p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms "
+            f"p99={latency['p99']:.2f}ms max={latency['max']:.2f}ms"
+        )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
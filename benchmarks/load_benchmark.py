@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+End-to-end group traffic load benchmark
+
+Generates synthetic group messages for --groups groups of --users members
+with a --transfer-ratio mix of transfer announcements and chatter, and
+drives the real GroupHandlers.handle_group_message against a temporary
+SQLite database. Updates are dispatched through ChatOrderedUpdateProcessor
+like Application does. The AI backend is a stub that recognises
+"sent $X to @user" and sleeps --llm-ms per call (in the default executor,
+like the real blocking client); replies are captured by a stub bot.
+
+Reports throughput, p50/p95/p99 latency (arrival to handler completion)
+and database growth. --json writes the results (with the git commit) and
+--baseline compares against a previous results file, exiting non-zero if
+throughput dropped or p95 latency grew by more than --max-regression.
+
+Usage:
+    python benchmarks/load_benchmark.py
+    python benchmarks/load_benchmark.py --groups 50 --users 20 --messages 5000 --rate 200
+    python benchmarks/load_benchmark.py --json after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from telegram import Chat, Message, Update, User
+from bot.models.database import Database, init_database
+from bot.services.ai_service import TransferDetection
+from bot.services.balance_service import BalanceService
+from bot.handlers.group_handlers import GroupHandlers
+from bot.utils.update_processor import ChatOrderedUpdateProcessor
+
+CHATTER = [
+    "good morning everyone",
+    "who is coming tonight?",
+    "lol",
+    "I'll be there in 10 minutes",
+    "can someone send me the address",
+    "thanks for dinner yesterday!",
+    "should I send you 20 for the tickets?",
+    "see you all on saturday"
+]
+
+TRANSFER = re.compile(r"sent \$(\d+(?:\.\d+)?) to @(\w+)")
+
+
+class StubAI:
+    """Rule-based stand-in for AIService with a fixed per-call latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def detect_transfer(self, message: str, sender_username: str = None, sender_first_name: str = None, group_id=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        match = TRANSFER.search(message)
+        if not match:
+            return TransferDetection(is_transfer=False, confidence=0.95, reasoning="chatter")
+        return TransferDetection(
+            is_transfer=True,
+            from_username=sender_username,
+            to_username=match.group(2),
+            amount=float(match.group(1)),
+            confidence=0.95,
+            reasoning="matched"
+        )
+
+    def generate_confirmation_message(self, from_user_display, to_user_display, amount, from_balance, to_balance, group_id=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"✅ ${amount:.2f} from {from_user_display} to {to_user_display}"
+
+
+class CapturingBot:
+    """Stand-in for telegram.Bot that records outgoing messages"""
+
+    def __init__(self):
+        self.sent: List[tuple] = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+class TrafficGenerator:
+    """Builds group message updates with a configurable chatter/transfer mix"""
+
+    def __init__(self, groups: int, users: int, transfer_ratio: float, bot: CapturingBot, seed: int = 1):
+        self.groups = groups
+        self.users = users
+        self.transfer_ratio = transfer_ratio
+        self.bot = bot
+        self.random = random.Random(seed)
+        self.update_id = 0
+
+    def _user(self, group: int, member: int) -> User:
+        user_id = group * 1000 + member + 1
+        return User(id=user_id, first_name=f"user{user_id}", username=f"user{user_id}", is_bot=False)
+
+    def message(self, group: int, member: int, text: str) -> Update:
+        self.update_id += 1
+        chat = Chat(id=-1000 - group, type=Chat.SUPERGROUP)
+        message = Message(
+            message_id=self.update_id,
+            date=datetime.now(timezone.utc),
+            chat=chat,
+            from_user=self._user(group, member),
+            text=text
+        )
+        message.set_bot(self.bot)
+        return Update(update_id=self.update_id, message=message)
+
+    def warmup(self) -> List[Update]:
+        """One message from every member so all of them are registered"""
+        return [
+            self.message(group, member, "hi")
+            for group in range(self.groups)
+            for member in range(self.users)
+        ]
+
+    def next(self) -> Update:
+        group = self.random.randrange(self.groups)
+        member = self.random.randrange(self.users)
+        if self.users > 1 and self.random.random() < self.transfer_ratio:
+            other = self.random.choice([m for m in range(self.users) if m != member])
+            amount = self.random.randint(1, 50)
+            text = f"sent ${amount} to @{self._user(group, other).username}"
+        else:
+            text = self.random.choice(CHATTER)
+        return self.message(group, member, text)
+
+
+def db_size(path: Path) -> int:
+    """Size of a SQLite database including its WAL file"""
+    return sum(p.stat().st_size for p in (path, Path(f"{path}-wal")) if p.exists())
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, db_path: Path) -> Dict:
+    db = Database(str(db_path))
+    init_database(db)
+    balance_service = BalanceService(db, default_balance=1e6)
+    ai = StubAI(args.llm_ms / 1000)
+    bot = CapturingBot()
+    handlers = GroupHandlers(ai, balance_service, balance_service.user_service)
+    traffic = TrafficGenerator(args.groups, args.users, args.transfer_ratio, bot, args.seed)
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.concurrency))
+    processor = ChatOrderedUpdateProcessor(args.concurrency, max(args.concurrency, args.messages))
+    await processor.initialize()
+
+    for update in traffic.warmup():
+        await handlers.handle_group_message(update, None)
+    size_before = db_size(db_path)
+    llm_calls_before = ai.calls
+    replies_before = len(bot.sent)
+
+    latencies: List[float] = []
+
+    async def handle(update: Update, arrived: float):
+        await handlers.handle_group_message(update, None)
+        latencies.append(time.perf_counter() - arrived)
+
+    interval = 1 / args.rate if args.rate else 0
+    tasks = []
+    started = time.perf_counter()
+    for i in range(args.messages):
+        if interval:
+            delay = started + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = traffic.next()
+        arrived = time.perf_counter()
+        tasks.append(asyncio.ensure_future(processor.process_update(update, handle(update, arrived))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    await processor.shutdown()
+    transfers = balance_service.transaction_service.get_count()
+    db.close()
+    size_after = db_size(db_path)
+
+    return {
+        "commit": git_commit(),
+        "groups": args.groups,
+        "users": args.users,
+        "messages": args.messages,
+        "transfer_ratio": args.transfer_ratio,
+        "rate": args.rate,
+        "concurrency": args.concurrency,
+        "llm_ms": args.llm_ms,
+        "seconds": round(elapsed, 3),
+        "throughput_per_s": round(args.messages / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(max(latencies, default=0) * 1000, 2)
+        },
+        "transfers": transfers,
+        "replies": len(bot.sent) - replies_before,
+        "llm_calls": ai.calls - llm_calls_before,
+        "db_bytes_before": size_before,
+        "db_bytes_after": size_after,
+        "db_bytes_per_message": round((size_after - size_before) / args.messages, 1)
+    }
+
+
+def compare(result: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Describe regressions of result against a baseline (empty if none)"""
+    problems = []
+    if result["throughput_per_s"] < baseline["throughput_per_s"] * (1 - max_regression):
+        problems.append(
+            f"throughput {result['throughput_per_s']}/s vs {baseline['throughput_per_s']}/s "
+            f"(baseline {baseline.get('commit')})"
+        )
+    if result["latency_ms"]["p95"] > baseline["latency_ms"]["p95"] * (1 + max_regression):
+        problems.append(
+            f"p95 latency {result['latency_ms']['p95']} ms vs {baseline['latency_ms']['p95']} ms "
+            f"(baseline {baseline.get('commit')})"
+        )
+    return problems
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="End-to-end group traffic benchmark")
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--users", type=int, default=10, help="Members per group")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--transfer-ratio", type=float, default=0.2, help="Share of messages that are transfers")
+    parser.add_argument("--rate", type=float, default=0, help="Messages per second (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent updates (CONCURRENT_UPDATES)")
+    parser.add_argument("--llm-ms", type=float, default=20, help="Stub LLM latency per call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Previous --json results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="Allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        result = asyncio.run(run(args, Path(db_dir) / "load.db"))
+
+    latency = result["latency_ms"]
+    print(
+        f"{result['messages']} messages in {result['seconds']:.2f}s: "
+        f"{result['throughput_per_s']:.1f} msg/s\n"
+        f"latency p50={latency['p50']} ms p95={latency['p95']} ms p99={latency['p99']} ms max={latency['max']} ms\n"
+        f"transfers={result['transfers']} replies={result['replies']} llm_calls={result['llm_calls']}\n"
+        f"db growth: {result['db_bytes_after'] - result['db_bytes_before']} bytes "
+        f"({result['db_bytes_per_message']} per message)"
+    )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(result, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
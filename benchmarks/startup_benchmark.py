@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark
+
+Measures what a container restart pays before the bot is ready:
+
+- import: `python -X importtime -c "import bot.main"` in fresh interpreters
+  (median of --runs); prints the slowest modules by cumulative time
+- schema: init_database on a new file vs. an existing one (the second
+  run is skipped by the PRAGMA user_version check)
+- construct: BotService(config) against an existing database
+
+Usage:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 10 --top 20 --json out.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).parent.parent
+
+# Add project root to path
+sys.path.insert(0, str(ROOT))
+
+
+def import_profile(module: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Import a module in a fresh interpreter with -X importtime
+    
+    Returns:
+        (total microseconds, [(module, self_us, cumulative_us), ...])
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        check=True
+    )
+    
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    
+    total = next(cumulative for name, _, cumulative in entries if name == module)
+    return total, entries
+
+
+def bench_imports(args) -> Dict:
+    totals = []
+    entries = []
+    for _ in range(args.runs):
+        total, entries = import_profile(args.module)
+        totals.append(total)
+    
+    slowest = sorted(entries, key=lambda entry: entry[2], reverse=True)
+    top = [
+        {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+        for name, self_us, cumulative_us in slowest[:args.top]
+    ]
+    return {
+        "module": args.module,
+        "runs": args.runs,
+        "median_ms": statistics.median(totals) / 1000,
+        "min_ms": min(totals) / 1000,
+        "top": top
+    }
+
+
+def bench_schema(db_dir: str) -> Dict:
+    from bot.models.database import Database, init_database
+    
+    db = Database(str(Path(db_dir) / "schema.db"))
+    started = time.perf_counter()
+    init_database(db)
+    cold = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    init_database(db)
+    warm = time.perf_counter() - started
+    db.close()
+    
+    return {"new_database_ms": cold * 1000, "existing_database_ms": warm * 1000}
+
+
+def bench_construct(db_dir: str) -> Dict:
+    from bot.utils.config import BotConfig
+    from bot.services.bot_service import BotService
+    
+    config = BotConfig(
+        token="123456:BENCHMARK",
+        mistral_api_key="benchmark",
+        database_url=str(Path(db_dir) / "bot.db"),
+        log_file=str(Path(db_dir) / "bot.log")
+    )
+    BotService(config).db.close()  # Creates the schema
+    
+    started = time.perf_counter()
+    service = BotService(config)
+    elapsed = time.perf_counter() - started
+    service.db.close()
+    return {"bot_service_ms": elapsed * 1000, "ai_enabled": service.ai_service is not None}
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark bot cold start")
+    parser.add_argument("--module", default="bot.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    
+    imports = bench_imports(args)
+    print(f"import {imports['module']}: median {imports['median_ms']:.1f} ms, "
+          f"min {imports['min_ms']:.1f} ms ({imports['runs']} runs)")
+    for entry in imports["top"]:
+        print(f"  {entry['cumulative_ms']:>8.1f} ms  {entry['module']}")
+    
+    with tempfile.TemporaryDirectory() as db_dir:
+        schema = bench_schema(db_dir)
+        construct = bench_construct(db_dir)
+    print(f"init_database: new {schema['new_database_ms']:.2f} ms, "
+          f"existing {schema['existing_database_ms']:.2f} ms")
+    print(f"BotService(): {construct['bot_service_ms']:.1f} ms (AI enabled: {construct['ai_enabled']})")
+    
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"imports": imports, "schema": schema, "construct": construct}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Ledger export command line entry point
+
+Usage:
+    python -m bot.export ledger.csv
+    python -m bot.export --format jsonl --gzip ledger.jsonl.gz
+    python -m bot.export --group-id -1001234567890 - > group.csv
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.models.database import Database
+from bot.services.export_service import ExportService
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Export the transaction ledger")
+    parser.add_argument("output", help="Output file path, or '-' for stdout")
+    parser.add_argument(
+        "--format",
+        choices=ExportService.FORMATS,
+        default="csv",
+        help="Output format (default: csv)"
+    )
+    parser.add_argument("--gzip", action="store_true", help="Gzip-compress the output")
+    parser.add_argument("--group-id", type=int, default=None, help="Only export this group")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=int(os.getenv("EXPORT_CHUNK_SIZE", "1000")),
+        help="Rows read per query (default: 1000)"
+    )
+    parser.add_argument(
+        "--database",
+        default=os.getenv("DATABASE_URL", "data/bot.db"),
+        help="Path to the SQLite database (default: $DATABASE_URL)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the export"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    args = parse_args(argv)
+
+    # Log to stderr so stdout stays clean for '-' output
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    if not Path(args.database).exists():
+        print(f"❌ Database not found: {args.database}", file=sys.stderr)
+        sys.exit(1)
+
+    db = Database(args.database)
+    try:
+        service = ExportService(db, args.chunk_size)
+        count = service.export(args.output, args.format, args.gzip, args.group_id)
+    finally:
+        db.close()
+
+    print(f"✅ Exported {count} transactions", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,22 @@
-"""Handlers package"""
+"""Handlers package
 
-from .command_handlers import CommandHandlers
-from .ai_handlers import AIHandlers
+Exports are imported on first access (PEP 562), see bot.services.
+"""
 
-__all__ = ['CommandHandlers', 'AIHandlers']
+import importlib
+
+_EXPORTS = {
+    'CommandHandlers': '.command_handlers',
+    'AIHandlers': '.ai_handlers',
+    'AdminHandlers': '.admin_handlers'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
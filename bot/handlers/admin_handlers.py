@@ -0,0 +1,278 @@
+"""Admin-only command handlers"""
+
+import asyncio
+import logging
+import tempfile
+from pathlib import Path
+from typing import Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+from bot.utils.config import BotConfig
+from bot.models.database import Database
+from bot.models.shard_router import ShardRouter
+from bot.models.query_stats import QueryStats
+from bot.services.export_service import ExportService
+from bot.services.sender_service import Priority, SenderService
+from bot.services.inbox_service import InboxService
+from bot.services.usage_service import UsageService
+from bot.utils.profiler import Profiler
+
+logger = logging.getLogger(__name__)
+
+
+class AdminHandlers:
+    """Handles commands restricted to configured admins"""
+
+    def __init__(
+        self,
+        config: BotConfig,
+        export_service: ExportService,
+        shard_router: Optional[ShardRouter] = None,
+        query_stats: Optional[QueryStats] = None,
+        sender: Optional[SenderService] = None,
+        inbox: Optional[InboxService] = None,
+        profiler: Optional[Profiler] = None,
+        usage: Optional[UsageService] = None
+    ):
+        self.config = config
+        self.export_service = export_service
+        self.shard_router = shard_router
+        self.query_stats = query_stats
+        self.sender = sender
+        self.inbox = inbox
+        self.profiler = profiler
+        self.usage = usage
+        self._profile_task: Optional[asyncio.Task] = None
+
+    async def _reply(self, update: Update, text: str, priority: Priority = Priority.REPLY):
+        """Reply through the rate-limited sender (or directly without one)"""
+        if self.sender is None:
+            await update.message.reply_text(text)
+            return
+        self.sender.reply_text(update.message, text, priority)
+
+    async def _require_admin(self, update: Update) -> bool:
+        """Reply with an error and return False if the sender is not an admin"""
+        user = update.effective_user
+        if user and self.config.is_admin(user.id):
+            return True
+
+        logger.warning(f"Rejected admin command from user {user.id if user else None}")
+        # Anyone can trigger this, so it is dropped first under load
+        await self._reply(update, "❌ This command is only available to bot admins.", Priority.INFO)
+        return False
+
+    async def export_ledger(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Export the ledger as a CSV or JSONL document
+
+        Usage: /export [csv|jsonl] [gz]
+        In a group only that group's transactions are exported.
+        """
+        if not await self._require_admin(update):
+            return
+
+        args = [arg.lower() for arg in (context.args or [])]
+        fmt = next((arg for arg in args if arg in ExportService.FORMATS), 'csv')
+        compress = 'gz' in args or 'gzip' in args
+
+        group_id = None
+        if update.effective_chat.type in ['group', 'supergroup']:
+            group_id = update.effective_chat.id
+
+        export_service = self.export_service
+        shard_db = None
+        if self.shard_router is not None:
+            if group_id is None:
+                await self._reply(
+                    update, "ℹ️ Sharding is enabled. Run /export inside a group to export its ledger."
+                )
+                return
+            if not self.shard_router.exists(group_id):
+                await self._reply(update, "ℹ️ No transactions recorded in this group yet.")
+                return
+            # Dedicated read-only connection to the group's shard for the export thread
+            shard_db = Database(self.shard_router.shard_path(group_id), read_only=True)
+            export_service = ExportService(shard_db, self.export_service.chunk_size)
+
+        filename = ExportService.filename(fmt, compress, group_id)
+
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = Path(tmpdir) / filename
+
+                # Run the export off the event loop so updates keep flowing
+                loop = asyncio.get_running_loop()
+                count = await loop.run_in_executor(
+                    None,
+                    export_service.export,
+                    str(path),
+                    fmt,
+                    compress,
+                    group_id
+                )
+
+                with open(path, 'rb') as document:
+                    await update.message.reply_document(
+                        document=document,
+                        filename=filename,
+                        caption=f"📦 Exported {count} transactions"
+                    )
+        finally:
+            if shard_db is not None:
+                shard_db.close()
+
+        logger.info(f"Admin {update.effective_user.id} exported {count} transactions")
+
+    async def show_shards(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show per-group shard sizes (cross-shard admin query)"""
+        if not await self._require_admin(update):
+            return
+
+        if self.shard_router is None:
+            await self._reply(update, "ℹ️ Sharding is disabled (SHARD_BY_GROUP=false).")
+            return
+
+        results = self.shard_router.fetchone_all(
+            """
+            SELECT (SELECT COUNT(*) FROM users) as users,
+                   (SELECT COUNT(*) FROM transactions) as transactions
+            """
+        )
+        results.sort(key=lambda result: result[1]['transactions'], reverse=True)
+
+        message = "🗂️ Group Shards\n\n"
+        for group_id, row in results[:20]:
+            message += f"• {group_id}: {row['users']} users, {row['transactions']} transactions\n"
+
+        message += f"\n📦 Shards: {len(results)}"
+        message += f"\n🔓 Open handles: {self.shard_router.open_count}/{self.shard_router.max_open}"
+        await self._reply(update, message)
+
+    async def show_db_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the most expensive SQL statements
+
+        Usage: /dbstats [limit] or /dbstats reset
+        """
+        if not await self._require_admin(update):
+            return
+
+        if self.query_stats is None:
+            await self._reply(
+                update, "ℹ️ Query instrumentation is disabled (DB_INSTRUMENTATION=false)."
+            )
+            return
+
+        args = context.args or []
+        if args and args[0].lower() == 'reset':
+            self.query_stats.reset()
+            await self._reply(update, "✅ Query statistics reset.")
+            return
+
+        limit = min(int(args[0]), 20) if args and args[0].isdigit() else 10
+        await self._reply(update, self.query_stats.format_report(limit))
+
+    async def show_send_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show outbound sender queue and latency metrics"""
+        if not await self._require_admin(update):
+            return
+
+        if self.sender is None:
+            await self._reply(update, "ℹ️ Outbound sender is not configured.")
+            return
+
+        await self._reply(update, self.sender.format_stats())
+
+    async def show_inbox(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show inbox queue depth, or replay failed messages
+
+        Usage: /inbox [retry]
+        """
+        if not await self._require_admin(update):
+            return
+
+        if self.inbox is None:
+            await self._reply(update, "ℹ️ The inbox is disabled (INBOX_CONSUMERS=0).")
+            return
+
+        if context.args and context.args[0].lower() == "retry":
+            count = self.inbox.retry_failed()
+            await self._reply(update, f"🔁 Re-queued {count} failed messages.")
+            return
+
+        await self._reply(update, self.inbox.format_stats())
+
+    async def show_ai_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show LLM calls, tokens, latency and cost per group and per day
+
+        Usage: /aistats [days]
+        """
+        if not await self._require_admin(update):
+            return
+
+        if self.usage is None:
+            await self._reply(update, "ℹ️ AI usage is not recorded (AI is disabled).")
+            return
+
+        try:
+            days = int(context.args[0]) if context.args else 7
+        except ValueError:
+            await self._reply(update, "❌ Usage: /aistats [days]")
+            return
+
+        await self._reply(update, self.usage.format_stats(max(days, 1)))
+
+    async def run_profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Profile the bot process for a while and report the busiest functions
+
+        Usage: /profile [seconds] or /profile stop
+        The session runs in the background so the chat isn't held up; the
+        summary and the collapsed stacks (for a flame graph) follow when it ends.
+        """
+        if not await self._require_admin(update):
+            return
+
+        if self.profiler is None:
+            await self._reply(update, "ℹ️ Profiling is not available.")
+            return
+
+        args = context.args or []
+        if args and args[0].lower() == "stop":
+            if not self.profiler.running:
+                await self._reply(update, "ℹ️ No profiling session is running.")
+                return
+            self.profiler.stop()
+            await self._reply(update, "⏹️ Stopping the profiling session.")
+            return
+
+        if self.profiler.running:
+            await self._reply(
+                update, "ℹ️ A profiling session is already running. Use /profile stop to end it."
+            )
+            return
+
+        try:
+            seconds = float(args[0]) if args else self.config.profile_seconds
+        except ValueError:
+            await self._reply(update, "❌ Usage: /profile [seconds] or /profile stop")
+            return
+        seconds = min(max(seconds, 1), self.profiler.max_seconds)
+
+        # Started before anything is awaited, so a second /profile sees it running
+        session = self.profiler.start(seconds)
+        await self._reply(update, f"🔬 Profiling for {seconds:.0f}s...")
+        self._profile_task = asyncio.ensure_future(self._profile_session(update, session))
+
+    async def _profile_session(self, update: Update, session: "asyncio.Task"):
+        try:
+            result, path = await session
+            await self._reply(update, result.format_summary())
+            with open(path, 'rb') as document:
+                await update.message.reply_document(
+                    document=document,
+                    filename=path.name,
+                    caption="🔥 Collapsed stacks (flamegraph.pl, speedscope)"
+                )
+            logger.info(f"Admin {update.effective_user.id} profiled the bot for {result.duration:.0f}s")
+        except Exception as e:
+            logger.error(f"Profiling session failed: {e}", exc_info=True)
+            await self._reply(update, f"❌ Profiling failed: {e}")
@@ -1,27 +1,159 @@
 """Group message handlers for auto-detection"""
 
+import asyncio
+import contextlib
+import functools
 import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from telegram import Update
 from telegram.ext import ContextTypes
-from bot.services.ai_service import AIService
+from bot.models.shard_router import ShardRouter
 from bot.services.balance_service import BalanceService
 from bot.services.user_service import UserService
+from bot.services.sender_service import Priority, SenderService
+from bot.services.confirmation_service import ConfirmationService, TransferConfirmation
+from bot.services.inbox_service import InboxConsumers, InboxService
+from bot.services.rollup_service import RollupService, parse_period
+from bot.utils.dedup import RecentKeys
+from bot.utils.render_cache import RenderCache
+from bot.utils.overload import Level, OverloadController
+from bot.utils.text import ParsedTransfer, mentions_amount, paginate, parse_transfer
+from bot.utils import metrics, tracing
+
+if TYPE_CHECKING:
+    # Only for annotations: importing the AI stack is slow
+    from bot.services.ai_service import AIService
 
 logger = logging.getLogger(__name__)
 
+# Stage latency histograms of group message processing (the "send" stage is
+# recorded by SenderService when replies go through it)
+_PREFILTER = metrics.stage("prefilter")
+_USER_UPSERT = metrics.stage("user_upsert")
+_LLM_DETECT = metrics.stage("llm_detect")
+_RECIPIENT_LOOKUP = metrics.stage("recipient_lookup")
+_TRANSFER = metrics.stage("transfer")
+_CONFIRMATION = metrics.stage("confirmation")
+_SEND = metrics.stage("send")
+
+# Deferred messages are caught up on this often once load is back to
+# normal, at most this many LLM batches at a time
+DEFERRED_DRAIN_INTERVAL = 5.0
+DEFERRED_DRAIN_BATCHES = 5
+
+
+@dataclass
+class BacklogSummary:
+    """What catching up on one group's backlog recorded"""
+    messages: int = 0
+    transfers: List[TransferConfirmation] = field(default_factory=list)
+    problems: List[str] = field(default_factory=list)
+    reason: str = "sent while I was offline"
+    
+    def format(self) -> List[str]:
+        """Summary message pages for the group"""
+        lines = []
+        if len(self.transfers) == 1:
+            lines.extend(self.transfers[0].format_template().split("\n"))
+        elif self.transfers:
+            lines.extend(ConfirmationService.format_summary(self.transfers).split("\n"))
+        if self.problems:
+            if lines:
+                lines.append("")
+            lines.append("⚠️ Not recorded:")
+            lines.extend(f"• {problem}" for problem in self.problems)
+        return paginate(
+            lines,
+            header=f"📥 Caught up on {self.messages} messages {self.reason}\n\n"
+        )
+
 
 class GroupHandlers:
     """Handles group messages and auto-detects transfers"""
     
     def __init__(
         self,
-        ai_service: AIService,
+        ai_service: "AIService",
         balance_service: BalanceService,
-        user_service: UserService
+        user_service: UserService,
+        shard_router: Optional[ShardRouter] = None,
+        dedup_cache_size: int = 10000,
+        sender: Optional[SenderService] = None,
+        confirmations: Optional[ConfirmationService] = None,
+        render_cache_size: int = 256,
+        inbox: Optional[InboxService] = None,
+        inbox_consumers: int = 4,
+        overload: Optional[OverloadController] = None,
+        deferred: Optional[InboxService] = None,
+        batch_size: int = 20,
+        shared_database: bool = False
     ):
         self.ai_service = ai_service
         self.balance_service = balance_service
         self.user_service = user_service
+        self.shard_router = shard_router
+        self.recent_messages = RecentKeys(dedup_cache_size)
+        self.sender = sender
+        self.confirmations = confirmations
+        self.render_cache = RenderCache(render_cache_size)
+        # Other processes write to the same files (worker mode), so cached
+        # renders also check SQLite's data_version (one PRAGMA per lookup)
+        self.shared_database = shared_database
+        
+        # With an inbox, handlers only append and consumers do the processing
+        self.inbox = inbox
+        self.inbox_consumers = None
+        if inbox is not None:
+            self.inbox_consumers = InboxConsumers(inbox, self._process_inbox_payload, inbox_consumers)
+        self._bot = None
+        
+        # Under overload, messages the LLM can't take now wait as deferred
+        # inbox rows (surviving restarts) and are detected in batches once
+        # load is back to normal
+        if overload is not None and deferred is None:
+            raise ValueError("Overload control needs an inbox to defer messages to")
+        self.overload = overload
+        self.deferred = deferred
+        self.batch_size = batch_size
+        self._drain_task: Optional[asyncio.Task] = None
+        self._draining: Optional[asyncio.Future] = None
+        self._purged_at = 0.0
+    
+    async def _reply(self, update: Update, text: str, priority: Priority = Priority.REPLY, **kwargs):
+        """Reply through the rate-limited sender (or directly without one)"""
+        if self.sender is None:
+            with _SEND.time():
+                await update.message.reply_text(text, **kwargs)
+            return
+        self.sender.reply_text(update.message, text, priority, **kwargs)
+    
+    @staticmethod
+    async def _run_blocking(func, *args, **kwargs):
+        """Run a blocking call (e.g. an LLM request) in the default executor
+        
+        Keeps the event loop free so updates from other chats are processed
+        while this one waits on the network.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+    
+    def _services(self, update: Update) -> Tuple[UserService, BalanceService]:
+        """Get the user and balance services for the chat of an update
+        
+        With sharding enabled, group chats use their own shard database;
+        private chats keep using the main database.
+        """
+        chat = update.effective_chat
+        if self.shard_router is None or chat is None or chat.type not in ['group', 'supergroup']:
+            return self.user_service, self.balance_service
+        
+        balance_service = BalanceService(
+            self.shard_router.get(chat.id),
+            self.user_service.default_balance
+        )
+        return balance_service.user_service, balance_service
     
     async def handle_group_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Monitor group messages for transfer announcements"""
@@ -32,154 +164,611 @@ class GroupHandlers:
         if update.effective_chat.type not in ['group', 'supergroup']:
             return
         
+        # Skip bot messages
+        if update.effective_user.is_bot:
+            return
+        
+        # Drop redelivered updates before any DB write or LLM call
+        group_id = update.effective_chat.id
+        message_id = update.message.message_id
+        if not self.recent_messages.add((group_id, message_id)):
+            logger.debug("Skipping duplicate message %s in group %s", message_id, group_id)
+            return
+        
+        if self.inbox is not None:
+            # Durable hand-off; inbox consumers run detection and the transfer
+            if self.inbox.append(group_id, message_id, update.to_dict()):
+                self.inbox_consumers.notify()
+            return
+        
+        await self.process_group_message(update)
+    
+    async def _process_inbox_payload(self, payload: dict):
+        update = Update.de_json(payload, self._bot)
+        with tracing.trace("inbox_message", update_id=update.update_id, chat_id=update.effective_chat.id):
+            await self.process_group_message(update)
+    
+    async def start_inbox(self, bot):
+        """Start the inbox consumers (no-op without an inbox)"""
+        self._bot = bot
+        if self.inbox_consumers:
+            await self.inbox_consumers.start()
+    
+    async def stop_inbox(self):
+        if self.inbox_consumers:
+            await self.inbox_consumers.stop()
+    
+    async def start_deferred(self, bot):
+        """Start catching up on deferred messages (no-op without overload control)"""
+        self._bot = bot
+        if self.overload is not None:
+            self._drain_task = asyncio.ensure_future(self._drain_deferred())
+    
+    async def stop_deferred(self):
+        """Stop the drain loop; messages still deferred wait for the next start"""
+        if self._drain_task:
+            self._drain_task.cancel()
+            await asyncio.gather(self._drain_task, return_exceptions=True)
+            self._drain_task = None
+        if self._draining:
+            await asyncio.gather(self._draining, return_exceptions=True)
+    
+    async def _drain_deferred(self):
+        while True:
+            await asyncio.sleep(DEFERRED_DRAIN_INTERVAL)
+            if self.overload.level != Level.NORMAL:
+                continue
+            # Shielded: stopping waits for the batch instead of repeating it
+            self._draining = asyncio.ensure_future(
+                self._process_deferred(self.batch_size * DEFERRED_DRAIN_BATCHES)
+            )
+            try:
+                await asyncio.shield(self._draining)
+            except Exception as e:
+                logger.error(f"Failed to process deferred messages: {e}", exc_info=True)
+    
+    async def _process_deferred(self, count: int) -> int:
+        """Detect up to `count` deferred messages; returns how many there were
+        
+        They are marked done only afterwards, so a crash repeats the batch,
+        whose transfers already recorded are then skipped.
+        """
+        items = self.deferred.deferred(count)
+        if not items:
+            self._maybe_purge()
+            return 0
+        logger.info("Detecting %d deferred messages", len(items))
+        updates = [Update.de_json(item.payload, self._bot) for item in items]
+        summaries = {
+            update.effective_chat.id: BacklogSummary(reason="held back while I was busy")
+            for update in updates
+        }
+        await self.process_backlog(updates, summaries, self.batch_size)
+        self.deferred.complete_deferred([item.id for item in items])
+        await self.send_backlog_summaries(self._bot, summaries)
+        return len(items)
+    
+    def _maybe_purge(self):
+        """Purge processed rows hourly when no inbox consumers do it"""
+        now = time.monotonic()
+        if self.inbox_consumers is not None or now - self._purged_at < 3600:
+            return
+        self._purged_at = now
+        self.deferred.purge_done()
+    
+    def _admit_under_load(self, update: Update, level: Level) -> bool:
+        """Whether a message the rules couldn't parse still goes to the LLM now
+        
+        Messages without an amount are never transfers and are dropped;
+        the rest are sampled at SAMPLE and all deferred at DEFER.
+        """
+        if not mentions_amount(update.message.text):
+            self.overload.shed["skipped"] += 1
+            return False
+        if level == Level.RULES or (level == Level.SAMPLE and self.overload.sample()):
+            return True
+        
+        group_id = update.effective_chat.id
+        message_id = update.message.message_id
+        # Forgotten so the backlog pass doesn't take it for a duplicate
+        self.recent_messages.discard((group_id, message_id))
+        self.deferred.defer(group_id, message_id, update.to_dict())
+        self.overload.shed["deferred"] += 1
+        return False
+    
+    @staticmethod
+    def _rule_detection(parsed: ParsedTransfer, sender):
+        """Detection result for a rule-parsed transfer"""
+        from bot.services.ai_service import TransferDetection, TransferRecipient
+        recipients = []
+        if len(parsed.to_usernames) > 1:
+            recipients = [TransferRecipient(username=name, amount=parsed.amount) for name in parsed.to_usernames]
+        return TransferDetection(
+            is_transfer=True,
+            from_username=sender.username,
+            to_username=parsed.to_usernames[0],
+            amount=parsed.amount,
+            recipients=recipients,
+            confidence=0.95,
+            reasoning="Rule-based match (overload)"
+        )
+    
+    def _pinned(self, update: Update):
+        """Keep the shard of a group chat open (see ShardRouter.pinned)"""
+        chat = update.effective_chat
+        if self.shard_router is None or chat is None or chat.type not in ['group', 'supergroup']:
+            return contextlib.nullcontext()
+        return self.shard_router.pinned(chat.id)
+    
+    async def process_group_message(self, update: Update):
+        """Detect a transfer announcement in a group message and record it"""
+        # The detection is awaited between reads and writes, so the shard
+        # must not be evicted meanwhile
+        with self._pinned(update):
+            await self._process_group_message(update)
+    
+    async def _process_group_message(self, update: Update):
         message_text = update.message.text
         sender = update.effective_user
+        user_service, balance_service = self._services(update)
         
-        # Skip bot messages
-        if sender.is_bot:
+        group_id = update.effective_chat.id
+        message_id = update.message.message_id
+        with _PREFILTER.time():
+            recorded = balance_service.transaction_service.exists_for_message(group_id, message_id)
+        if recorded:
+            logger.info("Transfer for message %s in group %s already recorded", message_id, group_id)
             return
         
-        logger.info(f"Processing group message from {sender.username or sender.first_name}: {message_text[:50]}...")
+        # Under overload passive detection is degraded step by step; clear
+        # rule-parsed announcements still get full service
+        level = self.overload.level if self.overload is not None else Level.NORMAL
+        parsed = None
+        if level > Level.NORMAL:
+            parsed = parse_transfer(message_text)
+            if parsed is None and not self._admit_under_load(update, level):
+                return
+        
+        logger.debug("Processing group message %s from %s: %.50s", message_id, sender.username or sender.first_name, message_text)
         
         # Ensure sender exists in database
-        sender_user = self.user_service.get_or_create_user(
-            telegram_user_id=sender.id,
-            username=sender.username,
-            first_name=sender.first_name,
-            last_name=sender.last_name
-        )
+        with _USER_UPSERT.time():
+            sender_user = user_service.get_or_create_user(
+                telegram_user_id=sender.id,
+                username=sender.username,
+                first_name=sender.first_name,
+                last_name=sender.last_name
+            )
         
         # Detect if this is a transfer announcement
-        detection = self.ai_service.detect_transfer(
-            message=message_text,
-            sender_username=sender.username,
-            sender_first_name=sender.first_name
-        )
+        if parsed is not None:
+            self.overload.shed["rules"] += 1
+            detection = self._rule_detection(parsed, sender)
+        else:
+            started = time.monotonic()
+            with _LLM_DETECT.time():
+                detection = await self._run_blocking(
+                    self.ai_service.detect_transfer,
+                    message=message_text,
+                    sender_username=sender.username,
+                    sender_first_name=sender.first_name,
+                    group_id=group_id
+                )
+            if self.overload is not None:
+                self.overload.observe_latency(time.monotonic() - started)
         
         # Only process if high confidence transfer detected
         if not detection.is_transfer or detection.confidence < 0.7:
-            logger.debug(f"Not a transfer (confidence: {detection.confidence:.2f})")
+            logger.debug("Not a transfer (confidence: %.2f)", detection.confidence)
             return
         
-        logger.info(f"Transfer detected! From: {detection.from_username}, To: {detection.to_username}, Amount: {detection.amount}")
+        logger.debug(
+            "Transfer detected! From: %s, To: %s, Amount: %s",
+            detection.from_username, detection.to_username, detection.amount
+        )
         
         # Validate we have all required information
-        if not detection.to_username or not detection.amount:
-            logger.warning(f"Missing details - to_username: {detection.to_username}, amount: {detection.amount}")
-            await update.message.reply_text(
+        transfers = detection.transfers()
+        if not transfers:
+            logger.warning("Missing details - to_username: %s, amount: %s", detection.to_username, detection.amount)
+            await self._reply(
+                update,
                 "⚠️ I detected a transfer but couldn't extract all details. "
                 "Please mention the recipient clearly and specify the amount.\n"
-                "Example: 'I transferred $100 to @username'"
+                "Example: 'I transferred $100 to @username'",
+                Priority.INFO
             )
             return
         
+        if len(transfers) > 1:
+            await self._record_split(update, sender_user, transfers, user_service, balance_service)
+            return
+        to_username, amount = transfers[0]
+        
         # Get or create receiver
-        logger.info(f"Looking for receiver: {detection.to_username}")
-        receiver_user = self.user_service.get_by_username(detection.to_username)
+        logger.debug("Looking for receiver: %s", to_username)
+        with _RECIPIENT_LOOKUP.time():
+            receiver_user = user_service.get_by_username(to_username)
         
         if not receiver_user:
             # List available users for debugging
-            all_users = self.user_service.get_all()
+            all_users = user_service.get_all()
             user_list = ", ".join([f"@{u.username or u.first_name}" for u in all_users])
-            logger.warning(f"User '{detection.to_username}' not found. Available users: {user_list}")
+            logger.warning("User '%s' not found. Available users: %s", to_username, user_list)
             
-            await update.message.reply_text(
-                f"❌ User '{detection.to_username}' not found in the system.\n\n"
+            await self._reply(
+                update,
+                f"❌ User '{to_username}' not found in the system.\n\n"
                 f"Available users: {user_list}\n\n"
-                f"💡 Tip: They need to send at least one message in this group first."
+                f"💡 Tip: They need to send at least one message in this group first.",
+                Priority.INFO
             )
             return
         
         # Prevent self-transfer
         if sender_user.id == receiver_user.id:
-            await update.message.reply_text(
-                "❌ You cannot transfer money to yourself!"
+            await self._reply(
+                update,
+                "❌ You cannot transfer money to yourself!",
+                Priority.INFO
             )
             return
         
         # Execute the transfer
-        result = self.balance_service.transfer_by_user_id(
-            from_user_id=sender_user.id,
-            to_user_id=receiver_user.id,
-            amount=detection.amount,
-            message_id=update.message.message_id,
-            group_id=update.effective_chat.id
-        )
+        with _TRANSFER.time():
+            result = balance_service.transfer_by_user_id(
+                from_user_id=sender_user.id,
+                to_user_id=receiver_user.id,
+                amount=amount,
+                message_id=message_id,
+                group_id=group_id
+            )
         
-        if result.success:
+        if result.duplicate:
+            return
+        
+        if result.success and self.confirmations is not None:
+            # Coalesced: one summary per group per window
+            self.confirmations.add(update.message, TransferConfirmation(
+                from_display=sender_user.display_name,
+                to_display=receiver_user.display_name,
+                amount=amount,
+                from_balance=result.transaction.balance_from,
+                to_balance=result.transaction.balance_to,
+                group_id=group_id
+            ))
+            logger.debug("Transfer completed: %s -> %s, $%.2f", sender_user.display_name, receiver_user.display_name, amount)
+        elif result.success:
             # Generate AI confirmation message
-            confirmation = self.ai_service.generate_confirmation_message(
-                from_user_display=sender_user.display_name,
-                to_user_display=receiver_user.display_name,
-                amount=detection.amount,
-                from_balance=sender_user.balance - detection.amount,
-                to_balance=receiver_user.balance + detection.amount
+            with _CONFIRMATION.time():
+                confirmation = await self._run_blocking(
+                    self.ai_service.generate_confirmation_message,
+                    from_user_display=sender_user.display_name,
+                    to_user_display=receiver_user.display_name,
+                    amount=amount,
+                    from_balance=result.transaction.balance_from,
+                    to_balance=result.transaction.balance_to,
+                    group_id=group_id
+                )
+            
+            await self._reply(update, confirmation, Priority.CONFIRMATION)
+            logger.debug("Transfer completed: %s -> %s, $%.2f", sender_user.display_name, receiver_user.display_name, amount)
+        else:
+            await self._reply(update, result.message, Priority.CONFIRMATION)
+    
+    async def _record_split(
+        self,
+        update: Update,
+        sender_user,
+        transfers: List[Tuple[str, float]],
+        user_service: UserService,
+        balance_service: BalanceService
+    ):
+        """Record a transfer to several receivers atomically, with one confirmation"""
+        group_id = update.effective_chat.id
+        with _RECIPIENT_LOOKUP.time():
+            receivers = user_service.get_by_usernames(name for name, _ in transfers)
+        
+        missing = [name for name, _ in transfers if name not in receivers]
+        if missing:
+            await self._reply(
+                update,
+                f"❌ Not found in the system: {', '.join(missing)}. Nothing was recorded.\n\n"
+                f"💡 Tip: They need to send at least one message in this group first.",
+                Priority.INFO
+            )
+            return
+        
+        if any(receivers[name].id == sender_user.id for name, _ in transfers):
+            await self._reply(update, "❌ You cannot transfer money to yourself!", Priority.INFO)
+            return
+        
+        with _TRANSFER.time():
+            result = balance_service.transfer_many(
+                sender_user.id,
+                [(receivers[name].id, amount) for name, amount in transfers],
+                message_id=update.message.message_id,
+                group_id=group_id
+            )
+        
+        if result.duplicate:
+            return
+        if not result.success:
+            await self._reply(update, result.message, Priority.CONFIRMATION)
+            return
+        
+        confirmations = self._confirmations(sender_user, receivers.values(), result, group_id)
+        if self.confirmations is not None:
+            for confirmation in confirmations:
+                self.confirmations.add(update.message, confirmation)
+        else:
+            await self._reply(update, ConfirmationService.format_summary(confirmations), Priority.CONFIRMATION)
+        logger.debug("Split transfer completed: %s -> %d receivers", sender_user.display_name, len(confirmations))
+    
+    @staticmethod
+    def _confirmations(sender_user, receivers, result, group_id: Optional[int] = None) -> List[TransferConfirmation]:
+        """One confirmation per transaction a successful transfer created"""
+        names = {user.id: user.display_name for user in receivers}
+        return [
+            TransferConfirmation(
+                from_display=sender_user.display_name,
+                to_display=names[transaction.to_user_id],
+                amount=transaction.amount,
+                from_balance=transaction.balance_from,
+                to_balance=transaction.balance_to,
+                group_id=group_id
             )
+            for transaction in result.transactions or [result.transaction]
+        ]
+    
+    async def process_backlog(
+        self,
+        updates: List[Update],
+        summaries: Dict[int, BacklogSummary],
+        batch_size: int = 20
+    ):
+        """
+        Record transfers announced while the bot was offline
+        
+        Takes a page of pending updates at once instead of one live message:
+        messages without an amount are never sent to the LLM, the rest are
+        detected `batch_size` per LLM call, and each group's transfers in a
+        batch are recorded in one DB transaction. Nothing is replied per
+        message; outcomes are collected per group in `summaries` (see
+        send_backlog_summaries).
+        """
+        candidates = []
+        for update in updates:
+            message = update.message
+            sender = update.effective_user
+            if not message or not message.text or message.text.startswith("/"):
+                continue
+            if update.effective_chat.type not in ['group', 'supergroup'] or not sender or sender.is_bot:
+                continue
             
-            await update.message.reply_text(confirmation)
-            logger.info(f"Transfer completed: {sender_user.display_name} -> {receiver_user.display_name}, ${detection.amount:.2f}")
+            user_service, balance_service = self._services(update)
+            group_id = update.effective_chat.id
+            if not self.recent_messages.add((group_id, message.message_id)):
+                continue
+            if balance_service.transaction_service.exists_for_message(group_id, message.message_id):
+                continue
+            
+            summaries.setdefault(group_id, BacklogSummary()).messages += 1
+            sender_user = user_service.get_or_create_user(
+                telegram_user_id=sender.id,
+                username=sender.username,
+                first_name=sender.first_name,
+                last_name=sender.last_name
+            )
+            if mentions_amount(message.text):
+                candidates.append((update, sender_user))
+        
+        logger.info(f"Backlog: {len(updates)} updates, {len(candidates)} possible transfers")
+        
+        for start in range(0, len(candidates), batch_size):
+            batch = candidates[start:start + batch_size]
+            groups = {update.effective_chat.id for update, _ in batch}
+            detections = await self._run_blocking(
+                self.ai_service.detect_transfers,
+                [
+                    (update.message.text, update.effective_user.username, update.effective_user.first_name)
+                    for update, _ in batch
+                ],
+                group_id=groups.pop() if len(groups) == 1 else None
+            )
+            
+            by_group: Dict[int, list] = {}
+            for (update, sender_user), detection in zip(batch, detections):
+                by_group.setdefault(update.effective_chat.id, []).append((update, sender_user, detection))
+            
+            for group_id, entries in by_group.items():
+                user_service, balance_service = self._services(entries[0][0])
+                with balance_service.db.transaction():
+                    for update, sender_user, detection in entries:
+                        self._record_backlog_transfer(
+                            update, sender_user, detection,
+                            user_service, balance_service, summaries[group_id]
+                        )
+    
+    @staticmethod
+    def _record_backlog_transfer(
+        update: Update,
+        sender_user,
+        detection,
+        user_service: UserService,
+        balance_service: BalanceService,
+        summary: BacklogSummary
+    ):
+        """Record one detected backlog transfer (same rules as live messages)"""
+        if not detection.is_transfer or detection.confidence < 0.7:
+            return
+        
+        transfers = detection.transfers()
+        if not transfers:
+            summary.problems.append(
+                f"{sender_user.display_name}: couldn't tell recipient or amount in \"{update.message.text[:40]}\""
+            )
+            return
+        
+        receivers = user_service.get_by_usernames(name for name, _ in transfers)
+        missing = [name for name, _ in transfers if name not in receivers]
+        if missing:
+            summary.problems.append(
+                f"{sender_user.display_name} → {', '.join(missing)}: user not found"
+            )
+            return
+        
+        if any(receivers[name].id == sender_user.id for name, _ in transfers):
+            summary.problems.append(f"{sender_user.display_name}: cannot transfer to yourself")
+            return
+        
+        if len(transfers) == 1:
+            result = balance_service.transfer_by_user_id(
+                from_user_id=sender_user.id,
+                to_user_id=receivers[transfers[0][0]].id,
+                amount=transfers[0][1],
+                message_id=update.message.message_id,
+                group_id=update.effective_chat.id
+            )
         else:
-            await update.message.reply_text(result.message)
+            result = balance_service.transfer_many(
+                sender_user.id,
+                [(receivers[name].id, amount) for name, amount in transfers],
+                message_id=update.message.message_id,
+                group_id=update.effective_chat.id
+            )
+        if result.success:
+            summary.transfers.extend(GroupHandlers._confirmations(sender_user, receivers.values(), result))
+        elif not result.duplicate:
+            summary.problems.append(
+                f"{sender_user.display_name} → {', '.join(user.display_name for user in receivers.values())}: "
+                f"{result.message.lstrip('❌ ')}"
+            )
+    
+    async def send_backlog_summaries(self, bot, summaries: Dict[int, BacklogSummary]):
+        """Send one summary per group that had transfers (or failed ones) in its backlog"""
+        for group_id, summary in summaries.items():
+            if not summary.transfers and not summary.problems:
+                continue
+            for page in summary.format():
+                if self.sender is None:
+                    await bot.send_message(chat_id=group_id, text=page)
+                else:
+                    self.sender.send_message(group_id, page, Priority.CONFIRMATION)
     
     async def show_my_balance(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show balance for the user who sent the command"""
         user = update.effective_user
+        user_service, _ = self._services(update)
         
         # Get or create user
-        db_user = self.user_service.get_or_create_user(
+        db_user = user_service.get_or_create_user(
             telegram_user_id=user.id,
             username=user.username,
             first_name=user.first_name,
             last_name=user.last_name
         )
         
-        await update.message.reply_text(
+        await self._reply(
+            update,
             f"💰 Your Balance\n\n"
             f"{db_user.display_name}: ${db_user.balance:.2f}"
         )
     
+    async def _reply_pages(self, update: Update, pages: List[str]):
+        """Send a reply that may span several messages"""
+        for page in pages:
+            await self._reply(update, page)
+    
+    def _cached_pages(self, command: str, update: Update, db, render) -> List[str]:
+        """Get rendered pages, re-rendering only after the ledger changed"""
+        data_version = db.data_version() if self.shared_database else None
+        key = (command, update.effective_chat.id, db.ledger_version, data_version)
+        return self.render_cache.get_or_render(key, render)
+    
     async def show_all_balances(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show balances for all group members"""
-        users = self.user_service.get_all()
+        user_service, _ = self._services(update)
         
-        if not users:
-            await update.message.reply_text("No users found in the system yet.")
-            return
+        def render() -> List[str]:
+            users = user_service.get_all()
+            if not users:
+                return ["No users found in the system yet."]
+            
+            # Sort by balance descending
+            users.sort(key=lambda u: u.balance, reverse=True)
+            total = sum(user.balance for user in users)
+            
+            return paginate(
+                (f"{i}. {user.display_name}: ${user.balance:.2f}" for i, user in enumerate(users, 1)),
+                header="💰 Group Balances\n\n",
+                footer=f"\n📊 Total: ${total:.2f}\n👥 Members: {len(users)}"
+            )
         
-        # Sort by balance descending
-        users.sort(key=lambda u: u.balance, reverse=True)
+        await self._reply_pages(update, self._cached_pages("balances", update, user_service.db, render))
+    
+    async def show_users(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show all registered users"""
+        user_service, _ = self._services(update)
         
-        message = "💰 Group Balances\n\n"
-        total = 0
+        def render() -> List[str]:
+            users = user_service.get_all()
+            if not users:
+                return ["No users registered yet."]
+            
+            return paginate(
+                (f"{i}. {user.display_name}" for i, user in enumerate(users, 1)),
+                header="👥 Registered Users:\n\n",
+                footer=f"\n💡 Total: {len(users)} users"
+            )
         
-        for i, user in enumerate(users, 1):
-            message += f"{i}. {user.display_name}: ${user.balance:.2f}\n"
-            total += user.balance
+        await self._reply_pages(update, self._cached_pages("users", update, user_service.db, render))
+    
+    async def show_group_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show recent transactions in the group"""
+        _, balance_service = self._services(update)
         
-        message += f"\n📊 Total: ${total:.2f}"
-        message += f"\n👥 Members: {len(users)}"
+        def render() -> List[str]:
+            return paginate(balance_service.get_transaction_history(limit=10).rstrip("\n").split("\n"))
         
-        await update.message.reply_text(message)
+        await self._reply_pages(update, self._cached_pages("history", update, balance_service.db, render))
     
-    async def show_users(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Show all registered users"""
-        users = self.user_service.get_all()
+    async def show_my_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the sender's own transfers with their balance after each
         
-        if not users:
-            await update.message.reply_text("No users registered yet.")
-            return
+        Usage: /myhistory [before_id] (the reply names the next page's command)
+        """
+        user = update.effective_user
+        user_service, balance_service = self._services(update)
+        args = context.args or []
+        before_id = int(args[0]) if args and args[0].isdigit() else None
         
-        message = "👥 Registered Users:\n\n"
-        for i, user in enumerate(users, 1):
-            message += f"{i}. {user.display_name}\n"
+        db_user = user_service.get_by_telegram_id(user.id)
+        if not db_user:
+            await self._reply(update, "📜 No transactions yet.")
+            return
         
-        message += f"\n💡 Total: {len(users)} users"
-        await update.message.reply_text(message)
+        lines = balance_service.get_user_history(db_user.id, limit=10, before_id=before_id)
+        await self._reply_pages(update, paginate(lines, header=f"📜 History of {db_user.display_name}\n\n"))
     
-    async def show_group_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Show recent transactions in the group"""
-        history_text = self.balance_service.get_transaction_history(limit=10)
-        await update.message.reply_text(history_text)
+    async def show_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the group's transfer volume, top senders and daily activity
+        
+        Usage: /stats [week|month] (read from the daily rollups only)
+        """
+        if update.effective_chat.type not in ['group', 'supergroup']:
+            await self._reply(update, "ℹ️ /stats is only available in groups.")
+            return
+        
+        period = parse_period(context.args)
+        if period is None:
+            await self._reply(update, "Usage: /stats [week|month]")
+            return
+        
+        _, balance_service = self._services(update)
+        rollups = RollupService(balance_service.db)
+        lines = rollups.format_stats(update.effective_chat.id, period)
+        await self._reply_pages(update, paginate(lines))
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show help message"""
@@ -195,7 +784,12 @@ class GroupHandlers:
             "/balances - See all group balances\n"
             "/users - See registered users\n"
             "/history - View recent transfers\n"
+            "/myhistory - View your own transfers and balance\n"
+            "/stats [week|month] - Group volume and top senders\n"
+            "/schedule @user amount daily|weekly|monthly|once [date] - Schedule a transfer\n"
+            "/schedules - See scheduled transfers\n"
+            "/unschedule id - Cancel a scheduled transfer\n"
             "/help - Show this message\n\n"
             "*Note:* New members get $1000 automatically!"
         )
-        await update.message.reply_text(help_text, parse_mode='Markdown')
+        await self._reply(update, help_text, parse_mode='Markdown')
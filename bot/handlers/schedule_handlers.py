@@ -0,0 +1,167 @@
+"""Scheduled transfer command handlers"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+from bot.utils.config import BotConfig
+from bot.utils.text import paginate
+from bot.services.schedule_service import REPEATS, ScheduleService
+from bot.handlers.group_handlers import GroupHandlers
+
+logger = logging.getLogger(__name__)
+
+USAGE = (
+    "Usage: /schedule @user amount daily|weekly|monthly|once [YYYY-MM-DD [HH:MM]]\n"
+    "Times are UTC; without a date the first transfer is made right away."
+)
+
+
+def parse_start(args: List[str]) -> Optional[int]:
+    """Unix time from [YYYY-MM-DD [HH:MM]] (UTC); None if malformed"""
+    try:
+        if len(args) == 1:
+            start = datetime.strptime(args[0], "%Y-%m-%d")
+        elif len(args) == 2:
+            start = datetime.strptime(" ".join(args), "%Y-%m-%d %H:%M")
+        else:
+            return None
+    except ValueError:
+        return None
+    return int(start.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _format_time(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+
+class ScheduleHandlers:
+    """Handles /schedule, /schedules and /unschedule in groups
+
+    Ledger lookups go through the group handlers, so schedules use the
+    group's shard when sharding is enabled.
+    """
+
+    def __init__(self, config: BotConfig, schedules: ScheduleService, group_handlers: GroupHandlers):
+        self.config = config
+        self.schedules = schedules
+        self.group_handlers = group_handlers
+
+    async def _require_group(self, update: Update) -> bool:
+        if update.effective_chat.type in ['group', 'supergroup']:
+            return True
+        await self.group_handlers._reply(update, "ℹ️ Scheduled transfers are only available in groups.")
+        return False
+
+    async def schedule(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Create a scheduled or recurring transfer from the sender
+
+        Usage: /schedule @user amount daily|weekly|monthly|once [YYYY-MM-DD [HH:MM]]
+        """
+        if not await self._require_group(update):
+            return
+
+        args = context.args or []
+        if len(args) < 3:
+            await self.group_handlers._reply(update, USAGE)
+            return
+
+        username = args[0].lstrip("@")
+        repeat = args[2].lower()
+        try:
+            amount = float(args[1].lstrip("$").replace(",", ""))
+        except ValueError:
+            amount = 0.0
+        start_at = parse_start(args[3:]) if len(args) > 3 else int(time.time())
+        if not username or amount <= 0 or repeat not in REPEATS or start_at is None:
+            await self.group_handlers._reply(update, USAGE)
+            return
+
+        user = update.effective_user
+        user_service, _ = self.group_handlers._services(update)
+        sender = user_service.get_or_create_user(
+            telegram_user_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name
+        )
+        receiver = user_service.get_by_username(username)
+        if not receiver:
+            await self.group_handlers._reply(update, f"❌ User @{username} not found in this group.")
+            return
+        if receiver.id == sender.id:
+            await self.group_handlers._reply(update, "❌ Cannot transfer to yourself!")
+            return
+
+        schedule = self.schedules.create(
+            group_id=update.effective_chat.id,
+            from_user_id=sender.id,
+            to_user_id=receiver.id,
+            amount=amount,
+            repeat=repeat,
+            start_at=start_at,
+            created_by=user.id
+        )
+        await self.group_handlers._reply(
+            update,
+            f"🗓 Scheduled #{schedule.id}: ${amount:.2f} {repeat} "
+            f"from {sender.display_name} to {receiver.display_name}\n"
+            f"Next: {_format_time(schedule.next_run_at)}"
+        )
+
+    async def list_schedules(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """List the group's active schedules"""
+        if not await self._require_group(update):
+            return
+
+        schedules = self.schedules.list_for_group(update.effective_chat.id)
+        if not schedules:
+            await self.group_handlers._reply(update, "🗓 No scheduled transfers in this group.")
+            return
+
+        user_service, _ = self.group_handlers._services(update)
+        users = user_service.get_by_ids(
+            [s.from_user_id for s in schedules] + [s.to_user_id for s in schedules]
+        )
+
+        def name(user_id: int) -> str:
+            user = users.get(user_id)
+            return user.display_name if user else f"user {user_id}"
+
+        lines = []
+        for s in schedules:
+            line = (
+                f"#{s.id}: ${s.amount:.2f} {s.repeat} {name(s.from_user_id)} → {name(s.to_user_id)}, "
+                f"next {_format_time(s.next_run_at)}"
+            )
+            if s.last_error:
+                line += f" (last run failed: {s.last_error})"
+            lines.append(line)
+        await self.group_handlers._reply_pages(update, paginate(lines, header="🗓 Scheduled Transfers\n\n"))
+
+    async def unschedule(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cancel a schedule (its creator or an admin)
+
+        Usage: /unschedule <id>
+        """
+        if not await self._require_group(update):
+            return
+
+        args = context.args or []
+        schedule = None
+        if len(args) == 1 and args[0].lstrip("#").isdigit():
+            schedule = self.schedules.get(int(args[0].lstrip("#")))
+        if not schedule or not schedule.active or schedule.group_id != update.effective_chat.id:
+            await self.group_handlers._reply(update, "❌ No such scheduled transfer. Usage: /unschedule <id>")
+            return
+
+        user = update.effective_user
+        if schedule.created_by != user.id and not self.config.is_admin(user.id):
+            await self.group_handlers._reply(update, "❌ Only its creator or a bot admin can cancel this schedule.")
+            return
+
+        self.schedules.cancel(schedule.id)
+        logger.info(f"Schedule {schedule.id} cancelled by user {user.id}")
+        await self.group_handlers._reply(update, f"🗓 Scheduled transfer #{schedule.id} cancelled.")
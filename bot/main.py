@@ -12,6 +12,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from bot.utils.config import BotConfig
 from bot.utils.logger import setup_logging
 from bot.services.bot_service import BotService
+from bot.services.worker_pool import WorkerPool
 
 
 def main():
@@ -30,9 +31,12 @@ def main():
         logger.info(f"Database: {config.database_url}")
         logger.info(f"Storage: SQLite")
         
-        # Create and run bot service
-        bot_service = BotService(config)
-        bot_service.run()
+        # Create and run bot service (or an ingress feeding worker processes)
+        if config.workers > 1:
+            WorkerPool(config).run()
+        else:
+            bot_service = BotService(config)
+            bot_service.run()
         
     except ValueError as e:
         print(f"❌ Configuration error: {e}")
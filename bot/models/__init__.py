@@ -3,5 +3,7 @@
 from .user import User
 from .transaction import Transaction
 from .database import Database, init_database
+from .shard_router import ShardRouter
+from .query_stats import QueryStats
 
-__all__ = ['User', 'Transaction', 'Database', 'init_database']
+__all__ = ['User', 'Transaction', 'Database', 'init_database', 'ShardRouter', 'QueryStats']
@@ -1,21 +1,47 @@
 """Database connection and initialization"""
 
+import itertools
 import sqlite3
 import logging
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 from contextlib import contextmanager
+from bot.models.query_stats import QueryStats
+from bot.utils import tracing
 
 logger = logging.getLogger(__name__)
 
+# Ledger versions are drawn from one process-wide counter so a reopened
+# database never reuses a version a previous handle already handed out
+_ledger_versions = itertools.count(1)
+
+# Bump whenever init_database changes so existing databases get the new DDL
+SCHEMA_VERSION = 6
+
 
 class Database:
     """SQLite database manager with connection pooling"""
     
-    def __init__(self, database_url: str):
+    def __init__(
+        self,
+        database_url: str,
+        stats: Optional[QueryStats] = None,
+        reopen: bool = True,
+        read_only: bool = False
+    ):
         self.database_url = database_url
+        self.stats = stats
+        # Read-only handles never create the file or write to it
+        self.read_only = read_only
+        # Reconnect on use after close(); when False a closed handle raises
+        # instead, so an evicted shard can't quietly reopen outside the LRU
+        self.reopen = reopen
+        self._closed = False
+        self.ledger_version = next(_ledger_versions)
         self._ensure_directory()
         self._connection: Optional[sqlite3.Connection] = None
+        self._savepoints = 0
     
     def _ensure_directory(self):
         """Ensure database directory exists"""
@@ -25,10 +51,16 @@ class Database:
     def connect(self) -> sqlite3.Connection:
         """Get or create database connection"""
         if self._connection is None:
+            if self._closed and not self.reopen:
+                raise sqlite3.ProgrammingError(f"Database {self.database_url} was closed")
+            database = self.database_url
+            if self.read_only:
+                database = Path(self.database_url).resolve().as_uri() + "?mode=ro"
             self._connection = sqlite3.connect(
-                self.database_url,
+                database,
                 check_same_thread=False,
-                isolation_level=None  # Autocommit mode
+                isolation_level=None,  # Autocommit mode
+                uri=self.read_only
             )
             self._connection.row_factory = sqlite3.Row
             logger.info(f"Connected to database: {self.database_url}")
@@ -41,42 +73,168 @@ class Database:
         try:
             yield conn
         except Exception as e:
-            conn.rollback()
+            # No rollback here: outside transaction() a failed statement has
+            # nothing to undo (autocommit), and inside it transaction() rolls
+            # back just its own block; rolling back here would also discard
+            # the enclosing transaction and its savepoints
             logger.error(f"Database error: {e}")
             raise
     
+    def bump_ledger_version(self):
+        """Mark balances, users or transactions as changed (invalidates rendered views)"""
+        self.ledger_version = next(_ledger_versions)
+    
+    def data_version(self) -> int:
+        """Counter SQLite advances whenever another connection commits
+        
+        Together with ledger_version (which tracks this handle's own writes)
+        it tells whether anything changed, including writes made by other
+        worker processes sharing the file.
+        """
+        return self.connect().execute("PRAGMA data_version").fetchone()[0]
+    
+    def enable_wal(self):
+        """Switch the file to write-ahead logging so readers in other
+        processes don't block on a writer (persistent for the file)"""
+        mode = self.connect().execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        logger.info(f"Journal mode: {mode}")
+    
     def close(self):
         """Close database connection"""
+        self._closed = True
         if self._connection:
             self._connection.close()
             self._connection = None
             logger.info("Database connection closed")
     
+    @contextmanager
+    def transaction(self):
+        """Context manager running the enclosed statements atomically
+        
+        Opens a BEGIN IMMEDIATE transaction that is committed on success and
+        rolled back on any exception. Nested use runs in a savepoint of the
+        outer transaction, so a failing inner block only undoes its own
+        statements and the outer transaction can carry on.
+        """
+        conn = self.connect()
+        if conn.in_transaction:
+            self._savepoints += 1
+            name = f"sp_{self._savepoints}"
+            conn.execute(f"SAVEPOINT {name}")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f"ROLLBACK TO {name}")
+                conn.execute(f"RELEASE {name}")
+                raise
+            else:
+                conn.execute(f"RELEASE {name}")
+            finally:
+                self._savepoints -= 1
+            return
+        
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    
+    def _record(self, conn, query: str, params: tuple, started: float, rows: int):
+        """Record statement timing when instrumentation is enabled"""
+        duration_ms = (time.perf_counter() - started) * 1000
+        stats = self.stats.record(query, duration_ms, rows)
+        if self.stats.is_slow(duration_ms):
+            self.stats.log_slow(stats, duration_ms, conn, query, params)
+    
     def execute(self, query: str, params: tuple = ()):
         """Execute a query and return cursor"""
-        with self.get_connection() as conn:
+        with self.get_connection() as conn, tracing.db_span(query):
             cursor = conn.cursor()
-            cursor.execute(query, params)
-            conn.commit()
+            if self.stats is None:
+                cursor.execute(query, params)
+            else:
+                started = time.perf_counter()
+                cursor.execute(query, params)
+                self._record(conn, query, params, started, cursor.rowcount)
+            # Autocommit mode: statements outside transaction() commit on
+            # their own, and committing here would end an open transaction()
+            return cursor
+    
+    def executemany(self, query: str, seq_of_params: Iterable[tuple]):
+        """Execute a statement once per parameter tuple and return the cursor
+        
+        Recorded as one statement execution (rows = tuples executed); a slow
+        one is explained with its first parameter tuple.
+        """
+        seq_of_params = list(seq_of_params)
+        with self.get_connection() as conn, tracing.db_span(query):
+            cursor = conn.cursor()
+            if self.stats is None:
+                cursor.executemany(query, seq_of_params)
+            else:
+                started = time.perf_counter()
+                cursor.executemany(query, seq_of_params)
+                params = seq_of_params[0] if seq_of_params else ()
+                self._record(conn, query, params, started, len(seq_of_params))
             return cursor
     
     def fetchone(self, query: str, params: tuple = ()):
         """Execute query and fetch one result"""
-        with self.get_connection() as conn:
+        with self.get_connection() as conn, tracing.db_span(query):
             cursor = conn.cursor()
+            if self.stats is None:
+                cursor.execute(query, params)
+                return cursor.fetchone()
+            started = time.perf_counter()
             cursor.execute(query, params)
-            return cursor.fetchone()
+            row = cursor.fetchone()
+            self._record(conn, query, params, started, 1 if row is not None else 0)
+            return row
     
     def fetchall(self, query: str, params: tuple = ()):
         """Execute query and fetch all results"""
-        with self.get_connection() as conn:
+        with self.get_connection() as conn, tracing.db_span(query):
             cursor = conn.cursor()
+            if self.stats is None:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            started = time.perf_counter()
             cursor.execute(query, params)
-            return cursor.fetchall()
+            rows = cursor.fetchall()
+            self._record(conn, query, params, started, len(rows))
+            return rows
+    
+    def fetchmany(self, query: str, params: tuple = (), size: int = 1000):
+        """Execute query and fetch at most `size` results
+        
+        The cursor is closed before returning so the statement is reset and
+        its read lock released, even if more rows were available.
+        """
+        with self.get_connection() as conn, tracing.db_span(query):
+            cursor = conn.cursor()
+            try:
+                started = time.perf_counter()
+                cursor.execute(query, params)
+                rows = cursor.fetchmany(size)
+                if self.stats is not None:
+                    self._record(conn, query, params, started, len(rows))
+                return rows
+            finally:
+                cursor.close()
 
 
 def init_database(db: Database):
-    """Initialize database schema for group-based bot"""
+    """Initialize database schema for group-based bot
+    
+    The schema version is kept in PRAGMA user_version; a database already
+    at SCHEMA_VERSION is left alone, so a restart runs no DDL at all.
+    """
+    if db.fetchone("PRAGMA user_version")[0] == SCHEMA_VERSION:
+        logger.debug(f"Database schema is current (version {SCHEMA_VERSION})")
+        return
+    
     logger.info("Initializing database schema...")
     
     # Create users table with Telegram user info
@@ -131,4 +289,164 @@ def init_database(db: Database):
         ON transactions(created_at DESC)
     """)
     
-    logger.info("Database schema initialized successfully")
+    # Small key/value store for bot state (e.g. the last processed update id)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Durable inbox of group messages waiting to be processed
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS inbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (group_id, message_id)
+        )
+    """)
+    
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_inbox_status 
+        ON inbox(status, id)
+    """)
+    
+    # One row per LLM call, written in batches by UsageService
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at INTEGER NOT NULL,
+            group_id INTEGER,
+            operation TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            latency_ms INTEGER NOT NULL,
+            outcome TEXT NOT NULL
+        )
+    """)
+    
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_llm_usage_created 
+        ON llm_usage(created_at)
+    """)
+    
+    # Scheduled and recurring transfers; user ids are those of the group's
+    # ledger, times are unix seconds
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS scheduled_transfers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER NOT NULL,
+            from_user_id INTEGER NOT NULL,
+            to_user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            repeat TEXT NOT NULL,
+            start_at INTEGER NOT NULL,
+            period INTEGER NOT NULL DEFAULT 0,
+            next_run_at INTEGER NOT NULL,
+            active INTEGER NOT NULL DEFAULT 1,
+            last_error TEXT,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_scheduled_transfers_next_run 
+        ON scheduled_transfers(next_run_at, id) WHERE active = 1
+    """)
+    
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_scheduled_transfers_group 
+        ON scheduled_transfers(group_id, next_run_at) WHERE active = 1
+    """)
+    
+    # Per-day rollups of transactions for /stats (group_id 0 = no group)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS daily_group_stats (
+            group_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            transfers INTEGER NOT NULL DEFAULT 0,
+            volume REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (group_id, day)
+        ) WITHOUT ROWID
+    """)
+    
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS daily_user_stats (
+            group_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            sent_count INTEGER NOT NULL DEFAULT 0,
+            sent_volume REAL NOT NULL DEFAULT 0,
+            received_count INTEGER NOT NULL DEFAULT 0,
+            received_volume REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (group_id, day, user_id)
+        ) WITHOUT ROWID
+    """)
+    
+    # Rollups are updated by a trigger, so every insert path (including
+    # executemany) counts in the same transaction as the transfer. Rows that
+    # existed before the trigger are added by RollupService's backfill; the
+    # trigger and that boundary are set up atomically so no row counts twice.
+    with db.transaction():
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup 
+            AFTER INSERT ON transactions
+            BEGIN
+                INSERT INTO daily_group_stats (group_id, day, transfers, volume)
+                VALUES (COALESCE(NEW.group_id, 0), date(NEW.created_at), 1, NEW.amount)
+                ON CONFLICT (group_id, day) DO UPDATE SET
+                    transfers = transfers + 1,
+                    volume = volume + excluded.volume;
+                
+                INSERT INTO daily_user_stats (group_id, day, user_id, sent_count, sent_volume)
+                VALUES (COALESCE(NEW.group_id, 0), date(NEW.created_at), NEW.from_user_id, 1, NEW.amount)
+                ON CONFLICT (group_id, day, user_id) DO UPDATE SET
+                    sent_count = sent_count + 1,
+                    sent_volume = sent_volume + excluded.sent_volume;
+                
+                INSERT INTO daily_user_stats (group_id, day, user_id, received_count, received_volume)
+                VALUES (COALESCE(NEW.group_id, 0), date(NEW.created_at), NEW.to_user_id, 1, NEW.amount)
+                ON CONFLICT (group_id, day, user_id) DO UPDATE SET
+                    received_count = received_count + 1,
+                    received_volume = received_volume + excluded.received_volume;
+            END
+        """)
+        db.execute("""
+            INSERT OR IGNORE INTO bot_state (key, value)
+            SELECT 'rollup_backfill_until', COALESCE(MAX(id), 0) FROM transactions
+        """)
+    
+    # A Telegram message can record at most one transfer per receiver (a
+    # split is several rows of one message)
+    try:
+        db.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_message_receiver 
+            ON transactions(group_id, message_id, to_user_id)
+        """)
+    except sqlite3.IntegrityError:
+        logger.warning(
+            "Duplicate (group_id, message_id, to_user_id) rows already exist in transactions; "
+            "unique index not created. Remove the duplicates to enable it."
+        )
+        # Leave the version unset so the index is retried on the next start
+        return
+    
+    # Replaced by the index above (schema version 2 and older)
+    db.execute("DROP INDEX IF EXISTS idx_transactions_group_message")
+    # Inbox rows and schedules are no longer keyed to a worker (schema
+    # version 5 and older; the owner columns they had are left unused)
+    db.execute("DROP INDEX IF EXISTS idx_inbox_owner_status")
+    db.execute("DROP INDEX IF EXISTS idx_scheduled_transfers_due")
+    
+    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    logger.info(f"Database schema initialized successfully (version {SCHEMA_VERSION})")
@@ -0,0 +1,161 @@
+"""Per-statement SQL timing statistics"""
+
+import bisect
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Histogram bucket upper bounds in milliseconds (last bucket is +Inf)
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace and replace literals so equal statements group together"""
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NUMBER_LITERAL.sub("?", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+@dataclass
+class StatementStats:
+    """Aggregated timings for one normalized statement"""
+    sql: str
+    calls: int = 0
+    rows: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    plan: Optional[str] = None
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+    def percentile_ms(self, percentile: float) -> float:
+        """Approximate a latency percentile from the histogram (bucket upper bound)"""
+        if not self.calls:
+            return 0.0
+        target = self.calls * percentile
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+class QueryStats:
+    """Collects call counts, latency histograms and row counts per statement
+
+    Statements slower than `slow_query_ms` are logged together with their
+    EXPLAIN QUERY PLAN (computed once per normalized statement).
+    """
+
+    def __init__(self, slow_query_ms: float = 100.0):
+        self.slow_query_ms = slow_query_ms
+        self._statements: Dict[str, StatementStats] = {}
+        self._normalized: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, query: str, duration_ms: float, rows: int = 0) -> StatementStats:
+        """Record one statement execution"""
+        sql = self._normalized.get(query)
+        if sql is None:
+            sql = normalize_sql(query)
+            if len(self._normalized) < 4096:
+                self._normalized[query] = sql
+
+        with self._lock:
+            stats = self._statements.get(sql)
+            if stats is None:
+                stats = self._statements[sql] = StatementStats(sql)
+            stats.calls += 1
+            stats.rows += max(rows, 0)
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        return stats
+
+    def is_slow(self, duration_ms: float) -> bool:
+        return duration_ms >= self.slow_query_ms
+
+    def log_slow(self, stats: StatementStats, duration_ms: float, conn, query: str, params: tuple):
+        """Log a slow statement with its query plan"""
+        if stats.plan is None:
+            stats.plan = self.explain(conn, query, params)
+        logger.warning(
+            f"Slow query ({duration_ms:.1f} ms): {stats.sql}\n"
+            f"Query plan:\n{stats.plan}"
+        )
+
+    @staticmethod
+    def explain(conn, query: str, params: tuple) -> str:
+        """Get EXPLAIN QUERY PLAN output for a statement"""
+        if not query.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")):
+            return "(no plan)"
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        except Exception as e:
+            return f"(plan unavailable: {e})"
+        return "\n".join(f"  {row[3]}" for row in rows) or "(empty plan)"
+
+    def top(self, limit: int = 10, key: str = 'total_ms') -> List[StatementStats]:
+        """Get the most expensive statements"""
+        with self._lock:
+            statements = list(self._statements.values())
+        statements.sort(key=lambda stats: getattr(stats, key), reverse=True)
+        return statements[:limit]
+
+    def snapshot(self) -> List[StatementStats]:
+        """Get a copy of all statement stats"""
+        with self._lock:
+            return list(self._statements.values())
+
+    def reset(self):
+        """Clear all collected statistics"""
+        with self._lock:
+            self._statements.clear()
+
+    def format_report(self, limit: int = 10) -> str:
+        """Format the top statements for display"""
+        statements = self.top(limit)
+        if not statements:
+            return "📊 No queries recorded yet."
+
+        report = f"📊 Top {len(statements)} Queries by Total Time:\n\n"
+        for i, stats in enumerate(statements, 1):
+            sql = stats.sql if len(stats.sql) <= 120 else stats.sql[:117] + "..."
+            report += (
+                f"{i}. {sql}\n"
+                f"   calls={stats.calls} rows={stats.rows} total={stats.total_ms:.1f}ms "
+                f"avg={stats.avg_ms:.2f}ms p95≤{stats.percentile_ms(0.95):g}ms max={stats.max_ms:.1f}ms\n"
+            )
+        return report
+
+    def exposition(self) -> List[str]:
+        """Statement timings in Prometheus text format (see bot.utils.metrics)"""
+        name = "bot_db_statement_seconds"
+        lines = [
+            f"# HELP {name} SQL statement duration by normalized statement",
+            f"# TYPE {name} histogram"
+        ]
+        for stats in self.snapshot():
+            sql = stats.sql if len(stats.sql) <= 100 else stats.sql[:97] + "..."
+            sql = sql.replace("\\", "\\\\").replace('"', '\\"')
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS_MS + (None,), list(stats.buckets)):
+                cumulative += count
+                le = "+Inf" if bound is None else repr(bound / 1000)
+                lines.append(f'{name}_bucket{{statement="{sql}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{statement="{sql}"}} {stats.total_ms / 1000!r}')
+            lines.append(f'{name}_count{{statement="{sql}"}} {stats.calls}')
+        return lines
@@ -0,0 +1,167 @@
+"""Per-group database sharding"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from bot.models.database import Database, init_database
+from bot.models.query_stats import QueryStats
+
+logger = logging.getLogger(__name__)
+
+
+class ShardRouter:
+    """Routes each Telegram group to its own SQLite file
+
+    Open shards are kept in a bounded LRU; the least recently used shard is
+    closed when the limit is reached, and get() opens a fresh handle on its
+    next use. A handle returned by get() is only safe to use until the next
+    get(); code that keeps one across an await uses pinned(), and pinned
+    shards are not evicted (the LRU may then exceed `max_open` until they
+    are released). An evicted handle raises rather than reconnecting.
+
+    Every group has its own file and write lock, so each file stays small
+    and a write in one group doesn't block other worker processes writing
+    to other groups. Within one process all shard writes still run one at a
+    time on the event loop thread.
+    """
+
+    SHARD_PATTERN = re.compile(r"^group_(-?\d+)\.db$")
+
+    def __init__(
+        self,
+        shard_dir: str,
+        max_open: int = 32,
+        initializer: Callable[[Database], None] = init_database,
+        stats: Optional[QueryStats] = None
+    ):
+        if max_open <= 0:
+            raise ValueError("max_open must be positive")
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.max_open = max_open
+        self._initializer = initializer
+        self._stats = stats
+        self._shards: "OrderedDict[int, Database]" = OrderedDict()
+        self._pins: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def shard_path(self, group_id: int) -> str:
+        """Get the database file path for a group"""
+        return str(self.shard_dir / f"group_{group_id}.db")
+
+    def get(self, group_id: int) -> Database:
+        """Get the database for a group, opening (and initializing) it if needed"""
+        with self._lock:
+            db = self._shards.get(group_id)
+            if db is not None:
+                self._shards.move_to_end(group_id)
+                return db
+
+            db = Database(self.shard_path(group_id), self._stats, reopen=False)
+            self._initializer(db)
+            self._shards[group_id] = db
+            self._evict(keep=group_id)
+            return db
+
+    @contextmanager
+    def pinned(self, group_id: int) -> Iterator[Database]:
+        """Get a group's database and keep it open until the block exits"""
+        db = self.get(group_id)
+        with self._lock:
+            self._pins[group_id] = self._pins.get(group_id, 0) + 1
+        try:
+            yield db
+        finally:
+            with self._lock:
+                self._pins[group_id] -= 1
+                if not self._pins[group_id]:
+                    del self._pins[group_id]
+                    self._evict()
+
+    def _evict(self, keep: Optional[int] = None):
+        """Close least recently used unpinned shards down to max_open (lock held)
+
+        `keep` is a shard get() is about to hand out.
+        """
+        while len(self._shards) > self.max_open:
+            evicted_id = next(
+                (gid for gid in self._shards if gid not in self._pins and gid != keep), None
+            )
+            if evicted_id is None:
+                return
+            self._shards.pop(evicted_id).close()
+            logger.debug(f"Evicted shard for group {evicted_id}")
+
+    def exists(self, group_id: int) -> bool:
+        """Whether a group has a shard on disk (get() would create it)"""
+        return Path(self.shard_path(group_id)).exists()
+
+    @contextmanager
+    def read_only(self, group_id: int) -> Iterator[Database]:
+        """A temporary read-only handle on an existing shard, outside the LRU
+
+        For admin reads across many shards, which would otherwise evict the
+        shards live traffic is using.
+        """
+        db = Database(self.shard_path(group_id), self._stats, read_only=True)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def group_ids(self) -> List[int]:
+        """List every group that has a shard on disk"""
+        group_ids = []
+        for path in self.shard_dir.iterdir():
+            match = self.SHARD_PATTERN.match(path.name)
+            if match:
+                group_ids.append(int(match.group(1)))
+        return sorted(group_ids)
+
+    @property
+    def open_count(self) -> int:
+        """Number of currently open shard handles"""
+        return len(self._shards)
+
+    def fetchone_all(self, query: str, params: tuple = ()) -> List[Tuple[int, object]]:
+        """Run a single-row query against every shard (read-only, see read_only())
+
+        Returns:
+            List of (group_id, row) pairs; shards returning no row are skipped
+        """
+        results = []
+        for group_id in self.group_ids():
+            with self.read_only(group_id) as db:
+                row = db.fetchone(query, params)
+            if row is not None:
+                results.append((group_id, row))
+        return results
+
+    def fetchall_all(self, query: str, params: tuple = ()) -> List[Tuple[int, object]]:
+        """Run a query against every shard (read-only, see read_only())
+
+        Returns:
+            List of (group_id, row) pairs across all shards
+        """
+        results = []
+        for group_id in self.group_ids():
+            with self.read_only(group_id) as db:
+                results.extend((group_id, row) for row in db.fetchall(query, params))
+        return results
+
+    def close(self, group_id: Optional[int] = None):
+        """Close one shard, or all open shards"""
+        with self._lock:
+            if group_id is not None:
+                db = self._shards.pop(group_id, None)
+                if db:
+                    db.close()
+                return
+
+            for db in self._shards.values():
+                db.close()
+            self._shards.clear()
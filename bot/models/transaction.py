@@ -26,20 +26,30 @@ class Transaction:
         from_name = self._format_name(self.from_user_name or f"User {self.from_user_id}")
         to_name = self._format_name(self.to_user_name or f"User {self.to_user_id}")
         
-        # Handle both datetime objects and string timestamps from SQLite
-        if self.created_at:
-            if isinstance(self.created_at, str):
-                timestamp = self.created_at
-            else:
-                timestamp = self.created_at.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            timestamp = "N/A"
-        
         return (
             f"💸 ${self.amount:.2f} | {from_name} → {to_name}\n"
-            f"   {timestamp}"
+            f"   {self._format_timestamp()}"
         )
     
+    def format_for_user(self, user_id: int) -> str:
+        """Format as an entry of one user's statement, with their balance after it"""
+        if self.from_user_id == user_id:
+            line = f"-${self.amount:.2f} to {self.to_user_name or f'User {self.to_user_id}'}"
+            balance = self.balance_from
+        else:
+            line = f"+${self.amount:.2f} from {self.from_user_name or f'User {self.from_user_id}'}"
+            balance = self.balance_to
+        
+        return f"{line} | balance ${balance:.2f}\n   {self._format_timestamp()}"
+    
+    def _format_timestamp(self) -> str:
+        """Handle both datetime objects and string timestamps from SQLite"""
+        if not self.created_at:
+            return "N/A"
+        if isinstance(self.created_at, str):
+            return self.created_at
+        return self.created_at.strftime("%Y-%m-%d %H:%M:%S")
+    
     @staticmethod
     def _format_name(name: str) -> str:
         """Format name for display"""
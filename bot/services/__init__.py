@@ -1,16 +1,31 @@
-"""Services package"""
+"""Services package
 
-from .balance_service import BalanceService, TransferResult
-from .user_service import UserService
-from .transaction_service import TransactionService
-from .bot_service import BotService
-from .ai_service import AIService
+Exports are imported on first access (PEP 562) so that importing one
+service doesn't pull in every other one, e.g. the AI stack.
+"""
 
-__all__ = [
-    'BalanceService',
-    'TransferResult',
-    'UserService',
-    'TransactionService',
-    'BotService',
-    'AIService'
-]
+import importlib
+
+_EXPORTS = {
+    'BalanceService': '.balance_service',
+    'TransferResult': '.balance_service',
+    'UserService': '.user_service',
+    'TransactionService': '.transaction_service',
+    'BotService': '.bot_service',
+    'AIService': '.ai_service',
+    'ExportService': '.export_service',
+    'SenderService': '.sender_service',
+    'Priority': '.sender_service',
+    'ConfirmationService': '.confirmation_service',
+    'WorkerPool': '.worker_pool'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
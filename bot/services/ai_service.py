@@ -1,22 +1,82 @@
 """AI Service using LangChain and Mistral AI - Latest Patterns"""
 
+import functools
+import importlib.util
 import logging
 import json
-from typing import Dict, Optional
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence, Tuple
 from pydantic import BaseModel, Field
+from bot.services.usage_service import ERROR, FALLBACK, HIT, MISS, UsageService, token_usage
+from bot.utils.metrics import LLM_ERRORS
 
 logger = logging.getLogger(__name__)
 
-# Try to import LangChain dependencies
-try:
+# LangChain and the provider SDK take a long time to import, so they are
+# only imported when the first chat model is created (see AIService.llm)
+LANGCHAIN_MODULES = ("langchain_mistralai", "langchain_core")
+
+
+def langchain_available() -> bool:
+    """Check that LangChain is installed without importing it"""
+    return all(importlib.util.find_spec(name) is not None for name in LANGCHAIN_MODULES)
+
+
+@functools.lru_cache(maxsize=None)
+def _langchain() -> SimpleNamespace:
+    """Import the LangChain classes used here (once)"""
     from langchain_mistralai import ChatMistralAI
     from langchain_core.prompts import ChatPromptTemplate
     from langchain_core.output_parsers import PydanticOutputParser
-    LANGCHAIN_AVAILABLE = True
-except ImportError as e:
-    logger.warning(f"LangChain not available: {e}")
-    logger.warning("AI features will be disabled. Install with: pip install langchain langchain-mistralai")
-    LANGCHAIN_AVAILABLE = False
+    return SimpleNamespace(
+        ChatMistralAI=ChatMistralAI,
+        ChatPromptTemplate=ChatPromptTemplate,
+        PydanticOutputParser=PydanticOutputParser
+    )
+
+
+def _count_llm_error(operation: str, error: Exception):
+    """Count a failed LLM call as a timeout or another error"""
+    timeout = isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower()
+    LLM_ERRORS.labels(operation=operation, kind="timeout" if timeout else "error").inc()
+
+
+DETECTION_RULES = """IMPORTANT RULES:
+1. Only detect PAST transfers (already completed)
+2. Look for patterns like:
+   - "I transferred $X to @user"
+   - "I sent $X to @user"
+   - "I paid @user $X"
+   - "Sent $X to @user"
+   - "@user I sent you $X"
+   
+3. Extract:
+   - from_username: The sender (usually the message author)
+   - to_username: The receiver (mentioned with @ or by name)
+   - amount: The money amount (can be $100, 100, $100.50, etc.)
+   - recipients: When money went to more than one person ("$30 each to
+     @a @b @c", "paid @a $10 and @b $20"), every receiver with the amount
+     they got; leave empty for a single receiver
+
+4. DO NOT detect:
+   - Questions ("should I send?")
+   - Future plans ("I will send")
+   - Requests ("please send me")
+   - General chat
+
+5. Confidence scoring:
+   - 0.9-1.0: Clear transfer statement with all details
+   - 0.7-0.9: Likely transfer but some ambiguity
+   - 0.5-0.7: Possible transfer but unclear
+   - 0.0-0.5: Not a transfer"""
+
+
+class TransferRecipient(BaseModel):
+    """One receiver of a multi-recipient transfer"""
+    username: str = Field(description="Username of receiver (without @)")
+    amount: float = Field(description="Amount this receiver got")
 
 
 class TransferDetection(BaseModel):
@@ -25,15 +85,33 @@ class TransferDetection(BaseModel):
     from_username: Optional[str] = Field(default=None, description="Username of sender (without @)")
     to_username: Optional[str] = Field(default=None, description="Username of receiver (without @)")
     amount: Optional[float] = Field(default=None, description="Amount transferred")
+    recipients: List[TransferRecipient] = Field(
+        default_factory=list,
+        description="Every receiver and their amount when several people were paid; empty for one receiver"
+    )
     confidence: float = Field(description="Confidence score 0-1")
     reasoning: str = Field(description="Explanation of the decision")
+    
+    def transfers(self) -> List[Tuple[str, float]]:
+        """(receiver, amount) pairs; empty if the details are incomplete"""
+        if self.recipients:
+            return [(recipient.username, recipient.amount) for recipient in self.recipients]
+        if self.to_username and self.amount:
+            return [(self.to_username, self.amount)]
+        return []
+
+
+class TransferDetectionBatch(BaseModel):
+    """Structured output for detecting transfers in several messages at once"""
+    detections: List[TransferDetection] = Field(description="One detection per message, in message order")
 
 
 class AIService:
     """Service for AI-powered transfer detection in group chats"""
     
-    def __init__(self, api_key: str, model: str = "mistral-small-latest"):
-        if not LANGCHAIN_AVAILABLE:
+    def __init__(self, api_key: str, model: str = "mistral-small-latest", usage: Optional[UsageService] = None):
+        if not langchain_available():
+            logger.warning("AI features will be disabled. Install with: pip install langchain langchain-mistralai")
             raise ImportError(
                 "LangChain is not installed. Install with: "
                 "pip install langchain langchain-mistralai"
@@ -41,18 +119,44 @@ class AIService:
         
         self.api_key = api_key
         self.model = model
-        self.llm = ChatMistralAI(
-            api_key=api_key,
-            model=model,
-            temperature=0.0  # Deterministic for financial operations
+        self.usage = usage
+        self._llm = None
+        self._llm_lock = threading.Lock()
+    
+    @property
+    def llm(self):
+        """Chat model, created (importing LangChain) on first use"""
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    self._llm = _langchain().ChatMistralAI(
+                        api_key=self.api_key,
+                        model=self.model,
+                        temperature=0.0  # Deterministic for financial operations
+                    )
+                    logger.info(f"Initialized Mistral AI with model: {self.model}")
+        return self._llm
+    
+    def warm_up(self):
+        """Import LangChain and create the chat model ahead of the first message"""
+        self.llm
+    
+    def _record_usage(self, operation: str, group_id: Optional[int], started: float, outcome: str, response=None):
+        """Account one LLM call (tokens come from the raw model response, if any)"""
+        if self.usage is None:
+            return
+        prompt_tokens, completion_tokens = token_usage(response) if response is not None else (0, 0)
+        self.usage.record(
+            operation, self.model, group_id, time.monotonic() - started, outcome,
+            prompt_tokens, completion_tokens
         )
-        logger.info(f"Initialized Mistral AI with model: {model}")
     
     def detect_transfer(
         self,
         message: str,
         sender_username: str = None,
-        sender_first_name: str = None
+        sender_first_name: str = None,
+        group_id: Optional[int] = None
     ) -> TransferDetection:
         """
         Detect if a message describes a money transfer
@@ -61,45 +165,22 @@ class AIService:
             message: The message text
             sender_username: Username of message sender
             sender_first_name: First name of sender
+            group_id: Telegram group the message came from (usage accounting)
         
         Returns:
             TransferDetection with parsed information
         """
-        parser = PydanticOutputParser(pydantic_object=TransferDetection)
+        parser = _langchain().PydanticOutputParser(pydantic_object=TransferDetection)
         
         # Build context about sender
         sender_info = sender_username or sender_first_name or "Unknown"
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = _langchain().ChatPromptTemplate.from_messages([
             ("system", """You are a financial transaction detector for a Telegram group.
 
 Your job is to detect when someone announces they have transferred money to another person.
 
-IMPORTANT RULES:
-1. Only detect PAST transfers (already completed)
-2. Look for patterns like:
-   - "I transferred $X to @user"
-   - "I sent $X to @user"
-   - "I paid @user $X"
-   - "Sent $X to @user"
-   - "@user I sent you $X"
-   
-3. Extract:
-   - from_username: The sender (usually the message author)
-   - to_username: The receiver (mentioned with @ or by name)
-   - amount: The money amount (can be $100, 100, $100.50, etc.)
-
-4. DO NOT detect:
-   - Questions ("should I send?")
-   - Future plans ("I will send")
-   - Requests ("please send me")
-   - General chat
-
-5. Confidence scoring:
-   - 0.9-1.0: Clear transfer statement with all details
-   - 0.7-0.9: Likely transfer but some ambiguity
-   - 0.5-0.7: Possible transfer but unclear
-   - 0.0-0.5: Not a transfer
+{rules}
 
 Message sender: {sender}
 
@@ -107,25 +188,31 @@ Message sender: {sender}
             ("user", "Message: {message}")
         ])
         
-        chain = prompt | self.llm | parser
+        # Parsed separately so the response's token usage can be recorded
+        chain = prompt | self.llm
+        started = time.monotonic()
+        response = None
         
         try:
-            result = chain.invoke({
+            response = chain.invoke({
                 "message": message,
                 "sender": sender_info,
+                "rules": DETECTION_RULES,
                 "format_instructions": parser.get_format_instructions()
             })
+            result = parser.invoke(response)
+            self._record_usage("detect", group_id, started, HIT if result.is_transfer else MISS, response)
             
-            logger.info(
-                f"Transfer detection: is_transfer={result.is_transfer}, "
-                f"confidence={result.confidence:.2f}, "
-                f"from={result.from_username}, to={result.to_username}, "
-                f"amount={result.amount}"
+            logger.debug(
+                "Transfer detection: is_transfer=%s, confidence=%.2f, from=%s, to=%s, amount=%s",
+                result.is_transfer, result.confidence, result.from_username, result.to_username, result.amount
             )
             
             return result
             
         except Exception as e:
+            _count_llm_error("detect", e)
+            self._record_usage("detect", group_id, started, ERROR, response)
             logger.error(f"Error detecting transfer: {e}", exc_info=True)
             # Return safe default
             return TransferDetection(
@@ -134,17 +221,90 @@ Message sender: {sender}
                 reasoning=f"Error: {str(e)}"
             )
     
+    def detect_transfers(
+        self,
+        messages: Sequence[Tuple[str, Optional[str], Optional[str]]],
+        group_id: Optional[int] = None
+    ) -> List[TransferDetection]:
+        """
+        Detect transfers in several messages with a single LLM call
+        
+        Used when catching up on a backlog. Falls back to one call per
+        message if the batched answer can't be parsed or doesn't have one
+        detection per message.
+        
+        Args:
+            messages: (text, sender_username, sender_first_name) per message
+            group_id: Telegram group, if all messages come from one (usage accounting)
+        
+        Returns:
+            One TransferDetection per message, in the same order
+        """
+        if len(messages) == 1:
+            return [self.detect_transfer(*messages[0], group_id=group_id)]
+        
+        parser = _langchain().PydanticOutputParser(pydantic_object=TransferDetectionBatch)
+        numbered = "\n".join(
+            f"{i}. [{username or first_name or 'Unknown'}] {text}"
+            for i, (text, username, first_name) in enumerate(messages, 1)
+        )
+        
+        prompt = _langchain().ChatPromptTemplate.from_messages([
+            ("system", """You are a financial transaction detector for a Telegram group.
+
+You get a numbered list of group messages, each prefixed with its sender in
+brackets. For EACH message, decide whether its sender announces they have
+transferred money to another person. Return exactly one detection per
+message, in the same order as the list.
+
+{rules}
+
+{format_instructions}"""),
+            ("user", "Messages:\n{messages}")
+        ])
+        
+        chain = prompt | self.llm
+        started = time.monotonic()
+        response = None
+        
+        try:
+            response = chain.invoke({
+                "messages": numbered,
+                "rules": DETECTION_RULES,
+                "format_instructions": parser.get_format_instructions()
+            })
+            result = parser.invoke(response)
+            if len(result.detections) == len(messages):
+                found = any(d.is_transfer for d in result.detections)
+                self._record_usage("detect_batch", group_id, started, HIT if found else MISS, response)
+                logger.info(
+                    f"Batch transfer detection: {len(messages)} messages, "
+                    f"{sum(d.is_transfer for d in result.detections)} transfers"
+                )
+                return result.detections
+            logger.warning(
+                f"Batch detection returned {len(result.detections)} results "
+                f"for {len(messages)} messages; detecting one by one"
+            )
+        except Exception as e:
+            _count_llm_error("detect_batch", e)
+            logger.error(f"Error in batch transfer detection: {e}; detecting one by one")
+        
+        self._record_usage("detect_batch", group_id, started, FALLBACK, response)
+        return [self.detect_transfer(*message, group_id=group_id) for message in messages]
+    
     def generate_confirmation_message(
         self,
         from_user_display: str,
         to_user_display: str,
         amount: float,
         from_balance: float,
-        to_balance: float
+        to_balance: float,
+        group_id: Optional[int] = None
     ) -> str:
         """Generate a natural confirmation message"""
         
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = _langchain().ChatPromptTemplate.from_messages([
             ("system", """You are a friendly financial bot assistant.
             
 Generate a brief, natural confirmation message for a completed transfer.
@@ -166,6 +326,7 @@ Generate confirmation message:""")
         ])
         
         chain = prompt | self.llm
+        started = time.monotonic()
         
         try:
             response = chain.invoke({
@@ -175,8 +336,11 @@ Generate confirmation message:""")
                 "from_balance": from_balance,
                 "to_balance": to_balance
             })
+            self._record_usage("confirmation", group_id, started, HIT, response)
             return response.content
         except Exception as e:
+            _count_llm_error("confirmation", e)
+            self._record_usage("confirmation", group_id, started, ERROR)
             logger.error(f"Error generating message: {e}")
             # Fallback to template
             return (
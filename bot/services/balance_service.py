@@ -1,8 +1,9 @@
 """Balance service for business logic"""
 
 import logging
-from dataclasses import dataclass
-from typing import Optional
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
 from bot.models.database import Database
 from bot.models.transaction import Transaction
 from bot.services.user_service import UserService
@@ -17,6 +18,8 @@ class TransferResult:
     success: bool
     message: str
     transaction: Optional[Transaction] = None
+    duplicate: bool = False
+    transactions: List[Transaction] = field(default_factory=list)
 
 
 class BalanceService:
@@ -53,56 +56,166 @@ class BalanceService:
             if amount <= 0:
                 return TransferResult(False, "❌ Transfer amount must be positive!")
             
-            # Get users
-            from_user = self.user_service.get_by_id(from_user_id)
-            to_user = self.user_service.get_by_id(to_user_id)
-            
-            if not from_user:
-                return TransferResult(False, f"❌ Sender not found!")
-            
-            if not to_user:
-                return TransferResult(False, f"❌ Receiver not found!")
-            
-            if from_user.id == to_user.id:
-                return TransferResult(False, "❌ Cannot transfer to yourself!")
-            
-            if not from_user.can_debit(amount):
-                return TransferResult(
-                    False,
-                    f"❌ Insufficient funds! "
-                    f"{from_user.display_name} has ${from_user.balance:.2f}"
+            # Balances are read and written in one write transaction, so a
+            # concurrent transfer (another thread or worker process) can't
+            # slip in between and have its update overwritten
+            with self.db.transaction():
+                # Get users
+                from_user = self.user_service.get_by_id(from_user_id)
+                to_user = self.user_service.get_by_id(to_user_id)
+                
+                if not from_user:
+                    return TransferResult(False, f"❌ Sender not found!")
+                
+                if not to_user:
+                    return TransferResult(False, f"❌ Receiver not found!")
+                
+                if from_user.id == to_user.id:
+                    return TransferResult(False, "❌ Cannot transfer to yourself!")
+                
+                if not from_user.can_debit(amount):
+                    return TransferResult(
+                        False,
+                        f"❌ Insufficient funds! "
+                        f"{from_user.display_name} has ${from_user.balance:.2f}"
+                    )
+                
+                # Perform transfer (atomic operation)
+                new_balance_from = from_user.balance - amount
+                new_balance_to = to_user.balance + amount
+                
+                # Update balances
+                self.user_service.update_balance(from_user.id, new_balance_from)
+                self.user_service.update_balance(to_user.id, new_balance_to)
+                
+                # Record transaction; a repeated (group_id, message_id, to_user_id) violates
+                # the unique index and rolls back the balance updates above
+                transaction = self.transaction_service.create(
+                    from_user_id=from_user.id,
+                    to_user_id=to_user.id,
+                    amount=amount,
+                    balance_from=new_balance_from,
+                    balance_to=new_balance_to,
+                    message_id=message_id,
+                    group_id=group_id
                 )
             
-            # Perform transfer (atomic operation)
-            new_balance_from = from_user.balance - amount
-            new_balance_to = to_user.balance + amount
+            message = (
+                f"✅ Transfer successful!\n\n"
+                f"💸 ${amount:.2f} from {from_user.display_name} to {to_user.display_name}"
+            )
             
-            # Update balances
-            self.user_service.update_balance(from_user.id, new_balance_from)
-            self.user_service.update_balance(to_user.id, new_balance_to)
+            logger.info(
+                "Transfer: %s -> %s, amount: $%.2f",
+                from_user.display_name, to_user.display_name, amount
+            )
+            return TransferResult(True, message, transaction)
             
-            # Record transaction
-            transaction = self.transaction_service.create(
-                from_user_id=from_user.id,
-                to_user_id=to_user.id,
-                amount=amount,
-                balance_from=new_balance_from,
-                balance_to=new_balance_to,
-                message_id=message_id,
-                group_id=group_id
+        except sqlite3.IntegrityError:
+            logger.warning("Duplicate transfer ignored: group %s, message %s", group_id, message_id)
+            return TransferResult(
+                False,
+                "ℹ️ This transfer was already recorded.",
+                duplicate=True
             )
+        except Exception as e:
+            logger.error(f"Transfer error: {e}", exc_info=True)
+            return TransferResult(False, f"❌ Transfer failed: {str(e)}")
+    
+    def transfer_many(
+        self,
+        from_user_id: int,
+        transfers: Sequence[Tuple[int, float]],
+        message_id: int = None,
+        group_id: int = None
+    ) -> TransferResult:
+        """
+        Transfer from one user to several in a single DB transaction
+        
+        The sender is debited once for the total, the receivers are credited
+        and the transaction rows inserted with one executemany each, so a
+        split is recorded completely or not at all with the same number of
+        statements however many receivers it has. A receiver listed twice
+        gets the sum of their amounts.
+        
+        Args:
+            from_user_id: Internal user ID of sender
+            transfers: (receiver internal user ID, amount) pairs
+            message_id: Telegram message ID (optional)
+            group_id: Telegram group ID (optional)
+        
+        Returns:
+            TransferResult with every created transaction in `transactions`
+            (`transaction` is the last one)
+        """
+        amounts: Dict[int, float] = {}
+        for to_user_id, amount in transfers:
+            if amount <= 0:
+                return TransferResult(False, "❌ Transfer amount must be positive!")
+            amounts[to_user_id] = amounts.get(to_user_id, 0.0) + amount
+        
+        if not amounts:
+            return TransferResult(False, "❌ No receivers given!")
+        if from_user_id in amounts:
+            return TransferResult(False, "❌ Cannot transfer to yourself!")
+        
+        try:
+            with self.db.transaction():
+                users = self.user_service.get_by_ids([from_user_id, *amounts])
+                from_user = users.get(from_user_id)
+                
+                if not from_user:
+                    return TransferResult(False, "❌ Sender not found!")
+                
+                if any(to_user_id not in users for to_user_id in amounts):
+                    return TransferResult(False, "❌ Receiver not found!")
+                
+                total = sum(amounts.values())
+                if not from_user.can_debit(total):
+                    return TransferResult(
+                        False,
+                        f"❌ Insufficient funds! "
+                        f"{from_user.display_name} has ${from_user.balance:.2f}, "
+                        f"needs ${total:.2f}"
+                    )
+                
+                # Each row carries the sender's balance after that transfer,
+                # as if they had been made one after another
+                balance_from = from_user.balance
+                rows = []
+                for to_user_id, amount in amounts.items():
+                    balance_from -= amount
+                    rows.append((to_user_id, amount, balance_from, users[to_user_id].balance + amount))
+                
+                self.user_service.update_balances(
+                    [(from_user.id, balance_from)] + [(row[0], row[3]) for row in rows]
+                )
+                
+                # A repeated (group_id, message_id, to_user_id) violates the unique index
+                # and rolls the whole split back
+                transactions = self.transaction_service.create_many(
+                    from_user.id, rows, message_id, group_id
+                )
             
+            receivers = ", ".join(users[to_user_id].display_name for to_user_id in amounts)
             message = (
                 f"✅ Transfer successful!\n\n"
-                f"💸 ${amount:.2f} from {from_user.display_name} to {to_user.display_name}"
+                f"💸 ${total:.2f} from {from_user.display_name} to {receivers}"
             )
             
             logger.info(
-                f"Transfer: {from_user.display_name} -> {to_user.display_name}, "
-                f"amount: ${amount:.2f}"
+                "Transfer: %s -> %d receivers, total: $%.2f",
+                from_user.display_name, len(amounts), total
             )
-            return TransferResult(True, message, transaction)
+            return TransferResult(True, message, transactions[-1], transactions=transactions)
             
+        except sqlite3.IntegrityError:
+            logger.warning("Duplicate transfer ignored: group %s, message %s", group_id, message_id)
+            return TransferResult(
+                False,
+                "ℹ️ This transfer was already recorded.",
+                duplicate=True
+            )
         except Exception as e:
             logger.error(f"Transfer error: {e}", exc_info=True)
             return TransferResult(False, f"❌ Transfer failed: {str(e)}")
@@ -119,14 +232,13 @@ class BalanceService:
         
         total = sum(user.balance for user in users)
         
-        balance_text = "💰 All Balances:\n\n"
-        for i, user in enumerate(users, 1):
-            balance_text += f"{i}. {user.display_name}: ${user.balance:.2f}\n"
-        
-        balance_text += f"\n📊 Total: ${total:.2f}"
-        balance_text += f"\n👥 Users: {len(users)}"
+        lines = ["💰 All Balances:", ""]
+        lines.extend(f"{i}. {user.display_name}: ${user.balance:.2f}" for i, user in enumerate(users, 1))
+        lines.append("")
+        lines.append(f"📊 Total: ${total:.2f}")
+        lines.append(f"👥 Users: {len(users)}")
         
-        return balance_text
+        return "\n".join(lines)
     
     def get_transaction_history(self, limit: int = 10) -> str:
         """Get formatted transaction history"""
@@ -135,11 +247,28 @@ class BalanceService:
         if not transactions:
             return "📊 No transactions yet."
         
-        history = f"📊 Recent Transactions (Last {len(transactions)}):\n\n"
-        for i, transaction in enumerate(transactions, 1):
-            history += f"{i}. {transaction.format_display()}\n"
+        lines = [f"📊 Recent Transactions (Last {len(transactions)}):", ""]
+        lines.extend(f"{i}. {transaction.format_display()}" for i, transaction in enumerate(transactions, 1))
+        
+        return "\n".join(lines) + "\n"
+    
+    def get_user_history(self, user_id: int, limit: int = 10, before_id: int = None) -> List[str]:
+        """Get one page of a user's formatted statement
+        
+        Each entry shows the user's balance right after it, as stored with
+        the transaction, so no running sum has to be computed.
+        
+        Returns:
+            Lines of the page; the last one names the command for older entries
+        """
+        transactions = self.transaction_service.get_by_user(user_id, limit + 1, before_id)
+        if not transactions:
+            return ["📜 No older transactions." if before_id else "📜 No transactions yet."]
         
-        return history
+        lines = [transaction.format_for_user(user_id) for transaction in transactions[:limit]]
+        if len(transactions) > limit:
+            lines.extend(["", f"⏭ Older: /myhistory {transactions[limit - 1].id}"])
+        return lines
     
     def get_user_balance(self, telegram_user_id: int) -> Optional[float]:
         """Get balance for a specific Telegram user"""
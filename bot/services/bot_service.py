@@ -1,21 +1,82 @@
 """Main bot service"""
 
+import asyncio
+import contextlib
 import logging
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from telegram import Update
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application,
     CommandHandler,
+    ContextTypes,
     MessageHandler,
+    TypeHandler,
     filters
 )
 from bot.utils.config import BotConfig
+from bot.utils.update_processor import ChatOrderedUpdateProcessor
+from bot.utils.update_tracker import UpdateTracker
+from bot.utils.metrics import REGISTRY, MetricsServer, exposition, instrument
+from bot.utils import tracing
+from bot.utils.profiler import Profiler
+from bot.utils.overload import OverloadController
 from bot.models.database import Database, init_database
+from bot.models.shard_router import ShardRouter
+from bot.models.query_stats import QueryStats
 from bot.services.balance_service import BalanceService
 from bot.services.user_service import UserService
-from bot.services.ai_service import AIService
+from bot.services.export_service import ExportService
+from bot.services.sender_service import Priority, SenderService
+from bot.services.confirmation_service import ConfirmationService
+from bot.services.state_service import StateService
+from bot.services.inbox_service import PENDING, InboxService
+from bot.services.usage_service import UsageService
+from bot.services.schedule_service import ScheduleService
+from bot.services.rollup_service import RollupService
 from bot.handlers.group_handlers import GroupHandlers
+from bot.handlers.admin_handlers import AdminHandlers
+from bot.handlers.schedule_handlers import ScheduleHandlers
 
 logger = logging.getLogger(__name__)
 
+# Persist the processed-update watermark at most this often (seconds)
+OFFSET_SAVE_INTERVAL = 1.0
+
+# Seconds between refreshes of the inbox counts exported as metrics
+METRICS_REFRESH_INTERVAL = 5.0
+
+# Stored update ids further back than this are from before Telegram restarted
+# its update id sequence (it does after a week without updates)
+REPLAY_WINDOW = 1000
+
+
+def run_ingress(application: Application, config: BotConfig):
+    """Receive updates by long polling or through the built-in webhook server"""
+    if config.update_mode == "webhook":
+        logger.info(
+            f"Listening for webhook updates on {config.webhook_listen}:"
+            f"{config.webhook_port}/{config.webhook_path}"
+        )
+        application.run_webhook(
+            listen=config.webhook_listen,
+            port=config.webhook_port,
+            url_path=config.webhook_path,
+            webhook_url=config.get_webhook_url(),
+            secret_token=config.webhook_secret_token or None,
+            max_connections=config.webhook_max_connections,
+            allowed_updates=["message"],
+            drop_pending_updates=config.drop_pending_updates
+        )
+    else:
+        application.run_polling(
+            allowed_updates=["message"],
+            drop_pending_updates=config.drop_pending_updates
+        )
+
 
 class BotService:
     """Main bot service that orchestrates everything"""
@@ -24,66 +85,341 @@ class BotService:
         self.config = config
         self.config.ensure_directories()
         
+        # Optional per-statement query instrumentation (also exported as metrics)
+        self.query_stats = None
+        if config.db_instrumentation or config.metrics_port:
+            self.query_stats = QueryStats(config.slow_query_ms)
+            logger.info(f"Query instrumentation enabled (slow query: {config.slow_query_ms} ms)")
+        
         # Initialize database
-        self.db = Database(config.database_url)
+        self.db = Database(config.database_url, self.query_stats)
         init_database(self.db)
         
+        # Optional per-group shards
+        self.shard_router = None
+        if config.shard_by_group:
+            self.shard_router = ShardRouter(
+                config.shard_dir,
+                config.max_open_shards,
+                stats=self.query_stats
+            )
+            logger.info(f"Sharding by group enabled: {config.shard_dir}")
+        
         # Initialize services
         self.user_service = UserService(self.db, config.default_balance)
         self.balance_service = BalanceService(self.db, config.default_balance)
         
+        # Last fully processed update, kept across restarts. Worker processes
+        # each see only some chats, so only a single-process bot tracks it.
+        self.state_service = StateService(self.db)
+        self.update_tracker = None
+        if config.workers == 1:
+            self.update_tracker = UpdateTracker(self.state_service.get_last_update_id())
+        self._offset_saved_at = 0.0
+        
+        # Optional durable inbox between the handlers and processing
+        self.inbox = None
+        if config.inbox_consumers > 0:
+            self.inbox = InboxService(
+                self.db,
+                worker_id=config.worker_id,
+                workers=config.workers,
+                max_attempts=config.inbox_max_attempts
+            )
+            logger.info(f"Inbox enabled with {config.inbox_consumers} consumers")
+        
+        # All handler replies go through the rate-limited sender
+        self.sender = SenderService(
+            global_rate=config.send_global_rate,
+            group_rate_per_minute=config.send_group_rate_per_minute,
+            info_ttl=config.send_info_ttl
+        )
+        
+        # Exports read through their own connection so they never share
+        # statement state with the handlers' connection
+        self.export_db = Database(config.database_url, self.query_stats)
+        self.export_service = ExportService(self.export_db, config.export_chunk_size)
+        self.profiler = Profiler(config.profile_dir, config.profile_max_seconds)
+        self._profile_task = None
+        # Background AI warm-up started in post_init (None without AI)
+        self._warm_up = None
+        
+        # LLM call accounting, buffered and written every few seconds
+        self.usage = None
+        self._usage_task = None
+        if config.enable_ai:
+            self.usage = UsageService(
+                self.db,
+                config.ai_usage_flush_seconds,
+                prompt_price=config.ai_price_prompt_per_m,
+                completion_price=config.ai_price_completion_per_m
+            )
+        
+        # Scheduled and recurring transfers, run on the event loop
+        self.schedules = ScheduleService(
+            self.db,
+            self._balance_service_for,
+            worker_id=config.worker_id,
+            workers=config.workers,
+            batch_size=config.schedule_batch_size,
+            horizon=config.schedule_horizon_seconds
+        )
+        self.schedule_handlers = None
+        self._backfill_task = None
+        
+        self.admin_handlers = AdminHandlers(
+            config,
+            self.export_service,
+            self.shard_router,
+            self.query_stats,
+            self.sender,
+            self.inbox,
+            self.profiler,
+            self.usage
+        )
+        
         # Initialize AI service if enabled
         self.ai_service = None
         self.group_handlers = None
         
+        self.confirmations = None
+        
+        # Degrades passive detection when updates or the LLM back up
+        self.overload = None
+        if config.overload_queue_depth > 0:
+            self.overload = OverloadController(
+                self._queue_depth,
+                config.overload_queue_depth,
+                config.overload_llm_seconds,
+                config.overload_sample_rate,
+                config.overload_hold_seconds
+            )
+        
+        # Messages deferred under overload wait in the inbox table, also
+        # without inbox consumers
+        deferred = None
+        if self.overload is not None:
+            deferred = self.inbox or InboxService(self.db, worker_id=config.worker_id, workers=config.workers)
+        
         if config.enable_ai:
             try:
+                # Imported here so a bot without AI never loads the AI stack
+                from bot.services.ai_service import AIService
                 api_key = config.get_ai_api_key()
-                self.ai_service = AIService(api_key, config.ai_model)
+                self.ai_service = AIService(api_key, config.ai_model, self.usage)
+                if config.coalesce_confirmations:
+                    self.confirmations = ConfirmationService(
+                        self.sender,
+                        config.coalesce_window_seconds,
+                        formatter=self._format_confirmation
+                    )
                 self.group_handlers = GroupHandlers(
                     self.ai_service,
                     self.balance_service,
-                    self.user_service
+                    self.user_service,
+                    self.shard_router,
+                    config.dedup_cache_size,
+                    self.sender,
+                    self.confirmations,
+                    config.render_cache_size,
+                    self.inbox,
+                    config.inbox_consumers,
+                    self.overload,
+                    deferred,
+                    config.catchup_batch_size,
+                    shared_database=config.workers > 1
                 )
+                self.schedule_handlers = ScheduleHandlers(config, self.schedules, self.group_handlers)
                 logger.info(f"AI service initialized with {config.ai_provider}")
             except Exception as e:
                 logger.warning(f"AI service not available: {e}")
                 logger.info("Bot will run without AI features")
         
         self.application = None
+        self.update_processor = None
+        
+        # Prometheus metrics endpoint; worker processes use the ports after
+        # the ingress process's one
+        self.metrics_server = None
+        # Scrapes run on the metrics server's thread, which must not use the
+        # loop's database connection; DB-backed values are cached on the loop
+        self._inbox_counts = {}
+        self._metrics_task = None
+        if config.metrics_port:
+            port = config.metrics_port + (config.worker_id + 1 if config.workers > 1 else 0)
+            self.metrics_server = MetricsServer(config.metrics_host, port)
+            REGISTRY.add_collector(self._collect_metrics)
+        
+        # Update traces; worker processes write their own file
+        self.tracer = None
+        if config.trace_file:
+            path = config.trace_file + (f".{config.worker_id}" if config.workers > 1 else "")
+            self.tracer = tracing.Tracer(
+                tracing.FileExporter(path),
+                config.trace_sample_rate,
+                config.trace_slow_seconds
+            )
+            tracing.configure(self.tracer)
+            logger.info(f"Tracing to {path} (sample rate {config.trace_sample_rate})")
+    
+    def _collect_metrics(self):
+        """Scrape-time metrics from components that already count them"""
+        lines = self.sender.exposition()
+        if self.query_stats:
+            lines += self.query_stats.exposition()
+        if self.update_processor:
+            lines += exposition(
+                "bot_update_processor", "gauge", "Concurrent update processor state",
+                [
+                    ({"state": "active"}, self.update_processor.active),
+                    ({"state": "chats_in_flight"}, len(self.update_processor.waiting_chats))
+                ]
+            )
+        if self._inbox_counts:
+            lines += exposition(
+                "bot_inbox_messages", "gauge", "Inbox messages by status",
+                [({"status": status}, count) for status, count in self._inbox_counts.items()]
+            )
+        if self.tracer:
+            lines += self.tracer.exposition()
+        if self.overload:
+            lines += self.overload.exposition()
+        lines += self.schedules.exposition()
+        return lines
+    
+    def _balance_service_for(self, group_id: int) -> BalanceService:
+        """Balance service of a group's ledger (its shard when sharding)"""
+        if self.shard_router is None:
+            return self.balance_service
+        return BalanceService(self.shard_router.get(group_id), self.config.default_balance)
+    
+    async def _announce_schedule_runs(self, results):
+        """Post each group's scheduled transfers of a batch"""
+        for group_id, text in ScheduleService.format_results(results).items():
+            self.sender.send_message(group_id, text, Priority.CONFIRMATION)
+    
+    async def _backfill_rollups(self):
+        """Add pre-existing transactions to the /stats rollups of every ledger"""
+        group_ids = self.shard_router.group_ids() if self.shard_router else []
+        for group_id in [None] + group_ids:
+            # Shards stay pinned while their backfill yields to the loop
+            pin = self.shard_router.pinned(group_id) if group_id is not None else contextlib.nullcontext(self.db)
+            with pin as db:
+                try:
+                    await RollupService(db, self.config.rollup_backfill_chunk).backfill()
+                except Exception as e:
+                    logger.error(f"Rollup backfill of {db.database_url} failed: {e}", exc_info=True)
+    
+    def _queue_depth(self) -> int:
+        """Updates in flight plus inbox messages waiting (overload signal)"""
+        depth = self.update_processor.pending if self.update_processor else 0
+        if self.inbox:
+            depth += self._refresh_inbox_counts()[PENDING]
+        return depth
+    
+    def _refresh_inbox_counts(self) -> Dict[str, int]:
+        """Read the inbox counts (on the loop thread) and cache them for scrapes"""
+        self._inbox_counts = self.inbox.counts()
+        return self._inbox_counts
+    
+    async def _refresh_metrics(self):
+        """Keep the cached DB-backed metrics current until cancelled"""
+        while True:
+            try:
+                self._refresh_inbox_counts()
+            except Exception as e:
+                logger.error(f"Failed to refresh inbox metrics: {e}")
+            await asyncio.sleep(METRICS_REFRESH_INTERVAL)
+    
+    def _format_confirmation(self, confirmation) -> str:
+        """Render a single (uncoalesced) confirmation with the AI service"""
+        return self.ai_service.generate_confirmation_message(
+            from_user_display=confirmation.from_display,
+            to_user_display=confirmation.to_display,
+            amount=confirmation.amount,
+            from_balance=confirmation.from_balance,
+            to_balance=confirmation.to_balance,
+            group_id=confirmation.group_id
+        )
     
     def _setup_handlers(self):
         """Setup all command and callback handlers"""
         
+        # Track processed update ids around all other handlers. With
+        # concurrent updates the processor begins them on receipt instead,
+        # before they queue behind their chat
+        if self.update_tracker:
+            if self.update_processor is None:
+                self.application.add_handler(TypeHandler(Update, self._begin_update), group=-1)
+            self.application.add_handler(TypeHandler(Update, self._finish_update), group=1)
+        
+        # Admin commands
+        self.application.add_handler(
+            CommandHandler("export", instrument("export", self.admin_handlers.export_ledger))
+        )
+        self.application.add_handler(
+            CommandHandler("shards", instrument("shards", self.admin_handlers.show_shards))
+        )
+        self.application.add_handler(
+            CommandHandler("dbstats", instrument("dbstats", self.admin_handlers.show_db_stats))
+        )
+        self.application.add_handler(
+            CommandHandler("sendstats", instrument("sendstats", self.admin_handlers.show_send_stats))
+        )
+        self.application.add_handler(
+            CommandHandler("inbox", instrument("inbox", self.admin_handlers.show_inbox))
+        )
+        self.application.add_handler(
+            CommandHandler("profile", instrument("profile", self.admin_handlers.run_profile))
+        )
+        self.application.add_handler(
+            CommandHandler("aistats", instrument("aistats", self.admin_handlers.show_ai_stats))
+        )
+        
         if not self.group_handlers:
             logger.error("Group handlers not initialized! AI features required.")
             return
         
         # Command handlers
         self.application.add_handler(
-            CommandHandler("help", self.group_handlers.help_command)
+            CommandHandler("help", instrument("help", self.group_handlers.help_command))
+        )
+        self.application.add_handler(
+            CommandHandler("start", instrument("start", self.group_handlers.help_command))
+        )
+        self.application.add_handler(
+            CommandHandler("mybalance", instrument("mybalance", self.group_handlers.show_my_balance))
+        )
+        self.application.add_handler(
+            CommandHandler("balances", instrument("balances", self.group_handlers.show_all_balances))
+        )
+        self.application.add_handler(
+            CommandHandler("users", instrument("users", self.group_handlers.show_users))
+        )
+        self.application.add_handler(
+            CommandHandler("history", instrument("history", self.group_handlers.show_group_history))
         )
         self.application.add_handler(
-            CommandHandler("start", self.group_handlers.help_command)
+            CommandHandler("myhistory", instrument("myhistory", self.group_handlers.show_my_history))
         )
         self.application.add_handler(
-            CommandHandler("mybalance", self.group_handlers.show_my_balance)
+            CommandHandler("stats", instrument("stats", self.group_handlers.show_stats))
         )
         self.application.add_handler(
-            CommandHandler("balances", self.group_handlers.show_all_balances)
+            CommandHandler("schedule", instrument("schedule", self.schedule_handlers.schedule))
         )
         self.application.add_handler(
-            CommandHandler("users", self.group_handlers.show_users)
+            CommandHandler("schedules", instrument("schedules", self.schedule_handlers.list_schedules))
         )
         self.application.add_handler(
-            CommandHandler("history", self.group_handlers.show_group_history)
+            CommandHandler("unschedule", instrument("unschedule", self.schedule_handlers.unschedule))
         )
         
         # Group message monitoring for auto-detection
         self.application.add_handler(
             MessageHandler(
                 filters.TEXT & filters.ChatType.GROUPS & ~filters.COMMAND,
-                self.group_handlers.handle_group_message
+                instrument("group_message", self.group_handlers.handle_group_message)
             )
         )
         logger.info("Group message monitoring enabled")
@@ -95,13 +431,114 @@ class BotService:
         """Handle errors"""
         logger.error(f"Update {update} caused error {context.error}", exc_info=context.error)
         
+        # Sending another message during a flood wait only extends it
+        if isinstance(context.error, RetryAfter):
+            return
+        
         if update and update.effective_message:
-            await update.effective_message.reply_text(
-                "❌ An error occurred. Please try again or contact support."
+            self.sender.reply_text(
+                update.effective_message,
+                "❌ An error occurred. Please try again or contact support.",
+                Priority.INFO
             )
     
+    async def _begin_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        self.update_tracker.begin(update.update_id)
+    
+    async def _finish_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if self.update_tracker.finish(update.update_id):
+            now = time.monotonic()
+            if now - self._offset_saved_at >= OFFSET_SAVE_INTERVAL:
+                self._save_offset()
+                self._offset_saved_at = now
+    
+    def _save_offset(self):
+        self.state_service.set_last_update_id(self.update_tracker.watermark)
+    
+    async def _catch_up(self, application: Application):
+        """Process messages sent while the bot was offline, in bulk
+        
+        Runs before the updater starts. Pending updates are fetched a page
+        at a time and handed to GroupHandlers.process_backlog; fetching the
+        next page confirms the previous one to Telegram, so a crash during
+        catch-up resumes at the unfinished page. Each group then gets one
+        summary message instead of a reply per transfer.
+        """
+        bot = application.bot
+        # getUpdates is refused while a webhook is set; run_webhook sets it again
+        await bot.delete_webhook(drop_pending_updates=False)
+        
+        watermark = self.update_tracker.watermark
+        summaries = {}
+        offset = None
+        caught_up = 0
+        started = time.perf_counter()
+        
+        while True:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=0,
+                limit=100,
+                allowed_updates=["message"]
+            )
+            if not updates:
+                break
+            
+            # Updates at or just below the watermark were processed before the
+            # restart but not yet confirmed to Telegram
+            fresh = [u for u in updates if not (watermark - REPLAY_WINDOW < u.update_id <= watermark)]
+            await self.group_handlers.process_backlog(fresh, summaries, self.config.catchup_batch_size)
+            caught_up += len(fresh)
+            
+            offset = updates[-1].update_id + 1
+            self.update_tracker.advance(updates[-1].update_id)
+            self._save_offset()
+        
+        if caught_up:
+            transfers = sum(len(summary.transfers) for summary in summaries.values())
+            logger.info(
+                f"Caught up on {caught_up} pending updates in {time.perf_counter() - started:.1f}s: "
+                f"{transfers} transfers in {len(summaries)} groups"
+            )
+            await self.group_handlers.send_backlog_summaries(bot, summaries)
+    
     async def post_init(self, application: Application):
         """Post initialization hook"""
+        if self.config.concurrent_updates > 1:
+            # Blocking LLM calls run in the default executor; size it so every
+            # concurrently processed update can have a call in flight
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=self.config.concurrent_updates)
+            )
+        
+        await self.sender.start(application.bot)
+        
+        if self.metrics_server:
+            self.metrics_server.start()
+            if self.inbox:
+                self._metrics_task = asyncio.ensure_future(self._refresh_metrics())
+        
+        if hasattr(signal, "SIGUSR1"):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self._profile_on_signal)
+        
+        if self.ai_service:
+            # LangChain is imported and the chat model created in the
+            # background, so startup doesn't wait for it
+            self._warm_up = asyncio.get_running_loop().run_in_executor(None, self.ai_service.warm_up)
+        
+        if self.usage:
+            self._usage_task = asyncio.ensure_future(self.usage.run())
+        
+        if self.update_tracker and self.group_handlers and not self.config.drop_pending_updates:
+            await self._catch_up(application)
+        
+        if self.group_handlers:
+            await self.group_handlers.start_inbox(application.bot)
+            await self.group_handlers.start_deferred(application.bot)
+        
+        await self.schedules.start(self._announce_schedule_runs)
+        self._backfill_task = asyncio.ensure_future(self._backfill_rollups())
+        
         logger.info("Bot initialized successfully")
         logger.info(f"Database: {self.config.database_url}")
         
@@ -109,36 +546,102 @@ class BotService:
         user_count = self.user_service.get_user_count()
         logger.info(f"Users in database: {user_count}")
     
+    def _profile_on_signal(self):
+        """SIGUSR1: start a profiling session, or end the running one early"""
+        if self.profiler.running:
+            self.profiler.stop()
+            return
+        session = self.profiler.start(self.config.profile_seconds)
+        self._profile_task = asyncio.ensure_future(self._profile_session(session))
+    
+    async def _profile_session(self, session: asyncio.Task):
+        try:
+            result, path = await session
+            logger.info(f"Profile written to {path}\n{result.format_summary()}")
+        except Exception as e:
+            logger.error(f"Profiling session failed: {e}", exc_info=True)
+    
+    async def post_stop(self, application: Application):
+        """Post stop hook: drain outbound messages while the bot can still send"""
+        self.profiler.stop()
+        if self.group_handlers:
+            await self.group_handlers.stop_inbox()
+            await self.group_handlers.stop_deferred()
+        await self.schedules.stop()
+        if self._backfill_task:
+            # Resumes from its stored progress on the next start
+            self._backfill_task.cancel()
+            await asyncio.gather(self._backfill_task, return_exceptions=True)
+        if self.update_tracker:
+            self._save_offset()
+        if self.confirmations:
+            await self.confirmations.stop()
+        await self.sender.stop()
+        if self._metrics_task:
+            self._metrics_task.cancel()
+            await asyncio.gather(self._metrics_task, return_exceptions=True)
+        if self._usage_task:
+            # Writes out what's still buffered
+            self._usage_task.cancel()
+            await asyncio.gather(self._usage_task, return_exceptions=True)
+    
     async def post_shutdown(self, application: Application):
         """Post shutdown hook"""
         logger.info("Shutting down bot...")
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.tracer:
+            self.tracer.shutdown()
+            tracing.configure(None)
         self.db.close()
+        self.export_db.close()
+        if self.shard_router:
+            self.shard_router.close()
         logger.info("Bot shutdown complete")
     
-    def run(self):
-        """Start the bot"""
-        logger.info("Initializing bot application...")
+    def build_application(self, with_updater: bool = True) -> Application:
+        """Build the Application with all handlers registered
         
-        self.application = (
+        Worker processes build it without an updater: updates reach them
+        from the ingress process instead of from Telegram.
+        """
+        builder = (
             Application.builder()
             .token(self.config.token)
             .post_init(self.post_init)
+            .post_stop(self.post_stop)
             .post_shutdown(self.post_shutdown)
-            .build()
         )
+        if not with_updater:
+            builder = builder.updater(None)
+        
+        if self.config.concurrent_updates > 1:
+            # Chats are processed concurrently; updates within a chat stay in order
+            self.update_processor = ChatOrderedUpdateProcessor(
+                self.config.concurrent_updates,
+                self.config.max_pending_updates,
+                tracker=self.update_tracker
+            )
+            builder = builder.concurrent_updates(self.update_processor)
+            logger.info(f"Concurrent update processing: {self.config.concurrent_updates} at a time")
+        
+        self.application = builder.build()
         
         logger.info("Setting up handlers...")
         self._setup_handlers()
+        return self.application
+    
+    def run(self):
+        """Start the bot"""
+        logger.info("Initializing bot application...")
+        self.build_application()
         
         logger.info("🤖 Bot is running! Add to your group and give admin access.")
         logger.info("📝 Users will be auto-created with $1000 balance")
         logger.info("💬 Bot will auto-detect transfer messages")
         logger.info("Press Ctrl+C to stop.")
         
-        self.application.run_polling(
-            allowed_updates=["message"],
-            drop_pending_updates=True
-        )
+        run_ingress(self.application, self.config)
     
     def stop(self):
         """Stop the bot gracefully"""
@@ -146,3 +649,6 @@ class BotService:
             logger.info("Stopping bot...")
             self.application.stop()
             self.db.close()
+            self.export_db.close()
+            if self.shard_router:
+                self.shard_router.close()
@@ -0,0 +1,138 @@
+"""Coalescing of transfer confirmations per group"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from bot.services.sender_service import Priority, SenderService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TransferConfirmation:
+    """A completed transfer waiting to be confirmed in its group"""
+    from_display: str
+    to_display: str
+    amount: float
+    from_balance: float
+    to_balance: float
+    group_id: Optional[int] = None
+
+    def format_template(self) -> str:
+        """Plain confirmation text for a single transfer"""
+        return (
+            f"✅ Transfer recorded!\n"
+            f"💸 ${self.amount:.2f} from {self.from_display} to {self.to_display}\n\n"
+            f"Updated balances:\n"
+            f"• {self.from_display}: ${self.from_balance:.2f}\n"
+            f"• {self.to_display}: ${self.to_balance:.2f}"
+        )
+
+
+@dataclass
+class _PendingBatch:
+    reply_to: object
+    entries: List[TransferConfirmation]
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class ConfirmationService:
+    """Gathers confirmations per group over a short window and sends one summary
+
+    The first confirmation in a group opens a window of `window` seconds.
+    Every transfer detected in that group before the window closes goes
+    into the same message, which lists each transfer and the final balance
+    of every user involved. A window holding a single transfer is sent on
+    its own, optionally rendered by `formatter` (e.g. the AI confirmation
+    generator, run in the default executor).
+    """
+
+    def __init__(
+        self,
+        sender: SenderService,
+        window: float = 3.0,
+        max_batch: int = 20,
+        formatter: Optional[Callable[[TransferConfirmation], str]] = None
+    ):
+        self.sender = sender
+        self.window = window
+        self.max_batch = max_batch
+        self.formatter = formatter
+        self._pending: Dict[int, _PendingBatch] = {}
+        self._tasks = set()
+
+        # Metrics
+        self.confirmations = 0
+        self.messages = 0
+
+    def add(self, message, confirmation: TransferConfirmation):
+        """Queue a confirmation for the chat of a Telegram message"""
+        self.confirmations += 1
+        chat_id = message.chat_id
+
+        batch = self._pending.get(chat_id)
+        if batch is None:
+            batch = self._pending[chat_id] = _PendingBatch(message, [])
+            loop = asyncio.get_running_loop()
+            batch.timer = loop.call_later(self.window, self._schedule_flush, chat_id)
+        batch.entries.append(confirmation)
+
+        if len(batch.entries) >= self.max_batch:
+            batch.timer.cancel()
+            self._schedule_flush(chat_id)
+
+    def _schedule_flush(self, chat_id: int):
+        task = asyncio.ensure_future(self.flush(chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, chat_id: int):
+        """Send everything pending for a chat"""
+        batch = self._pending.pop(chat_id, None)
+        if not batch:
+            return
+        if batch.timer:
+            batch.timer.cancel()
+
+        self.messages += 1
+        if len(batch.entries) == 1:
+            text = await self._render_single(batch.entries[0])
+            self.sender.reply_text(batch.reply_to, text, Priority.CONFIRMATION)
+            return
+
+        self.sender.send_message(chat_id, self.format_summary(batch.entries), Priority.CONFIRMATION)
+        logger.debug("Coalesced %d confirmations in chat %s", len(batch.entries), chat_id)
+
+    async def _render_single(self, confirmation: TransferConfirmation) -> str:
+        if self.formatter is None:
+            return confirmation.format_template()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.formatter, confirmation)
+        except Exception as e:
+            logger.error(f"Error formatting confirmation: {e}")
+            return confirmation.format_template()
+
+    @staticmethod
+    def format_summary(entries: List[TransferConfirmation]) -> str:
+        """Combined confirmation for several transfers"""
+        lines = [f"✅ {len(entries)} transfers recorded!", ""]
+        balances: Dict[str, float] = {}
+
+        for i, entry in enumerate(entries, 1):
+            lines.append(f"{i}. 💸 ${entry.amount:.2f} {entry.from_display} → {entry.to_display}")
+            # Later transfers carry the newer balance
+            balances[entry.from_display] = entry.from_balance
+            balances[entry.to_display] = entry.to_balance
+
+        lines.extend(["", "Updated balances:"])
+        lines.extend(f"• {name}: ${balance:.2f}" for name, balance in balances.items())
+        return "\n".join(lines)
+
+    async def stop(self):
+        """Flush every pending window"""
+        for chat_id in list(self._pending):
+            await self.flush(chat_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
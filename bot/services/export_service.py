@@ -0,0 +1,140 @@
+"""Export service for streaming the transaction ledger"""
+
+import csv
+import gzip
+import json
+import logging
+import sys
+from typing import Dict, Iterator, Optional
+from bot.models.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class ExportService:
+    """Service for exporting transactions to CSV or JSONL in fixed-size chunks"""
+
+    FORMATS = ('csv', 'jsonl')
+
+    COLUMNS = [
+        'id',
+        'created_at',
+        'group_id',
+        'message_id',
+        'from_user_id',
+        'from_username',
+        'from_first_name',
+        'to_user_id',
+        'to_username',
+        'to_first_name',
+        'amount',
+        'balance_from',
+        'balance_to'
+    ]
+
+    def __init__(self, db: Database, chunk_size: int = 1000):
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be positive")
+        self.db = db
+        self.chunk_size = chunk_size
+
+    def iter_rows(self, group_id: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Yield ledger rows in id order, one chunk at a time
+
+        Every chunk is a separate keyset query (`id > last_id`), so no read
+        transaction stays open between chunks and writers are never blocked
+        for longer than a single chunk read.
+        """
+        group_filter = "AND t.group_id = ?" if group_id is not None else ""
+        query = f"""
+            SELECT t.id, t.created_at, t.group_id, t.message_id,
+                   t.from_user_id,
+                   u1.username as from_username,
+                   u1.first_name as from_first_name,
+                   t.to_user_id,
+                   u2.username as to_username,
+                   u2.first_name as to_first_name,
+                   t.amount, t.balance_from, t.balance_to
+            FROM transactions t
+            JOIN users u1 ON t.from_user_id = u1.id
+            JOIN users u2 ON t.to_user_id = u2.id
+            WHERE t.id > ? {group_filter}
+            ORDER BY t.id
+            LIMIT ?
+        """
+
+        last_id = 0
+        while True:
+            params = (last_id, group_id, self.chunk_size) if group_id is not None \
+                else (last_id, self.chunk_size)
+            rows = self.db.fetchmany(query, params, self.chunk_size)
+
+            for row in rows:
+                yield {column: row[column] for column in self.COLUMNS}
+
+            if len(rows) < self.chunk_size:
+                return
+            last_id = rows[-1]['id']
+
+    def write(self, stream, fmt: str = 'csv', group_id: Optional[int] = None) -> int:
+        """Write ledger rows to an open text stream, returning the row count"""
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        count = 0
+        if fmt == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=self.COLUMNS)
+            writer.writeheader()
+            for row in self.iter_rows(group_id):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in self.iter_rows(group_id):
+                stream.write(json.dumps(row, ensure_ascii=False))
+                stream.write("\n")
+                count += 1
+
+        return count
+
+    def export(
+        self,
+        output: str,
+        fmt: str = 'csv',
+        compress: bool = False,
+        group_id: Optional[int] = None
+    ) -> int:
+        """
+        Export the ledger to a file
+
+        Args:
+            output: Output file path, or '-' for stdout
+            fmt: 'csv' or 'jsonl'
+            compress: Gzip-compress the output
+            group_id: Only export transactions from this Telegram group
+
+        Returns:
+            Number of exported transactions
+        """
+        if output == '-':
+            if compress:
+                with gzip.open(sys.stdout.buffer, 'wt', encoding='utf-8', newline='') as stream:
+                    count = self.write(stream, fmt, group_id)
+            else:
+                count = self.write(sys.stdout, fmt, group_id)
+        elif compress:
+            with gzip.open(output, 'wt', encoding='utf-8', newline='') as stream:
+                count = self.write(stream, fmt, group_id)
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as stream:
+                count = self.write(stream, fmt, group_id)
+
+        logger.info(f"Exported {count} transactions to {output} ({fmt}, gzip={compress})")
+        return count
+
+    @staticmethod
+    def filename(fmt: str = 'csv', compress: bool = False, group_id: Optional[int] = None) -> str:
+        """Build a default export filename"""
+        name = f"ledger_{group_id}" if group_id is not None else "ledger"
+        name += f".{fmt}"
+        return name + ".gz" if compress else name
@@ -0,0 +1,329 @@
+"""Durable inbox of group messages waiting to be processed"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+from bot.models.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Rows of the groups a worker owns: group_id % workers == worker_id, with
+# Python's sign rule (SQLite's % keeps the sign of negative group ids)
+_OWNED = "((group_id % ?) + ?) % ? = ?"
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+# Held back under overload until detection catches up (see GroupHandlers)
+DEFERRED = "deferred"
+
+
+@dataclass
+class InboxItem:
+    """A claimed inbox row"""
+    id: int
+    group_id: int
+    message_id: int
+    payload: dict
+    attempts: int
+
+
+class InboxService:
+    """Service for the inbox table
+    
+    Handlers append incoming messages (the serialized update) and return;
+    consumers claim rows, process them and mark them done. Rows survive
+    crashes: anything still `processing` at startup is put back to
+    `pending` by recover(). Messages deferred under overload wait here too,
+    as `deferred` rows that consumers don't claim. Claims keep each group in order: a group's next
+    message is only claimed once its previous one is no longer processing.
+    Workers sharing the database only see the rows of their own chats, by
+    the same group_id % workers rule that routes updates, so rows left
+    behind are picked up by their new worker after WORKERS changes.
+    """
+    
+    def __init__(self, db: Database, worker_id: int = 0, workers: int = 1, max_attempts: int = 3):
+        self.db = db
+        self.worker_id = worker_id
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._owned = (workers, workers, workers, worker_id)
+    
+    def append(self, group_id: int, message_id: int, payload: dict) -> bool:
+        """Store a message; returns False if it is already in the inbox"""
+        cursor = self.db.execute(
+            """
+            INSERT OR IGNORE INTO inbox (group_id, message_id, payload)
+            VALUES (?, ?, ?)
+            """,
+            (group_id, message_id, json.dumps(payload))
+        )
+        return cursor.rowcount == 1
+    
+    def claim(self) -> Optional[InboxItem]:
+        """Claim the oldest pending message of a group with nothing in progress"""
+        # fetchall steps the UPDATE ... RETURNING statement to completion
+        rows = self.db.fetchall(
+            f"""
+            UPDATE inbox
+            SET status = 'processing', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT i.id FROM inbox i
+                WHERE i.status = 'pending' AND {_OWNED}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM inbox p
+                      WHERE p.group_id = i.group_id AND p.status = 'processing'
+                  )
+                ORDER BY i.id
+                LIMIT 1
+            )
+            RETURNING id, group_id, message_id, payload, attempts
+            """,
+            self._owned
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        return InboxItem(
+            id=row['id'],
+            group_id=row['group_id'],
+            message_id=row['message_id'],
+            payload=json.loads(row['payload']),
+            attempts=row['attempts']
+        )
+    
+    def complete(self, item_id: int):
+        """Mark a message as processed (unless it was deferred meanwhile)"""
+        self.db.execute(
+            """
+            UPDATE inbox SET status = 'done', error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'processing'
+            """,
+            (item_id,)
+        )
+    
+    def fail(self, item: InboxItem, error: str):
+        """Put a message back for a retry, or park it as failed after max_attempts"""
+        status = FAILED if item.attempts >= self.max_attempts else PENDING
+        self.db.execute(
+            """
+            UPDATE inbox SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'processing'
+            """,
+            (status, error[:500], item.id)
+        )
+        return status
+    
+    def defer(self, group_id: int, message_id: int, payload: dict):
+        """Hold a message back for later detection, durably
+        
+        A message being processed from the inbox is switched to deferred,
+        so its consumer's complete() leaves it alone.
+        """
+        self.db.execute(
+            """
+            INSERT INTO inbox (group_id, message_id, payload, status)
+            VALUES (?, ?, ?, 'deferred')
+            ON CONFLICT (group_id, message_id) DO UPDATE SET
+                status = 'deferred', attempts = 0, updated_at = CURRENT_TIMESTAMP
+            WHERE inbox.status IN ('pending', 'processing')
+            """,
+            (group_id, message_id, json.dumps(payload))
+        )
+    
+    def deferred(self, limit: int) -> List[InboxItem]:
+        """The oldest deferred messages (they stay deferred until complete_deferred)"""
+        rows = self.db.fetchall(
+            f"""
+            SELECT id, group_id, message_id, payload, attempts FROM inbox
+            WHERE status = 'deferred' AND {_OWNED}
+            ORDER BY id
+            LIMIT ?
+            """,
+            (*self._owned, limit)
+        )
+        return [
+            InboxItem(
+                id=row['id'],
+                group_id=row['group_id'],
+                message_id=row['message_id'],
+                payload=json.loads(row['payload']),
+                attempts=row['attempts']
+            )
+            for row in rows
+        ]
+    
+    def complete_deferred(self, item_ids: List[int]):
+        """Mark deferred messages as processed"""
+        self.db.executemany(
+            """
+            UPDATE inbox SET status = 'done', updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'deferred'
+            """,
+            [(item_id,) for item_id in item_ids]
+        )
+    
+    def recover(self) -> int:
+        """Return messages left in progress by a crash to the queue"""
+        cursor = self.db.execute(
+            f"UPDATE inbox SET status = 'pending' WHERE status = 'processing' AND {_OWNED}",
+            self._owned
+        )
+        return cursor.rowcount
+    
+    def retry_failed(self) -> int:
+        """Replay messages that exhausted their attempts"""
+        cursor = self.db.execute(
+            f"UPDATE inbox SET status = 'pending', attempts = 0 WHERE status = 'failed' AND {_OWNED}",
+            self._owned
+        )
+        return cursor.rowcount
+    
+    def purge_done(self, older_than_hours: float = 24.0) -> int:
+        """Delete processed messages older than the given age"""
+        cursor = self.db.execute(
+            f"""
+            DELETE FROM inbox
+            WHERE status = 'done' AND updated_at < datetime('now', ?) AND {_OWNED}
+            """,
+            (f"-{older_than_hours} hours", *self._owned)
+        )
+        return cursor.rowcount
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of messages per status"""
+        rows = self.db.fetchall(
+            f"SELECT status, COUNT(*) as count FROM inbox WHERE {_OWNED} GROUP BY status",
+            self._owned
+        )
+        counts = {status: 0 for status in (PENDING, PROCESSING, DONE, FAILED, DEFERRED)}
+        counts.update({row['status']: row['count'] for row in rows})
+        return counts
+    
+    def oldest_pending_age(self) -> float:
+        """Seconds the oldest pending message has been waiting (0 if none)"""
+        row = self.db.fetchone(
+            f"""
+            SELECT (julianday('now') - julianday(MIN(created_at))) * 86400 as age
+            FROM inbox WHERE status = 'pending' AND {_OWNED}
+            """,
+            self._owned
+        )
+        return (row['age'] or 0.0) if row else 0.0
+    
+    def format_stats(self) -> str:
+        """Format inbox metrics for display"""
+        counts = self.counts()
+        return (
+            "📥 Inbox\n\n"
+            f"Pending: {counts[PENDING]}\n"
+            f"Processing: {counts[PROCESSING]}\n"
+            f"Failed: {counts[FAILED]}\n"
+            f"Deferred: {counts[DEFERRED]}\n"
+            f"Done (kept 24h): {counts[DONE]}\n\n"
+            f"Oldest pending: {self.oldest_pending_age():.1f}s"
+        )
+
+
+class InboxConsumers:
+    """Pool of async consumers draining the inbox
+    
+    Each consumer claims a message, hands its payload to `process` and
+    marks it done, or failed (retried up to max_attempts) if `process`
+    raises. Consumers sleep until notify() is called or `poll_interval`
+    passes, so rows appended by another process are picked up too.
+    """
+    
+    def __init__(
+        self,
+        inbox: InboxService,
+        process: Callable[[dict], Awaitable[None]],
+        consumers: int = 4,
+        poll_interval: float = 1.0
+    ):
+        self.inbox = inbox
+        self.process = process
+        self.consumers = consumers
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = set()
+        self._purged_at = 0.0
+        
+        # Metrics
+        self.processed = 0
+        self.failed = 0
+    
+    async def start(self):
+        recovered = self.inbox.recover()
+        if recovered:
+            logger.warning(f"Recovered {recovered} inbox messages left in progress")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._consume(i)) for i in range(self.consumers)]
+        logger.info(f"Started {self.consumers} inbox consumers")
+    
+    def notify(self):
+        """Wake consumers after a message was appended"""
+        if self._wakeup:
+            self._wakeup.set()
+    
+    async def stop(self):
+        """Stop consuming; messages in progress are finished first"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+    
+    async def _consume(self, index: int):
+        while True:
+            item = self.inbox.claim()
+            if item is None:
+                self._maybe_purge()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            # Another consumer may be able to take a different group
+            self._wakeup.set()
+            # Shielded so stop() lets the message finish instead of leaving it
+            # to be replayed after the restart
+            run = asyncio.ensure_future(self._run(item))
+            self._running.add(run)
+            run.add_done_callback(self._running.discard)
+            try:
+                await asyncio.shield(run)
+            except asyncio.CancelledError:
+                return
+    
+    async def _run(self, item: InboxItem):
+        try:
+            await self.process(item.payload)
+        except Exception as e:
+            self.failed += 1
+            status = self.inbox.fail(item, str(e))
+            logger.error(
+                f"Inbox message {item.message_id} in group {item.group_id} failed "
+                f"(attempt {item.attempts}, now {status}): {e}",
+                exc_info=True
+            )
+        else:
+            self.processed += 1
+            self.inbox.complete(item.id)
+    
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._purged_at < 3600:
+            return
+        self._purged_at = now
+        purged = self.inbox.purge_done()
+        if purged:
+            logger.info(f"Purged {purged} processed inbox messages")
@@ -0,0 +1,182 @@
+"""Daily transfer rollups behind /stats"""
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from bot.models.database import Database
+from bot.services.state_service import StateService
+
+logger = logging.getLogger(__name__)
+
+# Transactions with id up to this predate the rollup trigger (set by init_database)
+BACKFILL_UNTIL = "rollup_backfill_until"
+# Last transaction id the backfill has added
+BACKFILL_DONE = "rollup_backfill_done"
+
+PERIODS = {"week": 7, "month": 30}
+
+
+class RollupService:
+    """Reads daily_group_stats / daily_user_stats and backfills them
+
+    New transfers are counted by the trigger on transactions. Older ones are
+    added by backfill(), `chunk_size` ids per transaction, with its progress
+    stored next to the boundary so it resumes after a restart. Days are UTC.
+    """
+
+    def __init__(self, db: Database, chunk_size: int = 5000):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.state = StateService(db)
+
+    def backfill_progress(self) -> Tuple[int, int]:
+        """(ids done, ids to do) of the backfill"""
+        until = int(self.state.get(BACKFILL_UNTIL) or 0)
+        done = int(self.state.get(BACKFILL_DONE) or 0)
+        return min(done, until), until
+
+    @property
+    def backfilled(self) -> bool:
+        done, until = self.backfill_progress()
+        return done >= until
+
+    def backfill_chunk(self) -> bool:
+        """Add the next chunk of old transactions; returns False once complete"""
+        with self.db.transaction():
+            done, until = self.backfill_progress()
+            if done >= until:
+                return False
+            end = min(done + self.chunk_size, until)
+
+            self.db.execute(
+                """
+                INSERT INTO daily_group_stats (group_id, day, transfers, volume)
+                SELECT COALESCE(group_id, 0), date(created_at), COUNT(*), SUM(amount)
+                FROM transactions
+                WHERE id > ? AND id <= ?
+                GROUP BY 1, 2
+                ON CONFLICT (group_id, day) DO UPDATE SET
+                    transfers = transfers + excluded.transfers,
+                    volume = volume + excluded.volume
+                """,
+                (done, end)
+            )
+            self.db.execute(
+                """
+                INSERT INTO daily_user_stats (group_id, day, user_id, sent_count, sent_volume)
+                SELECT COALESCE(group_id, 0), date(created_at), from_user_id, COUNT(*), SUM(amount)
+                FROM transactions
+                WHERE id > ? AND id <= ?
+                GROUP BY 1, 2, 3
+                ON CONFLICT (group_id, day, user_id) DO UPDATE SET
+                    sent_count = sent_count + excluded.sent_count,
+                    sent_volume = sent_volume + excluded.sent_volume
+                """,
+                (done, end)
+            )
+            self.db.execute(
+                """
+                INSERT INTO daily_user_stats (group_id, day, user_id, received_count, received_volume)
+                SELECT COALESCE(group_id, 0), date(created_at), to_user_id, COUNT(*), SUM(amount)
+                FROM transactions
+                WHERE id > ? AND id <= ?
+                GROUP BY 1, 2, 3
+                ON CONFLICT (group_id, day, user_id) DO UPDATE SET
+                    received_count = received_count + excluded.received_count,
+                    received_volume = received_volume + excluded.received_volume
+                """,
+                (done, end)
+            )
+            self.state.set(BACKFILL_DONE, str(end))
+        return True
+
+    async def backfill(self):
+        """Backfill chunk by chunk, yielding to the event loop in between"""
+        done, until = self.backfill_progress()
+        if done >= until:
+            return
+        logger.info(f"Backfilling transfer rollups of {self.db.database_url}: {done}/{until}")
+        while self.backfill_chunk():
+            await asyncio.sleep(0)
+        logger.info(f"Transfer rollups of {self.db.database_url} backfilled")
+
+    def totals(self, group_id: int, since: str):
+        """(transfers, volume, days) of a group from a UTC date on"""
+        return self.db.fetchone(
+            """
+            SELECT COALESCE(SUM(transfers), 0) as transfers,
+                   COALESCE(SUM(volume), 0) as volume,
+                   COUNT(*) as days
+            FROM daily_group_stats
+            WHERE group_id = ? AND day >= ?
+            """,
+            (group_id, since)
+        )
+
+    def daily_activity(self, group_id: int, since: str):
+        """Per-day transfers and volume, newest first (days without any are left out)"""
+        return self.db.fetchall(
+            """
+            SELECT day, transfers, volume
+            FROM daily_group_stats
+            WHERE group_id = ? AND day >= ?
+            ORDER BY day DESC
+            """,
+            (group_id, since)
+        )
+
+    def top_senders(self, group_id: int, since: str, limit: int = 5):
+        """Members who sent the most, with their display fields"""
+        return self.db.fetchall(
+            """
+            SELECT s.user_id, u.username, u.first_name,
+                   SUM(s.sent_count) as sent_count,
+                   SUM(s.sent_volume) as sent_volume
+            FROM daily_user_stats s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.group_id = ? AND s.day >= ? AND s.sent_count > 0
+            GROUP BY s.user_id
+            ORDER BY sent_volume DESC
+            LIMIT ?
+            """,
+            (group_id, since, limit)
+        )
+
+    def since(self, days: int) -> str:
+        """UTC date starting a window of `days` days that ends today"""
+        return self.db.fetchone("SELECT date('now', ?)", (f"-{days - 1} days",))[0]
+
+    def format_stats(self, group_id: int, period: str = "week") -> List[str]:
+        """/stats lines for the last week or month"""
+        days = PERIODS[period]
+        since = self.since(days)
+        totals = self.totals(group_id, since)
+        if not totals['transfers']:
+            return [f"📈 No transfers in the last {days} days."]
+
+        lines = [
+            f"📈 Last {days} days (since {since})",
+            f"💸 {totals['transfers']} transfers, ${totals['volume']:.2f} volume",
+            "",
+            "🏆 Top senders:"
+        ]
+        for i, row in enumerate(self.top_senders(group_id, since), 1):
+            name = f"@{row['username']}" if row['username'] else row['first_name'] or f"User {row['user_id']}"
+            lines.append(f"{i}. {name}: ${row['sent_volume']:.2f} in {row['sent_count']} transfers")
+
+        lines.extend(["", "📅 Daily activity:"])
+        for row in self.daily_activity(group_id, since):
+            lines.append(f"{row['day']}: {row['transfers']} transfers, ${row['volume']:.2f}")
+
+        if not self.backfilled:
+            done, until = self.backfill_progress()
+            lines.extend(["", f"⏳ Older history still being added ({done * 100 // until}%)."])
+        return lines
+
+
+def parse_period(args: Optional[List[str]]) -> Optional[str]:
+    """'week' (default) or 'month' from /stats arguments; None if unknown"""
+    if not args:
+        return "week"
+    period = args[0].lower()
+    return period if period in PERIODS else None
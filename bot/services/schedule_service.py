@@ -0,0 +1,389 @@
+"""Scheduled and recurring transfers"""
+
+import asyncio
+import calendar
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from bot.models.database import Database
+from bot.services.balance_service import BalanceService, TransferResult
+from bot.utils.metrics import exposition
+
+logger = logging.getLogger(__name__)
+
+ONCE = "once"
+DAILY = "daily"
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+
+REPEATS = (ONCE, DAILY, WEEKLY, MONTHLY)
+
+_PERIOD_SECONDS = {DAILY: 86400, WEEKLY: 7 * 86400}
+
+# Transfers made by a schedule carry message_id -(id * this + period), so a
+# run repeated after a crash hits the ledger's unique index instead of
+# paying twice
+_RUN_ID_FACTOR = 1_000_000
+
+# Larger than any rowid: (t, _MAX_ID) sorts after every schedule due at t
+_MAX_ID = 2 ** 63 - 1
+
+
+@dataclass
+class ScheduledTransfer:
+    """A row of the scheduled_transfers table"""
+    id: int
+    group_id: int
+    from_user_id: int
+    to_user_id: int
+    amount: float
+    repeat: str
+    start_at: int
+    period: int
+    next_run_at: int
+    active: bool = True
+    last_error: Optional[str] = None
+    created_by: Optional[int] = None
+
+    @property
+    def run_message_id(self) -> int:
+        """Synthetic message id of the upcoming run"""
+        return -(self.id * _RUN_ID_FACTOR + self.period)
+
+
+def occurrence(start_at: int, repeat: str, period: int) -> int:
+    """Unix time of the `period`-th run (0 = start_at) of a schedule
+
+    Monthly runs keep the start's day of month, falling back to the last
+    day of shorter months without drifting afterwards.
+    """
+    if repeat in _PERIOD_SECONDS:
+        return start_at + period * _PERIOD_SECONDS[repeat]
+    if repeat != MONTHLY or period == 0:
+        return start_at
+
+    start = datetime.fromtimestamp(start_at, timezone.utc)
+    months = start.month - 1 + period
+    year, month = start.year + months // 12, months % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return int(start.replace(year=year, month=month, day=day).timestamp())
+
+
+class ScheduleService:
+    """Persistent schedules run by an in-process min-heap
+
+    The heap holds (next_run_at, id) of the active schedules due up to a
+    moving horizon, loaded `page_size` rows at a time from the partial index
+    on next_run_at, so memory and each query stay small however many
+    schedules exist and the table is never scanned as a whole. Heap entries
+    are checked against the row when they come due; a cancelled or
+    rescheduled entry is just dropped.
+
+    Due schedules run in batches: each group's transfers in one DB
+    transaction (a savepoint per transfer, so one failure doesn't undo the
+    others), then every schedule is advanced with one executemany. Missed
+    runs after downtime are run once, not once per missed period. With
+    several worker processes each runs the schedules of its own groups,
+    chosen by the same group_id % workers rule that routes their updates,
+    so changing WORKERS re-homes every schedule on the next start.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        balance_for: Callable[[int], BalanceService],
+        worker_id: int = 0,
+        workers: int = 1,
+        batch_size: int = 100,
+        horizon: float = 3600.0,
+        page_size: int = 5000
+    ):
+        self.db = db
+        self.balance_for = balance_for
+        self.worker_id = worker_id
+        self.workers = workers
+        self.batch_size = batch_size
+        self.horizon = horizon
+        self.page_size = page_size
+
+        self._heap: List[Tuple[int, int]] = []
+        # Every active schedule with (next_run_at, id) up to this is in the heap
+        self._loaded: Tuple[int, int] = (-1, -1)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.runs = 0
+        self.failures = 0
+
+    def create(
+        self,
+        group_id: int,
+        from_user_id: int,
+        to_user_id: int,
+        amount: float,
+        repeat: str,
+        start_at: int,
+        created_by: Optional[int] = None
+    ) -> ScheduledTransfer:
+        """Store a schedule; its first run is at `start_at` (unix time)
+
+        Args:
+            created_by: Telegram user ID allowed to cancel it besides admins
+        """
+        if repeat not in REPEATS:
+            raise ValueError(f"Unknown repeat '{repeat}'")
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+
+        cursor = self.db.execute(
+            """
+            INSERT INTO scheduled_transfers
+            (group_id, from_user_id, to_user_id, amount, repeat, start_at, next_run_at, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (group_id, from_user_id, to_user_id, amount, repeat, start_at, start_at, created_by)
+        )
+        schedule = self.get(cursor.lastrowid)
+        if self._owns(group_id):
+            self._track(schedule.next_run_at, schedule.id)
+        logger.info(
+            "Scheduled transfer %s in group %s: $%.2f %s from %s",
+            schedule.id, group_id, amount, repeat, datetime.fromtimestamp(start_at, timezone.utc)
+        )
+        return schedule
+
+    def cancel(self, schedule_id: int) -> bool:
+        """Deactivate a schedule; returns False if it wasn't active"""
+        cursor = self.db.execute(
+            "UPDATE scheduled_transfers SET active = 0 WHERE id = ? AND active = 1",
+            (schedule_id,)
+        )
+        return cursor.rowcount == 1
+
+    def get(self, schedule_id: int) -> Optional[ScheduledTransfer]:
+        row = self.db.fetchone("SELECT * FROM scheduled_transfers WHERE id = ?", (schedule_id,))
+        return self._row_to_schedule(row) if row else None
+
+    def list_for_group(self, group_id: int, limit: int = 50) -> List[ScheduledTransfer]:
+        """Active schedules of a group, soonest first"""
+        rows = self.db.fetchall(
+            """
+            SELECT * FROM scheduled_transfers
+            WHERE group_id = ? AND active = 1
+            ORDER BY next_run_at, id
+            LIMIT ?
+            """,
+            (group_id, limit)
+        )
+        return [self._row_to_schedule(row) for row in rows]
+
+    def _owns(self, group_id: int) -> bool:
+        """Whether this worker runs the schedules of a group"""
+        return group_id % self.workers == self.worker_id
+
+    def _track(self, next_run_at: int, schedule_id: int):
+        """Put a new or advanced run in the heap if it falls in the loaded range
+
+        Runs beyond it are picked up by a later _load().
+        """
+        key = (next_run_at, schedule_id)
+        if key <= self._loaded:
+            heapq.heappush(self._heap, key)
+            if self._heap[0] == key and self._wakeup:
+                self._wakeup.set()
+
+    def _load(self, until: int):
+        """Load the next page of schedules due up to `until` into the heap"""
+        rows = self.db.fetchall(
+            """
+            SELECT id, next_run_at FROM scheduled_transfers
+            WHERE active = 1
+              AND (next_run_at, id) > (?, ?) AND next_run_at <= ?
+              AND ((group_id % ?) + ?) % ? = ?
+            ORDER BY next_run_at, id
+            LIMIT ?
+            """,
+            # SQLite's % keeps the sign of negative group ids; this matches Python's
+            (*self._loaded, until, self.workers, self.workers, self.workers, self.worker_id, self.page_size)
+        )
+        for row in rows:
+            heapq.heappush(self._heap, (row['next_run_at'], row['id']))
+        if len(rows) < self.page_size:
+            self._loaded = (until, _MAX_ID)
+        else:
+            # More rows remain; the next page is read once the heap has drained
+            self._loaded = (rows[-1]['next_run_at'], rows[-1]['id'])
+
+    def _next_wakeup(self, now: int) -> float:
+        """Seconds until the next due run or the next load"""
+        due = min(self._heap[0][0], self._loaded[0]) if self._heap else self._loaded[0]
+        return max(0.0, due - now)
+
+    def run_due(self, now: Optional[int] = None) -> List[Tuple[ScheduledTransfer, TransferResult]]:
+        """Run one batch of due schedules
+
+        Returns:
+            (schedule, result) per transfer attempted
+        """
+        now = int(time.time()) if now is None else now
+        if self._loaded < (now, _MAX_ID) and len(self._heap) < self.page_size:
+            self._load(now + int(self.horizon))
+
+        keys = []
+        while self._heap and self._heap[0][0] <= now and len(keys) < self.batch_size:
+            keys.append(heapq.heappop(self._heap))
+        if not keys:
+            return []
+
+        # Entries whose row changed or was cancelled since they were pushed are stale
+        ids = [schedule_id for _, schedule_id in keys]
+        rows = self.db.fetchall(
+            f"SELECT * FROM scheduled_transfers WHERE id IN ({', '.join('?' * len(ids))}) AND active = 1",
+            tuple(ids)
+        )
+        due = set(keys)
+        schedules = [
+            schedule for schedule in map(self._row_to_schedule, rows)
+            if (schedule.next_run_at, schedule.id) in due
+        ]
+
+        by_group: Dict[int, List[ScheduledTransfer]] = {}
+        for schedule in sorted(schedules, key=lambda s: (s.next_run_at, s.id)):
+            by_group.setdefault(schedule.group_id, []).append(schedule)
+
+        results = []
+        for group_id, group_schedules in by_group.items():
+            balance_service = self.balance_for(group_id)
+            with balance_service.db.transaction():
+                for schedule in group_schedules:
+                    result = balance_service.transfer_by_user_id(
+                        from_user_id=schedule.from_user_id,
+                        to_user_id=schedule.to_user_id,
+                        amount=schedule.amount,
+                        message_id=schedule.run_message_id,
+                        group_id=group_id
+                    )
+                    results.append((schedule, result))
+
+        self._advance(results, now)
+        return results
+
+    def _advance(self, results: List[Tuple[ScheduledTransfer, TransferResult]], now: int):
+        """Move each schedule past `now` (or finish it) in one transaction"""
+        updates = []
+        for schedule, result in results:
+            # A duplicate means this run was already paid before a restart
+            failed = not result.success and not result.duplicate
+            self.runs += not failed
+            self.failures += failed
+            error = result.message if failed else None
+
+            if schedule.repeat == ONCE:
+                updates.append((schedule.period + 1, schedule.next_run_at, 0, error, schedule.id))
+                continue
+            period = schedule.period + 1
+            next_run_at = occurrence(schedule.start_at, schedule.repeat, period)
+            while next_run_at <= now:
+                period += 1
+                next_run_at = occurrence(schedule.start_at, schedule.repeat, period)
+            updates.append((period, next_run_at, 1, error, schedule.id))
+
+        with self.db.transaction():
+            self.db.executemany(
+                """
+                UPDATE scheduled_transfers
+                SET period = ?, next_run_at = ?, active = ?, last_error = ?
+                WHERE id = ?
+                """,
+                updates
+            )
+
+        for _, next_run_at, active, _, schedule_id in updates:
+            if active:
+                self._track(next_run_at, schedule_id)
+
+    async def run(self, notify: Callable[[List[Tuple[ScheduledTransfer, TransferResult]]], Awaitable[None]]):
+        """Run due schedules until cancelled, passing each batch's results to `notify`"""
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                results = self.run_due()
+            except Exception as e:
+                logger.error(f"Scheduled transfers failed: {e}", exc_info=True)
+                # Popped runs are still due in the table; reload from scratch
+                self._heap.clear()
+                self._loaded = (-1, -1)
+                results = []
+            if results:
+                await notify(results)
+                continue
+
+            self._wakeup.clear()
+            delay = min(self._next_wakeup(int(time.time())), self.horizon)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self, notify: Callable[[List[Tuple[ScheduledTransfer, TransferResult]]], Awaitable[None]]):
+        self._task = asyncio.ensure_future(self.run(notify))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @staticmethod
+    def format_results(results: List[Tuple[ScheduledTransfer, TransferResult]]) -> Dict[int, str]:
+        """One announcement per group for a batch of runs (runs already paid are left out)"""
+        lines: Dict[int, List[str]] = {}
+        for schedule, result in results:
+            if result.duplicate:
+                continue
+            # The last line of a success message is "💸 $x from A to B"
+            detail = result.message.strip().split("\n")[-1].lstrip("💸 ")
+            lines.setdefault(schedule.group_id, []).append(f"• #{schedule.id}: {detail}")
+        return {
+            group_id: "🗓 Scheduled transfers\n\n" + "\n".join(group_lines)
+            for group_id, group_lines in lines.items()
+        }
+
+    @property
+    def pending(self) -> int:
+        """Runs currently in the heap"""
+        return len(self._heap)
+
+    def exposition(self) -> List[str]:
+        """Prometheus text exposition lines"""
+        return (
+            exposition(
+                "bot_schedule_heap_size", "gauge", "Scheduled runs loaded in memory",
+                [({}, self.pending)]
+            )
+            + exposition(
+                "bot_schedule_runs_total", "counter", "Scheduled transfer runs by result",
+                [({"result": "ok"}, self.runs), ({"result": "failed"}, self.failures)]
+            )
+        )
+
+    @staticmethod
+    def _row_to_schedule(row) -> ScheduledTransfer:
+        return ScheduledTransfer(
+            id=row['id'],
+            group_id=row['group_id'],
+            from_user_id=row['from_user_id'],
+            to_user_id=row['to_user_id'],
+            amount=row['amount'],
+            repeat=row['repeat'],
+            start_at=row['start_at'],
+            period=row['period'],
+            next_run_at=row['next_run_at'],
+            active=bool(row['active']),
+            last_error=row['last_error'],
+            created_by=row['created_by']
+        )
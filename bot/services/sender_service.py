@@ -0,0 +1,439 @@
+"""Rate-limited outbound message sender"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from telegram.error import RetryAfter, TelegramError
+from bot.utils import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# Buckets of chats that are idle and full are forgotten this often
+BUCKET_PRUNE_INTERVAL = 60.0
+
+# Enqueue to delivery, including rate limiting and flood waits
+_SEND = metrics.stage("send")
+
+
+def _retrieve_exception(future: "asyncio.Future"):
+    """Mark a failed send as seen (it was logged when it failed)"""
+    if not future.cancelled():
+        future.exception()
+
+
+class Priority(IntEnum):
+    """Send priority (lower value is sent first)"""
+    CONFIRMATION = 0  # Transfer confirmations
+    REPLY = 1         # Answers to explicit commands
+    INFO = 2          # Hints, warnings and error notices; dropped when stale
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, now: float, seconds: float):
+        """Stop handing out tokens for a while (flood wait)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def full(self, now: float) -> bool:
+        """Whether the bucket is back to its initial state (safe to forget)"""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+@dataclass(order=True)
+class OutboundMessage:
+    """A queued message"""
+    priority: int
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: Dict[str, Any] = field(compare=False)
+    future: "asyncio.Future" = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class SenderService:
+    """Central outbound sender with global and per-chat token buckets
+
+    Handlers enqueue messages and get a future back instead of calling
+    reply_text directly. A single dispatcher picks the highest-priority
+    message whose chat has a token available, sends at most one message per
+    chat at a time, honours RetryAfter by pausing that chat and re-queues
+    the message. Telegram doesn't say whether a flood wait is for the chat
+    or the whole bot, so once flood waits overlap in two chats everything
+    is paused. Informational messages
+    that waited longer than `info_ttl` are dropped, so bursts degrade by
+    shedding low-value replies instead of failing confirmations.
+
+    Each chat has its own priority queue. Chats that can send now are in a
+    heap keyed by their best message, chats waiting for a token in a heap
+    keyed by when they get one, so a dispatch is O(log n) however long the
+    queue is. Entries are checked against the chat's queue when popped; a
+    stale one is just dropped.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        group_rate_per_minute: float = 20.0,
+        private_rate: float = 1.0,
+        info_ttl: float = 30.0,
+        max_retries: int = 3,
+        max_queue: int = 10000
+    ):
+        self.bot = None
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.group_rate = group_rate_per_minute / 60
+        self.group_capacity = group_rate_per_minute
+        self.private_rate = private_rate
+        self.info_ttl = info_ttl
+        self.max_retries = max_retries
+        self.max_queue = max_queue
+
+        self._queues: Dict[int, List[OutboundMessage]] = {}
+        self._size = 0
+        # (priority, seq, chat id) of each sendable chat's best message
+        self._ready: List[Tuple[int, int, int]] = []
+        # (time, chat id) at which a rate-limited chat gets a token
+        self._waiting: List[Tuple[float, int]] = []
+        self._waiting_chats = set()
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._pruned_at = time.monotonic()
+        self._in_flight: Dict[int, int] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._tasks = set()
+        # (chat id, until) of the latest flood wait, to spot bot-wide floods
+        self._flood: Tuple[Optional[int], float] = (None, 0.0)
+
+        # Metrics
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latencies: Deque[float] = deque(maxlen=1000)
+
+    async def start(self, bot):
+        """Start the dispatcher for a bot"""
+        self.bot = bot
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+        logger.info("Outbound sender started")
+
+    async def stop(self, timeout: float = 5.0):
+        """Stop the dispatcher, giving queued messages a moment to drain"""
+        deadline = time.monotonic() + timeout
+        while (self._size or self._tasks) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        if self._dispatcher:
+            # The flag ends the loop too if wait_for swallows the cancel
+            # (it does when the wakeup is set at the same moment)
+            self._stopping = True
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+        for queue in self._queues.values():
+            for message in queue:
+                if not message.future.done():
+                    message.future.cancel()
+        self._queues.clear()
+        self._size = 0
+        self._ready.clear()
+        self._waiting.clear()
+        self._waiting_chats.clear()
+        logger.info("Outbound sender stopped")
+
+    def send_message(
+        self,
+        chat_id: int,
+        text: str,
+        priority: Priority = Priority.REPLY,
+        **kwargs
+    ) -> "asyncio.Future":
+        """Queue a message; the returned future resolves to the sent Message"""
+        future = asyncio.get_running_loop().create_future()
+        # Most callers never await the future; its failure is logged here
+        future.add_done_callback(_retrieve_exception)
+
+        if self._size >= self.max_queue and priority == Priority.INFO:
+            self.dropped += 1
+            future.cancel()
+            return future
+
+        message = OutboundMessage(
+            priority=int(priority),
+            seq=next(self._seq),
+            chat_id=chat_id,
+            text=text,
+            kwargs=kwargs,
+            future=future,
+            enqueued_at=time.monotonic()
+        )
+        self._push(message, time.monotonic())
+        if self._wakeup:
+            self._wakeup.set()
+        
+        # Queueing, rate limiting and the API call, attributed to the update
+        # that asked for the message
+        span = tracing.start_span("send", tracing.KIND_CLIENT, chat_id=chat_id, priority=Priority(priority).name)
+        if span is not None:
+            future.add_done_callback(span.end_with_future)
+        return future
+
+    def reply_text(self, message, text: str, priority: Priority = Priority.REPLY, **kwargs):
+        """Queue a reply to a Telegram message"""
+        return self.send_message(
+            message.chat_id,
+            text,
+            priority,
+            reply_to_message_id=message.message_id,
+            **kwargs
+        )
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_capacity)
+            else:
+                bucket = TokenBucket(self.private_rate, 1)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _push(self, message: OutboundMessage, now: float):
+        """Queue a message in its chat (new or re-queued after a flood wait)"""
+        heapq.heappush(self._queues.setdefault(message.chat_id, []), message)
+        self._size += 1
+        self._schedule(message.chat_id, now)
+
+    def _schedule(self, chat_id: int, now: float):
+        """Put a chat with queued messages in the ready or the waiting heap"""
+        queue = self._queues.get(chat_id)
+        if not queue or self._in_flight.get(chat_id) or chat_id in self._waiting_chats:
+            return
+        delay = self._bucket(chat_id).delay(now)
+        if delay > 0:
+            heapq.heappush(self._waiting, (now + delay, chat_id))
+            self._waiting_chats.add(chat_id)
+        else:
+            heapq.heappush(self._ready, (queue[0].priority, queue[0].seq, chat_id))
+
+    def _pop(self, chat_id: int) -> OutboundMessage:
+        queue = self._queues[chat_id]
+        message = heapq.heappop(queue)
+        if not queue:
+            del self._queues[chat_id]
+        self._size -= 1
+        return message
+
+    def _next_ready(self, now: float):
+        """Find the best sendable message, or the time to wait for one"""
+        due = []
+        while self._waiting and self._waiting[0][0] <= now:
+            due.append(heapq.heappop(self._waiting)[1])
+        # Rescheduled only now: a chat whose token is a rounding error away
+        # would otherwise be put back at `now` forever
+        self._waiting_chats.difference_update(due)
+        for chat_id in due:
+            self._schedule(chat_id, now)
+
+        expired = 0
+        best = None
+        while self._ready and best is None:
+            _, seq, chat_id = heapq.heappop(self._ready)
+            queue = self._queues.get(chat_id)
+            if not queue or queue[0].seq != seq or self._in_flight.get(chat_id):
+                continue
+            if chat_id in self._waiting_chats or self._bucket(chat_id).delay(now) > 0:
+                # A duplicate entry of a chat that has used its token since
+                self._schedule(chat_id, now)
+                continue
+            message = self._pop(chat_id)
+            if message.priority == Priority.INFO and now - message.enqueued_at > self.info_ttl:
+                message.future.cancel()
+                expired += 1
+                self._schedule(chat_id, now)
+                continue
+            best = message
+
+        if expired:
+            self.dropped += expired
+            logger.warning(f"Dropped {expired} stale informational messages")
+
+        wait = self._waiting[0][0] - now if self._waiting else None
+        return best, wait
+
+    def _prune_buckets(self, now: float):
+        """Forget the buckets of chats that are idle and back to full"""
+        self._pruned_at = now
+        for chat_id in [
+            chat_id for chat_id, bucket in self._buckets.items()
+            if chat_id not in self._queues and not self._in_flight.get(chat_id) and bucket.full(now)
+        ]:
+            del self._buckets[chat_id]
+
+    async def _dispatch(self):
+        """Dispatcher loop: release messages as tokens become available"""
+        while not self._stopping:
+            if not self._size:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            global_delay = self.global_bucket.delay(now)
+            if global_delay > 0:
+                await asyncio.sleep(global_delay)
+                continue
+
+            if now - self._pruned_at >= BUCKET_PRUNE_INTERVAL:
+                self._prune_buckets(now)
+
+            message, wait = self._next_ready(now)
+            if message is None:
+                # Sleep until a chat bucket refills or a new message arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait or 0.05)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.global_bucket.consume(now)
+            self._bucket(message.chat_id).consume(now)
+            self._in_flight[message.chat_id] = 1
+
+            task = asyncio.ensure_future(self._deliver(message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, message: OutboundMessage):
+        """Send one message, re-queueing it on flood control"""
+        try:
+            sent = await self.bot.send_message(
+                chat_id=message.chat_id,
+                text=message.text,
+                **message.kwargs
+            )
+        except RetryAfter as e:
+            retry_after = float(e.retry_after)
+            now = time.monotonic()
+            self._bucket(message.chat_id).block(now, retry_after)
+            flood_chat, flood_until = self._flood
+            if flood_chat != message.chat_id and flood_until > now:
+                self.global_bucket.block(now, retry_after)
+                logger.warning("Flood control in several chats: pausing all sends for %.0fs", retry_after)
+            self._flood = (message.chat_id, now + retry_after)
+            message.attempts += 1
+            if message.attempts > self.max_retries:
+                self.failed += 1
+                message.future.set_exception(e)
+                logger.error(f"Giving up on message to {message.chat_id} after flood waits")
+            else:
+                self.retried += 1
+                self._push(message, now)
+                logger.warning("Flood control for chat %s: retry in %.0fs", message.chat_id, retry_after)
+        except TelegramError as e:
+            self.failed += 1
+            if not message.future.done():
+                message.future.set_exception(e)
+            logger.error(f"Failed to send message to {message.chat_id}: {e}")
+        except Exception as e:
+            # E.g. network errors that reach us unwrapped; callers must not hang
+            self.failed += 1
+            if not message.future.done():
+                message.future.set_exception(e)
+            logger.error(f"Failed to send message to {message.chat_id}: {e}", exc_info=True)
+        else:
+            self.sent += 1
+            latency = time.monotonic() - message.enqueued_at
+            self.latencies.append(latency)
+            _SEND.observe(latency)
+            if not message.future.done():
+                message.future.set_result(sent)
+        finally:
+            self._in_flight.pop(message.chat_id, None)
+            self._schedule(message.chat_id, time.monotonic())
+            if self._wakeup:
+                self._wakeup.set()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._size
+
+    def latency_percentile(self, percentile: float) -> float:
+        """Send-queue latency percentile in seconds over the recent window"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+
+    def format_stats(self) -> str:
+        """Format sender metrics for display"""
+        return (
+            "📤 Outbound Sender\n\n"
+            f"Queued: {self.queue_depth}\n"
+            f"Sent: {self.sent}\n"
+            f"Retried (flood wait): {self.retried}\n"
+            f"Dropped (stale info): {self.dropped}\n"
+            f"Failed: {self.failed}\n\n"
+            f"Queue latency p50: {self.latency_percentile(0.5) * 1000:.0f} ms\n"
+            f"Queue latency p95: {self.latency_percentile(0.95) * 1000:.0f} ms\n"
+            f"Queue latency max: {max(self.latencies, default=0) * 1000:.0f} ms"
+        )
+
+    def exposition(self) -> List[str]:
+        """Sender metrics in Prometheus text format (see bot.utils.metrics)"""
+        lines = metrics.exposition(
+            "bot_send_messages_total", "counter", "Outbound messages by outcome",
+            [
+                ({"outcome": "sent"}, self.sent),
+                ({"outcome": "retried"}, self.retried),
+                ({"outcome": "dropped"}, self.dropped),
+                ({"outcome": "failed"}, self.failed)
+            ]
+        )
+        lines += metrics.exposition(
+            "bot_send_queue_depth", "gauge", "Outbound messages waiting to be sent",
+            [({}, self.queue_depth)]
+        )
+        return lines
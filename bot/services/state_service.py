@@ -0,0 +1,40 @@
+"""Persistent bot state (key/value) stored in the database"""
+
+import logging
+from typing import Optional
+from bot.models.database import Database
+
+logger = logging.getLogger(__name__)
+
+LAST_UPDATE_ID = "last_update_id"
+
+
+class StateService:
+    """Service for small pieces of state that must survive restarts"""
+    
+    def __init__(self, db: Database):
+        self.db = db
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a stored value, or None if it was never set"""
+        row = self.db.fetchone("SELECT value FROM bot_state WHERE key = ?", (key,))
+        return row['value'] if row else None
+    
+    def set(self, key: str, value: str):
+        """Store a value, replacing any previous one"""
+        self.db.execute(
+            """
+            INSERT INTO bot_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            """,
+            (key, value)
+        )
+    
+    def get_last_update_id(self) -> int:
+        """Highest Telegram update id known to be fully processed (0 if none)"""
+        value = self.get(LAST_UPDATE_ID)
+        return int(value) if value else 0
+    
+    def set_last_update_id(self, update_id: int):
+        """Persist the highest fully processed update id"""
+        self.set(LAST_UPDATE_ID, str(update_id))
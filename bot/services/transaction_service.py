@@ -1,7 +1,7 @@
 """Transaction service for database operations"""
 
 import logging
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 from bot.models.database import Database
 from bot.models.transaction import Transaction
 
@@ -34,12 +34,61 @@ class TransactionService:
             (from_user_id, to_user_id, amount, balance_from, balance_to, message_id, group_id)
         )
         transaction_id = cursor.lastrowid
-        logger.info(
-            f"Created transaction {transaction_id}: "
-            f"User {from_user_id} -> User {to_user_id}, ${amount:.2f}"
+        self.db.bump_ledger_version()
+        logger.debug(
+            "Created transaction %s: User %s -> User %s, $%.2f",
+            transaction_id, from_user_id, to_user_id, amount
         )
         return self.get_by_id(transaction_id)
     
+    def create_many(
+        self,
+        from_user_id: int,
+        rows: Sequence[Tuple[int, float, float, float]],
+        message_id: int = None,
+        group_id: int = None
+    ) -> List[Transaction]:
+        """Insert several transactions from one sender with a single executemany
+        
+        Must run inside db.transaction(): the write lock keeps the new
+        AUTOINCREMENT ids consecutive, so the rows are read back with one
+        range query.
+        
+        Args:
+            rows: (to_user_id, amount, balance_from, balance_to) per transfer
+        """
+        self.db.executemany(
+            """
+            INSERT INTO transactions 
+            (from_user_id, to_user_id, amount, balance_from, balance_to, message_id, group_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (from_user_id, to_user_id, amount, balance_from, balance_to, message_id, group_id)
+                for to_user_id, amount, balance_from, balance_to in rows
+            ]
+        )
+        last_id = self.db.fetchone("SELECT last_insert_rowid()")[0]
+        self.db.bump_ledger_version()
+        
+        created = self.db.fetchall(
+            """
+            SELECT t.*, 
+                   u1.username as from_username,
+                   u1.first_name as from_first_name,
+                   u2.username as to_username,
+                   u2.first_name as to_first_name
+            FROM transactions t
+            JOIN users u1 ON t.from_user_id = u1.id
+            JOIN users u2 ON t.to_user_id = u2.id
+            WHERE t.id BETWEEN ? AND ?
+            ORDER BY t.id
+            """,
+            (last_id - len(rows) + 1, last_id)
+        )
+        logger.debug("Created %d transactions from user %s", len(created), from_user_id)
+        return [self._row_to_transaction(row) for row in created]
+    
     def get_by_id(self, transaction_id: int) -> Optional[Transaction]:
         """Get transaction by ID"""
         row = self.db.fetchone(
@@ -77,8 +126,16 @@ class TransactionService:
         )
         return [self._row_to_transaction(row) for row in rows]
     
-    def get_by_user(self, user_id: int, limit: int = 10) -> List[Transaction]:
-        """Get transactions for a specific user"""
+    def get_by_user(self, user_id: int, limit: int = 10, before_id: int = None) -> List[Transaction]:
+        """Get a user's transactions, newest first, older than `before_id`
+        
+        Keyset pagination: pass the last id of a page as `before_id` to get
+        the next one. Sent and received transfers are read by two index range
+        scans (the single-column indexes end in the rowid, so each arm is
+        already in id order) merged with UNION ALL, rather than an OR that
+        would scan the whole table; only the page's rows are joined to users.
+        """
+        before_id = before_id if before_id is not None else 2 ** 63 - 1
         rows = self.db.fetchall(
             """
             SELECT t.*, 
@@ -86,17 +143,40 @@ class TransactionService:
                    u1.first_name as from_first_name,
                    u2.username as to_username,
                    u2.first_name as to_first_name
-            FROM transactions t
+            FROM (
+                SELECT id FROM (
+                    SELECT id FROM transactions
+                    WHERE from_user_id = ? AND id < ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                )
+                UNION ALL
+                SELECT id FROM (
+                    SELECT id FROM transactions
+                    WHERE to_user_id = ? AND id < ? AND from_user_id != ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                )
+                ORDER BY id DESC
+                LIMIT ?
+            ) page
+            JOIN transactions t ON t.id = page.id
             JOIN users u1 ON t.from_user_id = u1.id
             JOIN users u2 ON t.to_user_id = u2.id
-            WHERE t.from_user_id = ? OR t.to_user_id = ?
-            ORDER BY t.created_at DESC
-            LIMIT ?
+            ORDER BY t.id DESC
             """,
-            (user_id, user_id, limit)
+            (user_id, before_id, limit, user_id, before_id, user_id, limit, limit)
         )
         return [self._row_to_transaction(row) for row in rows]
     
+    def exists_for_message(self, group_id: int, message_id: int) -> bool:
+        """Check if a transfer was already recorded for a Telegram message"""
+        row = self.db.fetchone(
+            "SELECT 1 FROM transactions WHERE group_id = ? AND message_id = ? LIMIT 1",
+            (group_id, message_id)
+        )
+        return row is not None
+    
     def get_count(self) -> int:
         """Get total transaction count"""
         row = self.db.fetchone("SELECT COUNT(*) as count FROM transactions")
@@ -0,0 +1,216 @@
+"""LLM usage, latency and cost accounting"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from bot.models.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of an LLM call
+HIT = "hit"            # Detection found a transfer / confirmation generated
+MISS = "miss"          # Detection found no transfer
+ERROR = "error"        # Call or parsing failed (callers fall back to a default)
+FALLBACK = "fallback"  # Batched answer unusable; messages re-detected one by one
+
+OUTCOMES = (HIT, MISS, ERROR, FALLBACK)
+
+
+@dataclass
+class UsageRecord:
+    """One LLM call"""
+    created_at: int
+    group_id: Optional[int]
+    operation: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: int
+    outcome: str
+
+
+def token_usage(message) -> Tuple[int, int]:
+    """(prompt, completion) tokens reported with a chat model response"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0) or 0, usage.get("output_tokens", 0) or 0
+    usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+
+
+class UsageService:
+    """Buffers LLM call records and writes them to llm_usage in batches
+
+    record() is called from the executor threads running LLM calls and only
+    appends to a buffer. flush() writes the buffer in one transaction and
+    must run on the event loop thread, which owns the database connection;
+    run() does so every `flush_interval` seconds. Prices are USD per
+    million tokens (0 = cost not tracked).
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        flush_interval: float = 5.0,
+        max_buffer: int = 10000,
+        prompt_price: float = 0.0,
+        completion_price: float = 0.0
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        self._buffer: List[UsageRecord] = []
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.recorded = 0
+        self.dropped = 0
+
+    def record(
+        self,
+        operation: str,
+        model: str,
+        group_id: Optional[int],
+        latency: float,
+        outcome: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0
+    ):
+        """Buffer one call (thread-safe, no I/O)"""
+        usage = UsageRecord(
+            created_at=int(time.time()),
+            group_id=group_id,
+            operation=operation,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=int(latency * 1000),
+            outcome=outcome
+        )
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return
+            self._buffer.append(usage)
+            self.recorded += 1
+
+    def flush(self) -> int:
+        """Write buffered records; returns how many were written"""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if not records:
+            return 0
+
+        with self.db.transaction():
+            self.db.executemany(
+                """
+                INSERT INTO llm_usage
+                (created_at, group_id, operation, model, prompt_tokens, completion_tokens, latency_ms, outcome)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (r.created_at, r.group_id, r.operation, r.model, r.prompt_tokens,
+                     r.completion_tokens, r.latency_ms, r.outcome)
+                    for r in records
+                ]
+            )
+        return len(records)
+
+    async def run(self):
+        """Flush periodically until cancelled (flushes once more on the way out)"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                self._flush_logged()
+        finally:
+            self._flush_logged()
+
+    def _flush_logged(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to write LLM usage: {e}")
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.prompt_price + completion_tokens * self.completion_price) / 1_000_000
+
+    def group_rollup(self, since: int, limit: int = 10):
+        """Per-group totals since a unix time, busiest groups first"""
+        return self.db.fetchall(
+            """
+            SELECT group_id,
+                   COUNT(*) as calls,
+                   SUM(prompt_tokens) as prompt_tokens,
+                   SUM(completion_tokens) as completion_tokens,
+                   AVG(latency_ms) as avg_latency_ms,
+                   MAX(latency_ms) as max_latency_ms,
+                   SUM(outcome = 'hit') as hits,
+                   SUM(outcome = 'miss') as misses,
+                   SUM(outcome = 'error') as errors,
+                   SUM(outcome = 'fallback') as fallbacks
+            FROM llm_usage
+            WHERE created_at >= ?
+            GROUP BY group_id
+            ORDER BY SUM(prompt_tokens + completion_tokens) DESC, calls DESC
+            LIMIT ?
+            """,
+            (since, limit)
+        )
+
+    def daily_rollup(self, since: int):
+        """Per-day (UTC) totals since a unix time, newest day first"""
+        return self.db.fetchall(
+            """
+            SELECT date(created_at, 'unixepoch') as day,
+                   COUNT(*) as calls,
+                   SUM(prompt_tokens) as prompt_tokens,
+                   SUM(completion_tokens) as completion_tokens,
+                   AVG(latency_ms) as avg_latency_ms,
+                   SUM(outcome = 'miss') as misses,
+                   SUM(outcome = 'error') as errors
+            FROM llm_usage
+            WHERE created_at >= ?
+            GROUP BY day
+            ORDER BY day DESC
+            """,
+            (since,)
+        )
+
+    def format_stats(self, days: int = 7) -> str:
+        """Per-group and per-day rollups for display"""
+        self.flush()
+        since = int(time.time()) - days * 86400
+        groups = self.group_rollup(since)
+        if not groups:
+            return f"🤖 No LLM calls in the last {days} days."
+
+        lines = [f"🤖 LLM usage, last {days} days", "", "By group:"]
+        for row in groups:
+            tokens = row['prompt_tokens'] + row['completion_tokens']
+            line = (
+                f"• {row['group_id'] if row['group_id'] is not None else 'other'}: "
+                f"{row['calls']} calls, {tokens} tokens, "
+                f"avg {row['avg_latency_ms']:.0f} ms (max {row['max_latency_ms']}), "
+                f"{row['misses']} miss, {row['errors']} err, {row['fallbacks']} fallback"
+            )
+            if self.prompt_price or self.completion_price:
+                line += f", ${self.cost(row['prompt_tokens'], row['completion_tokens']):.4f}"
+            lines.append(line)
+
+        lines.extend(["", "By day:"])
+        for row in self.daily_rollup(since):
+            tokens = row['prompt_tokens'] + row['completion_tokens']
+            line = (
+                f"• {row['day']}: {row['calls']} calls, {tokens} tokens, "
+                f"avg {row['avg_latency_ms']:.0f} ms, "
+                f"{row['misses'] / row['calls'] * 100:.0f}% miss, {row['errors']} err"
+            )
+            if self.prompt_price or self.completion_price:
+                line += f", ${self.cost(row['prompt_tokens'], row['completion_tokens']):.4f}"
+            lines.append(line)
+        return "\n".join(lines)
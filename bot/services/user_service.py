@@ -1,7 +1,7 @@
 """User service for database operations"""
 
 import logging
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List, Sequence, Tuple
 from bot.models.database import Database
 from bot.models.user import User
 
@@ -34,7 +34,7 @@ class UserService:
             return user
         
         # Create new user with default balance
-        logger.info(f"Creating new user: {username or first_name} (ID: {telegram_user_id})")
+        logger.info("Creating new user: %s (ID: %s)", username or first_name, telegram_user_id)
         cursor = self.db.execute(
             """
             INSERT INTO users (telegram_user_id, username, first_name, last_name, balance)
@@ -43,7 +43,8 @@ class UserService:
             (telegram_user_id, username, first_name, last_name, self.default_balance)
         )
         user_id = cursor.lastrowid
-        logger.info(f"Created user {user_id} with balance ${self.default_balance:.2f}")
+        self.db.bump_ledger_version()
+        logger.debug("Created user %s with balance $%.2f", user_id, self.default_balance)
         return self.get_by_id(user_id)
     
     def get_by_id(self, user_id: int) -> Optional[User]:
@@ -93,6 +94,42 @@ class UserService:
         )
         return self._row_to_user(row) if row else None
     
+    def get_by_usernames(self, usernames: Iterable[str]) -> Dict[str, User]:
+        """Look up several users at once, keyed by the names as given
+        
+        Exact username matches come from one query; only names without one
+        fall back to get_by_username's first/last name matching. Names
+        that match nobody are left out.
+        """
+        names = {name: name.lower().replace('@', '').strip() for name in usernames if name}
+        if not names:
+            return {}
+        
+        clean = sorted(set(names.values()))
+        rows = self.db.fetchall(
+            f"SELECT * FROM users WHERE LOWER(username) IN ({', '.join('?' * len(clean))})",
+            tuple(clean)
+        )
+        by_username = {row['username'].lower(): self._row_to_user(row) for row in rows}
+        
+        users = {}
+        for name, name_clean in names.items():
+            user = by_username.get(name_clean) or self.get_by_username(name_clean)
+            if user:
+                users[name] = user
+        return users
+    
+    def get_by_ids(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        """Get several users by internal ID with one query"""
+        ids = sorted(set(user_ids))
+        if not ids:
+            return {}
+        rows = self.db.fetchall(
+            f"SELECT * FROM users WHERE id IN ({', '.join('?' * len(ids))})",
+            tuple(ids)
+        )
+        return {row['id']: self._row_to_user(row) for row in rows}
+    
     def get_all(self) -> List[User]:
         """Get all users"""
         rows = self.db.fetchall("SELECT * FROM users ORDER BY created_at")
@@ -107,9 +144,27 @@ class UserService:
             "UPDATE users SET balance = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
             (new_balance, user_id)
         )
-        logger.info(f"Updated balance for user {user_id}: ${new_balance:.2f}")
+        self.db.bump_ledger_version()
+        logger.debug("Updated balance for user %s: $%.2f", user_id, new_balance)
         return True
     
+    def update_balances(self, balances: Sequence[Tuple[int, float]]):
+        """Set several balances with one executemany
+        
+        Must run inside db.transaction(), so the balances change together.
+        
+        Args:
+            balances: (user_id, new_balance) pairs
+        """
+        if any(balance < 0 for _, balance in balances):
+            raise ValueError("Balance cannot be negative")
+        
+        self.db.executemany(
+            "UPDATE users SET balance = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            [(balance, user_id) for user_id, balance in balances]
+        )
+        self.db.bump_ledger_version()
+    
     def update_user_info(
         self,
         user_id: int,
@@ -126,6 +181,7 @@ class UserService:
             """,
             (username, first_name, last_name, user_id)
         )
+        self.db.bump_ledger_version()
     
     def get_user_count(self) -> int:
         """Get total user count"""
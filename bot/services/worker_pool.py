@@ -0,0 +1,233 @@
+"""Multi-process deployment: one ingress process and N workers sharded by chat id"""
+
+import asyncio
+import dataclasses
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+from bot.utils.config import BotConfig
+from bot.models.database import Database
+from bot.utils.metrics import REGISTRY, MetricsServer, exposition
+from bot.services.bot_service import BotService, run_ingress
+
+logger = logging.getLogger(__name__)
+
+# Put on a worker's queue to make it finish its backlog and exit
+_STOP = None
+
+# Restart delay doubles while a worker keeps crashing, up to this many seconds
+MAX_RESTART_DELAY = 60.0
+
+# A worker that ran at least this long before exiting is not crash-looping
+STABLE_SECONDS = 60.0
+
+
+def worker_index(chat_id: Optional[int], workers: int) -> int:
+    """Index of the worker that owns a chat (updates without a chat go to worker 0)"""
+    if chat_id is None:
+        return 0
+    return chat_id % workers
+
+
+def worker_main(config: BotConfig, index: int, queue):
+    """Entry point of a worker process"""
+    # Ctrl+C reaches the whole process group; the ingress process decides
+    # when workers stop so queued updates are not lost
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    from bot.utils.logger import setup_logging
+    setup_logging(config, f"worker-{index}")
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+    
+    asyncio.run(_serve(config, index, queue))
+    logger.info(f"Worker {index} stopped")
+
+
+async def _serve(config: BotConfig, index: int, queue):
+    """Feed updates from the ingress queue into a local Application"""
+    bot_service = BotService(config)
+    application = bot_service.build_application(with_updater=False)
+    
+    # queue.get blocks, so it gets its own thread instead of one of the
+    # default executor's LLM threads
+    reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"worker{index}-queue")
+    loop = asyncio.get_running_loop()
+    
+    await application.initialize()
+    await bot_service.post_init(application)
+    await application.start()
+    try:
+        while True:
+            data = await loop.run_in_executor(reader, queue.get)
+            if data is _STOP:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        # Application.stop() processes everything already queued first
+        await application.stop()
+        await bot_service.post_stop(application)
+        await application.shutdown()
+        await bot_service.post_shutdown(application)
+        reader.shutdown(wait=False)
+
+
+class WorkerPool:
+    """Ingress process handing updates to worker processes
+    
+    This process only talks to Telegram (polling or webhook) and forwards
+    each update, as a dict, to the queue of the worker that owns its chat.
+    Every update of a chat therefore goes to the same worker, where
+    ChatOrderedUpdateProcessor keeps them in order. Each worker is a full
+    BotService with its own database connections, sender and AI client.
+    
+    The pool supervises the workers: one that exits while the bot is
+    running is restarted on the same queue, so updates waiting for it are
+    processed by its replacement. The update it was handling when it
+    crashed is lost. Restarts back off while a worker keeps crashing.
+    """
+    
+    def __init__(self, config: BotConfig):
+        self.config = config
+        self.workers = config.workers
+        
+        # Workers share Telegram's global send limit
+        self.worker_config = dataclasses.replace(
+            config,
+            send_global_rate=config.send_global_rate / self.workers
+        )
+        
+        # Spawned, not forked: the ingress process has threads and an event loop
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = [self._context.Queue() for _ in range(self.workers)]
+        self._processes: List[Optional[multiprocessing.process.BaseProcess]] = [None] * self.workers
+        self._started_at = [0.0] * self.workers
+        self._restart_delay = [config.worker_restart_delay] * self.workers
+        self._restart_at: List[Optional[float]] = [None] * self.workers
+        self._supervisor: Optional[asyncio.Task] = None
+        
+        # Metrics
+        self.forwarded = [0] * self.workers
+        self.restarts = 0
+        self.metrics_server = None
+        if config.metrics_port:
+            self.metrics_server = MetricsServer(config.metrics_host, config.metrics_port)
+            REGISTRY.add_collector(self._collect_metrics)
+    
+    def _collect_metrics(self):
+        lines = exposition(
+            "bot_worker_forwarded_updates_total", "counter", "Updates handed to each worker",
+            [({"worker": str(index)}, count) for index, count in enumerate(self.forwarded)]
+        )
+        lines += exposition(
+            "bot_worker_restarts_total", "counter", "Worker processes restarted",
+            [({}, self.restarts)]
+        )
+        return lines
+    
+    async def forward(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Hand an update to the worker that owns its chat"""
+        chat = update.effective_chat
+        index = worker_index(chat.id if chat else None, self.workers)
+        self._queues[index].put(update.to_dict())
+        self.forwarded[index] += 1
+    
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=worker_main,
+            args=(dataclasses.replace(self.worker_config, worker_id=index), index, self._queues[index]),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        self._restart_at[index] = None
+    
+    def check_workers(self, now: float):
+        """Restart workers that exited, backing off while they crash-loop"""
+        for index, process in enumerate(self._processes):
+            if process is None or process.is_alive():
+                continue
+            
+            if self._restart_at[index] is None:
+                if now - self._started_at[index] >= STABLE_SECONDS:
+                    self._restart_delay[index] = self.config.worker_restart_delay
+                delay = self._restart_delay[index]
+                self._restart_at[index] = now + delay
+                self._restart_delay[index] = min(delay * 2, MAX_RESTART_DELAY)
+                logger.error(
+                    f"Worker {index} exited with code {process.exitcode}; "
+                    f"restarting in {delay:.0f}s"
+                )
+            elif now >= self._restart_at[index]:
+                self.restarts += 1
+                self._spawn(index)
+    
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(1)
+            self.check_workers(time.monotonic())
+    
+    async def post_init(self, application: Application):
+        """Start the workers once the ingress is connected"""
+        # Workers share the main database file; WAL lets them read while
+        # another one writes
+        db = Database(self.config.database_url)
+        db.enable_wal()
+        db.close()
+        
+        for index in range(self.workers):
+            self._spawn(index)
+        self._supervisor = asyncio.ensure_future(self._supervise())
+        if self.metrics_server:
+            self.metrics_server.start()
+        if hasattr(signal, "SIGUSR1"):
+            # Profiling requests are for the workers, which do the processing
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self._forward_signal, signal.SIGUSR1)
+        logger.info(f"Started {self.workers} worker processes")
+    
+    def _forward_signal(self, signum: int):
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signum)
+    
+    async def post_stop(self, application: Application):
+        """Let the workers drain their queues, then stop them"""
+        if self._supervisor:
+            self._supervisor.cancel()
+            self._supervisor = None
+        
+        for queue in self._queues:
+            queue.put(_STOP)
+        
+        loop = asyncio.get_running_loop()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, 30)
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop in time; terminating")
+                process.terminate()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        logger.info(f"Workers stopped (forwarded per worker: {self.forwarded}, restarts: {self.restarts})")
+    
+    def run(self):
+        """Receive updates and distribute them to the workers"""
+        application = (
+            Application.builder()
+            .token(self.config.token)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .build()
+        )
+        application.add_handler(TypeHandler(Update, self.forward))
+        
+        logger.info(f"Ingress running with {self.workers} workers sharded by chat id")
+        run_ingress(application, self.config)
@@ -1,8 +1,9 @@
 """Configuration management for the bot"""
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import List
 
 
 @dataclass
@@ -24,22 +25,107 @@ class BotConfig:
     ai_model: str = "mistral-small-latest"
     ai_temperature: float = 0.1
     enable_ai: bool = True
+    ai_usage_flush_seconds: float = 5.0
+    ai_price_prompt_per_m: float = 0.0
+    ai_price_completion_per_m: float = 0.0
     
     # Group monitoring
     monitor_groups: bool = True
     auto_detect_transfers: bool = True
+    drop_pending_updates: bool = False
+    catchup_batch_size: int = 20
+    dedup_cache_size: int = 10000
+    
+    # Concurrent update processing (1 = sequential)
+    concurrent_updates: int = 16
+    max_pending_updates: int = 4096
+    
+    # Load shedding of passive detection (0 queue depth = disabled)
+    overload_queue_depth: int = 0
+    overload_llm_seconds: float = 8.0
+    overload_sample_rate: float = 0.25
+    overload_hold_seconds: float = 10.0
+    
+    # Scheduled transfers run per batch, and how far ahead they're loaded
+    schedule_batch_size: int = 100
+    schedule_horizon_seconds: float = 3600.0
+    
+    # Old transactions added to the /stats rollups per backfill transaction
+    rollup_backfill_chunk: int = 5000
+    
+    # Worker processes (1 = everything in one process)
+    workers: int = 1
+    worker_restart_delay: float = 1.0
+    worker_id: int = 0  # Set by WorkerPool for each worker process
+    
+    # Durable inbox (0 consumers = process messages inside the handler)
+    inbox_consumers: int = 0
+    inbox_max_attempts: int = 3
+    
+    # Outbound rate limits (Telegram: ~30 msg/s overall, 20 msg/min per group)
+    send_global_rate: float = 30.0
+    send_group_rate_per_minute: float = 20.0
+    send_info_ttl: float = 30.0
+    
+    # Confirmation coalescing (one summary per group per window)
+    coalesce_confirmations: bool = False
+    coalesce_window_seconds: float = 3.0
+    
+    # Update ingress: "polling" or "webhook"
+    update_mode: str = "polling"
+    webhook_url: str = ""
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_path: str = "telegram"
+    webhook_secret_token: str = ""
+    webhook_max_connections: int = 40
     
     # Database settings
     database_url: str = "data/bot.db"
     
+    # Sharding (one SQLite file per group)
+    shard_by_group: bool = False
+    shard_dir: str = "data/shards"
+    max_open_shards: int = 32
+    
+    # Query instrumentation
+    db_instrumentation: bool = False
+    slow_query_ms: float = 100.0
+    
+    # Prometheus metrics endpoint (0 = disabled)
+    metrics_port: int = 0
+    metrics_host: str = "0.0.0.0"
+    
+    # Tracing to an OTLP/JSON lines file (empty = disabled)
+    trace_file: str = ""
+    trace_sample_rate: float = 0.01
+    trace_slow_seconds: float = 2.0
+    
+    # On-demand profiling (/profile, SIGUSR1)
+    profile_dir: str = "data/profiles"
+    profile_seconds: float = 30.0
+    profile_max_seconds: float = 300.0
+    
     # User settings
     default_balance: float = 1000.0
     max_transaction_history: int = 10
+    render_cache_size: int = 256
+    
+    # Admin settings
+    admin_user_ids: List[int] = field(default_factory=list)
+    
+    # Export settings
+    export_chunk_size: int = 1000
     
     # Logging
     log_level: str = "INFO"
     log_format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     log_file: str = "logs/bot.log"
+    log_json: bool = False
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_rotate_when: str = ""
+    log_backup_count: int = 5
+    log_compress: bool = True
     
     @classmethod
     def from_env(cls) -> "BotConfig":
@@ -63,17 +149,84 @@ class BotConfig:
         ai_model = os.getenv("AI_MODEL", "mistral-small-latest")
         ai_temperature = float(os.getenv("AI_TEMPERATURE", "0.1"))
         enable_ai = os.getenv("ENABLE_AI", "true").lower() == "true"
+        ai_usage_flush_seconds = float(os.getenv("AI_USAGE_FLUSH_SECONDS", "5"))
+        ai_price_prompt_per_m = float(os.getenv("AI_PRICE_PROMPT_PER_M", "0"))
+        ai_price_completion_per_m = float(os.getenv("AI_PRICE_COMPLETION_PER_M", "0"))
         
         # Group monitoring
         monitor_groups = os.getenv("MONITOR_GROUPS", "true").lower() == "true"
         auto_detect_transfers = os.getenv("AUTO_DETECT_TRANSFERS", "true").lower() == "true"
+        drop_pending_updates = os.getenv("DROP_PENDING_UPDATES", "false").lower() == "true"
+        catchup_batch_size = int(os.getenv("CATCHUP_BATCH_SIZE", "20"))
+        dedup_cache_size = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+        concurrent_updates = int(os.getenv("CONCURRENT_UPDATES", "16"))
+        max_pending_updates = int(os.getenv("MAX_PENDING_UPDATES", "4096"))
+        overload_queue_depth = int(os.getenv("OVERLOAD_QUEUE_DEPTH", "0"))
+        overload_llm_seconds = float(os.getenv("OVERLOAD_LLM_SECONDS", "8"))
+        overload_sample_rate = float(os.getenv("OVERLOAD_SAMPLE_RATE", "0.25"))
+        overload_hold_seconds = float(os.getenv("OVERLOAD_HOLD_SECONDS", "10"))
+        schedule_batch_size = int(os.getenv("SCHEDULE_BATCH_SIZE", "100"))
+        schedule_horizon_seconds = float(os.getenv("SCHEDULE_HORIZON_SECONDS", "3600"))
+        rollup_backfill_chunk = int(os.getenv("ROLLUP_BACKFILL_CHUNK", "5000"))
+        workers = int(os.getenv("WORKERS", "1"))
+        if workers < 1:
+            raise ValueError(f"WORKERS must be at least 1, got {workers}")
+        worker_restart_delay = float(os.getenv("WORKER_RESTART_DELAY", "1"))
+        inbox_consumers = int(os.getenv("INBOX_CONSUMERS", "0"))
+        inbox_max_attempts = int(os.getenv("INBOX_MAX_ATTEMPTS", "3"))
+        
+        # Outbound rate limits
+        send_global_rate = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+        send_group_rate_per_minute = float(os.getenv("SEND_GROUP_RATE_PER_MINUTE", "20"))
+        send_info_ttl = float(os.getenv("SEND_INFO_TTL", "30"))
+        coalesce_confirmations = os.getenv("COALESCE_CONFIRMATIONS", "false").lower() == "true"
+        coalesce_window_seconds = float(os.getenv("COALESCE_WINDOW_SECONDS", "3"))
+        
+        # Update ingress
+        update_mode = os.getenv("UPDATE_MODE", "polling").lower()
+        if update_mode not in ("polling", "webhook"):
+            raise ValueError(f"UPDATE_MODE must be 'polling' or 'webhook', got '{update_mode}'")
+        webhook_url = os.getenv("WEBHOOK_URL", "")
+        if update_mode == "webhook" and not webhook_url:
+            raise ValueError("WEBHOOK_URL environment variable is required when UPDATE_MODE=webhook")
+        webhook_listen = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+        webhook_port = int(os.getenv("WEBHOOK_PORT", "8443"))
+        webhook_path = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+        webhook_secret_token = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+        webhook_max_connections = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
         
         # Database and other settings
         database_url = os.getenv("DATABASE_URL", "data/bot.db")
+        shard_by_group = os.getenv("SHARD_BY_GROUP", "false").lower() == "true"
+        shard_dir = os.getenv("SHARD_DIR", "data/shards")
+        max_open_shards = int(os.getenv("MAX_OPEN_SHARDS", "32"))
+        db_instrumentation = os.getenv("DB_INSTRUMENTATION", "false").lower() == "true"
+        slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "100"))
+        metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        metrics_host = os.getenv("METRICS_HOST", "0.0.0.0")
+        trace_file = os.getenv("TRACE_FILE", "")
+        trace_sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+        trace_slow_seconds = float(os.getenv("TRACE_SLOW_SECONDS", "2"))
+        profile_dir = os.getenv("PROFILE_DIR", "data/profiles")
+        profile_seconds = float(os.getenv("PROFILE_SECONDS", "30"))
+        profile_max_seconds = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
         default_balance = float(os.getenv("DEFAULT_BALANCE", "1000.0"))
         max_history = int(os.getenv("MAX_TRANSACTION_HISTORY", "10"))
+        render_cache_size = int(os.getenv("RENDER_CACHE_SIZE", "256"))
         log_level = os.getenv("LOG_LEVEL", "INFO")
         log_file = os.getenv("LOG_FILE", "logs/bot.log")
+        log_json = os.getenv("LOG_JSON", "false").lower() == "true"
+        log_max_bytes = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+        log_rotate_when = os.getenv("LOG_ROTATE_WHEN", "")
+        log_backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+        log_compress = os.getenv("LOG_COMPRESS", "true").lower() == "true"
+        
+        # Admin and export settings
+        admin_user_ids = [
+            int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",")
+            if user_id.strip()
+        ]
+        export_chunk_size = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
         
         return cls(
             token=token,
@@ -86,13 +239,65 @@ class BotConfig:
             ai_model=ai_model,
             ai_temperature=ai_temperature,
             enable_ai=enable_ai,
+            ai_usage_flush_seconds=ai_usage_flush_seconds,
+            ai_price_prompt_per_m=ai_price_prompt_per_m,
+            ai_price_completion_per_m=ai_price_completion_per_m,
             monitor_groups=monitor_groups,
             auto_detect_transfers=auto_detect_transfers,
+            drop_pending_updates=drop_pending_updates,
+            catchup_batch_size=catchup_batch_size,
+            dedup_cache_size=dedup_cache_size,
+            concurrent_updates=concurrent_updates,
+            max_pending_updates=max_pending_updates,
+            overload_queue_depth=overload_queue_depth,
+            overload_llm_seconds=overload_llm_seconds,
+            overload_sample_rate=overload_sample_rate,
+            overload_hold_seconds=overload_hold_seconds,
+            schedule_batch_size=schedule_batch_size,
+            schedule_horizon_seconds=schedule_horizon_seconds,
+            rollup_backfill_chunk=rollup_backfill_chunk,
+            workers=workers,
+            worker_restart_delay=worker_restart_delay,
+            inbox_consumers=inbox_consumers,
+            inbox_max_attempts=inbox_max_attempts,
+            send_global_rate=send_global_rate,
+            send_group_rate_per_minute=send_group_rate_per_minute,
+            send_info_ttl=send_info_ttl,
+            coalesce_confirmations=coalesce_confirmations,
+            coalesce_window_seconds=coalesce_window_seconds,
+            update_mode=update_mode,
+            webhook_url=webhook_url,
+            webhook_listen=webhook_listen,
+            webhook_port=webhook_port,
+            webhook_path=webhook_path,
+            webhook_secret_token=webhook_secret_token,
+            webhook_max_connections=webhook_max_connections,
             database_url=database_url,
+            shard_by_group=shard_by_group,
+            shard_dir=shard_dir,
+            max_open_shards=max_open_shards,
+            db_instrumentation=db_instrumentation,
+            slow_query_ms=slow_query_ms,
+            metrics_port=metrics_port,
+            metrics_host=metrics_host,
+            trace_file=trace_file,
+            trace_sample_rate=trace_sample_rate,
+            trace_slow_seconds=trace_slow_seconds,
+            profile_dir=profile_dir,
+            profile_seconds=profile_seconds,
+            profile_max_seconds=profile_max_seconds,
             default_balance=default_balance,
             max_transaction_history=max_history,
+            render_cache_size=render_cache_size,
+            admin_user_ids=admin_user_ids,
+            export_chunk_size=export_chunk_size,
             log_level=log_level,
-            log_file=log_file
+            log_file=log_file,
+            log_json=log_json,
+            log_max_bytes=log_max_bytes,
+            log_rotate_when=log_rotate_when,
+            log_backup_count=log_backup_count,
+            log_compress=log_compress
         )
     
     def ensure_directories(self):
@@ -100,9 +305,21 @@ class BotConfig:
         # Database directory
         Path(self.database_url).parent.mkdir(parents=True, exist_ok=True)
         
+        # Shard directory
+        if self.shard_by_group:
+            Path(self.shard_dir).mkdir(parents=True, exist_ok=True)
+        
         # Log directory
         Path(self.log_file).parent.mkdir(parents=True, exist_ok=True)
 
+    def get_webhook_url(self) -> str:
+        """Get the public URL Telegram should post updates to"""
+        return f"{self.webhook_url.rstrip('/')}/{self.webhook_path}"
+
+    def is_admin(self, telegram_user_id: int) -> bool:
+        """Check if a Telegram user may run admin commands"""
+        return telegram_user_id in self.admin_user_ids
+
     def get_ai_api_key(self) -> str:
         """Get the appropriate AI API key based on provider"""
         if self.ai_provider == "mistral":
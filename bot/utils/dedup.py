@@ -0,0 +1,47 @@
+"""In-memory set of recently processed keys"""
+
+import threading
+from collections import OrderedDict
+from typing import Hashable
+
+
+class RecentKeys:
+    """Bounded LRU set used to drop duplicate updates cheaply
+
+    Only the most recent `maxsize` keys are remembered; anything older must
+    be caught by the database (e.g. the unique (group_id, message_id, to_user_id) index).
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self._keys: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable) -> bool:
+        """Remember a key
+
+        Returns:
+            True if the key is new, False if it was already seen
+        """
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return False
+
+            self._keys[key] = None
+            if len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+            return True
+
+    def discard(self, key: Hashable):
+        """Forget a key so it can be processed again"""
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
@@ -1,37 +1,159 @@
 """Logging configuration"""
 
+import atexit
+import copy
+import gzip
+import json
 import logging
+import os
+import queue
+import shutil
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
 from pathlib import Path
+from typing import Optional
 from bot.utils.config import BotConfig
 
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra={...} fields included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.processName,
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """Enqueues records with their arguments merged but otherwise unformatted
+
+    The stock handler formats the whole record (tracebacks included) on the
+    logging thread; here only the message arguments are merged, since they
+    may change after the call, and the listener thread does the rest.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    """Compress the rotated file (runs on the listener thread)"""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _file_handler(config: BotConfig, path: str) -> logging.Handler:
+    """Rotating file handler: by time if LOG_ROTATE_WHEN is set, else by size"""
+    if config.log_rotate_when:
+        handler = TimedRotatingFileHandler(
+            path,
+            when=config.log_rotate_when,
+            backupCount=config.log_backup_count,
+            encoding='utf-8'
+        )
+    else:
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=config.log_max_bytes,
+            backupCount=config.log_backup_count,
+            encoding='utf-8'
+        )
+    if config.log_compress:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def setup_logging(config: BotConfig, process_name: Optional[str] = None) -> QueueListener:
+    """Configure logging for the application
+
+    Loggers only put records on an in-memory queue; a QueueListener thread
+    formats them and does the console and file I/O, so slow disks and log
+    rotation never hold up the event loop. Worker processes pass a
+    `process_name` and write to their own file (bot.worker-1.log), since
+    several processes rotating one file would clobber each other.
+    """
+    global _listener
+    stop_logging()
 
-def setup_logging(config: BotConfig):
-    """Configure logging for the application"""
     # Ensure log directory exists
     config.ensure_directories()
-    
+
     # Create formatters
-    formatter = logging.Formatter(config.log_format)
-    
+    if config.log_json:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(config.log_format)
+
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
-    
+
     # File handler
-    file_handler = logging.FileHandler(config.log_file, encoding='utf-8')
+    log_file = config.log_file
+    if process_name:
+        path = Path(log_file)
+        log_file = str(path.with_name(f"{path.stem}.{process_name}{path.suffix}"))
+    file_handler = _file_handler(config, log_file)
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
-    
-    # Root logger
+
+    # Root logger only enqueues
+    log_queue = queue.SimpleQueue()
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, config.log_level.upper()))
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
-    
+    root_logger.addHandler(_QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+
     # Reduce noise from telegram library
     logging.getLogger('httpx').setLevel(logging.WARNING)
     logging.getLogger('telegram').setLevel(logging.WARNING)
-    
+
     logging.info("Logging configured successfully")
+    return _listener
+
+
+def stop_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, _QueueHandler):
+            root_logger.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
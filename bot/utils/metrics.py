@@ -0,0 +1,423 @@
+"""In-process metrics registry with Prometheus text exposition"""
+
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from bot.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds (last bucket is +Inf)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for metrics with optional labels
+    
+    Recording is a dict lookup and an update under a lock. Hot paths bind
+    their label values once, e.g. `STAGE = HIST.labels(stage="transfer")`,
+    and then call the child directly.
+    """
+    
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def labels(self, *values, **labels):
+        """Get the child metric for a set of label values"""
+        if labels:
+            values = tuple(str(labels[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+    
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+    
+    def _default(self):
+        """The only child of a metric without labels"""
+        return self._children[()]
+    
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+    
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    
+    kind = "counter"
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+    
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    __slots__ = ("value", "_lock")
+    
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+    
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+    
+    def set(self, value: float):
+        self.value = value
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+    
+    kind = "gauge"
+    
+    def _new_child(self):
+        return _GaugeChild()
+    
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+    
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+    
+    def set(self, value: float):
+        self._default().set(value)
+    
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _Timer:
+    __slots__ = ("_child", "_started")
+    
+    def __init__(self, child):
+        self._child = child
+    
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+    
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+    
+    def time(self) -> _Timer:
+        """Context manager observing the duration of its block in seconds"""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+    
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float):
+        self._default().observe(value)
+    
+    def time(self) -> _Timer:
+        return self._default().time()
+    
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total, count = child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(float(bound))}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+def exposition(
+    name: str,
+    kind: str,
+    documentation: str,
+    samples: Iterable[Tuple[Dict[str, str], float]]
+) -> List[str]:
+    """Exposition lines for values collected at scrape time
+    
+    Args:
+        name: Full sample name (e.g. including a _total suffix)
+        kind: counter, gauge or histogram
+        samples: (labels, value) pairs
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+class Registry:
+    """Set of metrics and scrape-time collectors rendered together"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+        self._lock = threading.Lock()
+    
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+    
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """Add a function producing exposition lines when scraped
+        
+        For values that already live elsewhere (queue depths, QueryStats),
+        so recording them costs nothing on the hot path.
+        """
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        """All metrics in Prometheus text format"""
+        blocks = [metric.render() for metric in list(self._metrics.values())]
+        for collector in list(self._collectors):
+            try:
+                blocks.append("\n".join(collector()))
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        return "\n".join(block for block in blocks if block) + "\n"
+
+
+# Process-wide registry and the bot's metrics
+REGISTRY = Registry()
+
+UPDATES = REGISTRY.counter("bot_updates", "Updates handled, by handler", ["handler"])
+HANDLER_SECONDS = REGISTRY.histogram("bot_handler_seconds", "Handler duration", ["handler"])
+HANDLER_ERRORS = REGISTRY.counter("bot_handler_errors", "Handlers that raised, by handler", ["handler"])
+IN_FLIGHT = REGISTRY.gauge("bot_updates_in_flight", "Updates currently being handled")
+STAGE_SECONDS = REGISTRY.histogram(
+    "bot_stage_seconds",
+    "Duration of each group message processing stage",
+    ["stage"]
+)
+LLM_ERRORS = REGISTRY.counter("bot_llm_errors", "Failed LLM calls, by operation and kind", ["operation", "kind"])
+
+
+class _StageTimer(_Timer):
+    __slots__ = ("_span",)
+    
+    def __init__(self, child, name: str):
+        super().__init__(child)
+        self._span = tracing.span(name)
+    
+    def __enter__(self):
+        self._span.__enter__()
+        return super().__enter__()
+    
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        return self._span.__exit__(*exc)
+
+
+class _Stage:
+    """Stage histogram whose timed blocks are also trace spans"""
+    
+    __slots__ = ("name", "_child")
+    
+    def __init__(self, name: str, child: _HistogramChild):
+        self.name = name
+        self._child = child
+    
+    def observe(self, value: float):
+        self._child.observe(value)
+    
+    def time(self) -> _StageTimer:
+        return _StageTimer(self._child, self.name)
+
+
+def stage(name: str) -> _Stage:
+    """Histogram of one processing stage (bind once, time with .time())
+    
+    Timed blocks also open a span named after the stage when the current
+    update is being traced (see bot.utils.tracing).
+    """
+    return _Stage(name, STAGE_SECONDS.labels(stage=name))
+
+
+def instrument(name: str, callback):
+    """Wrap a handler callback to count it, time it and track in-flight updates
+    
+    Each call is also the root span of a trace when tracing is configured.
+    """
+    updates = UPDATES.labels(handler=name)
+    seconds = HANDLER_SECONDS.labels(handler=name)
+    errors = HANDLER_ERRORS.labels(handler=name)
+    
+    async def wrapper(update, context):
+        updates.inc()
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        chat = getattr(update, "effective_chat", None)
+        try:
+            with tracing.trace(
+                name,
+                update_id=getattr(update, "update_id", None),
+                chat_id=chat.id if chat else None
+            ):
+                return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+            IN_FLIGHT.dec()
+    
+    wrapper.__name__ = getattr(callback, "__name__", name)
+    return wrapper
+
+
+class MetricsServer:
+    """Serves a registry at /metrics from a background thread"""
+    
+    def __init__(self, host: str, port: int, registry: Registry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        registry = self.registry
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        logger.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+    
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
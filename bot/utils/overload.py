@@ -0,0 +1,151 @@
+"""Adaptive load shedding for passive transfer detection"""
+
+import logging
+import random
+import time
+from enum import IntEnum
+from typing import Callable, List, Optional
+from bot.utils.metrics import exposition
+
+logger = logging.getLogger(__name__)
+
+# Seconds between re-evaluations of the level (reads the queue depth)
+EVALUATE_INTERVAL = 1.0
+
+# LLM latency observations older than this no longer count: at the higher
+# levels few calls are made, and a stale slow sample must not pin the level
+LATENCY_STALE_SECONDS = 30.0
+
+
+class Level(IntEnum):
+    """How far passive detection is degraded"""
+    NORMAL = 0  # Every group message goes to the LLM
+    RULES = 1   # Rule-parsed and amount-less messages skip the LLM
+    SAMPLE = 2  # Only a sample of the remaining messages go to the LLM
+    DEFER = 3   # None go to the LLM; they are deferred in the inbox table
+
+
+# Pressure (load / threshold) at which each level starts
+_ENTER = {Level.RULES: 1.0, Level.SAMPLE: 2.0, Level.DEFER: 4.0}
+
+
+class OverloadController:
+    """Picks the degradation level from handler queue depth and LLM latency
+
+    Pressure is the larger of queue depth / `queue_threshold` and the
+    smoothed LLM latency / `latency_threshold`. The level rises as soon as
+    pressure calls for it, and falls one step at a time once pressure has
+    stayed below the current level's threshold for `hold_seconds`, so it
+    doesn't flap at the boundary. Commands never consult it.
+    """
+
+    def __init__(
+        self,
+        queue_depth: Callable[[], int],
+        queue_threshold: int = 200,
+        latency_threshold: float = 8.0,
+        sample_rate: float = 0.25,
+        hold_seconds: float = 10.0,
+        smoothing: float = 0.2
+    ):
+        self.queue_depth = queue_depth
+        self.queue_threshold = queue_threshold
+        self.latency_threshold = latency_threshold
+        self.sample_rate = sample_rate
+        self.hold_seconds = hold_seconds
+        self.smoothing = smoothing
+
+        self._level = Level.NORMAL
+        self._evaluated_at = float("-inf")
+        self._calm_since: Optional[float] = None
+        self.latency = 0.0
+        self._latency_at = float("-inf")
+        self.depth = 0
+
+        # Metrics
+        self.shed = {"rules": 0, "skipped": 0, "deferred": 0}
+        self.transitions = 0
+
+    def observe_latency(self, seconds: float):
+        """Fold one LLM call duration into the smoothed latency"""
+        now = time.monotonic()
+        if now - self._latency_at > LATENCY_STALE_SECONDS:
+            self.latency = seconds
+        else:
+            self.latency += self.smoothing * (seconds - self.latency)
+        self._latency_at = now
+
+    def pressure(self, now: float) -> float:
+        latency = self.latency if now - self._latency_at <= LATENCY_STALE_SECONDS else 0.0
+        return max(self.depth / self.queue_threshold, latency / self.latency_threshold)
+
+    @property
+    def level(self) -> Level:
+        """Current level (re-evaluated at most every EVALUATE_INTERVAL)"""
+        now = time.monotonic()
+        if now - self._evaluated_at >= EVALUATE_INTERVAL:
+            self.evaluate(now)
+        return self._level
+
+    def evaluate(self, now: Optional[float] = None) -> Level:
+        now = time.monotonic() if now is None else now
+        self._evaluated_at = now
+        self.depth = self.queue_depth()
+        pressure = self.pressure(now)
+
+        target = Level.NORMAL
+        for level, threshold in _ENTER.items():
+            if pressure >= threshold:
+                target = level
+
+        if target > self._level:
+            self._set(target, pressure)
+            self._calm_since = None
+        elif target < self._level:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.hold_seconds:
+                self._set(Level(self._level - 1), pressure)
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        return self._level
+
+    def _set(self, level: Level, pressure: float):
+        log = logger.warning if level > self._level else logger.info
+        log(
+            "Overload level %s -> %s (queue depth %d, LLM latency %.1fs, pressure %.2f)",
+            self._level.name, level.name, self.depth, self.latency, pressure
+        )
+        self._level = level
+        self.transitions += 1
+
+    def sample(self) -> bool:
+        """Whether a message goes to the LLM at the SAMPLE level"""
+        return random.random() < self.sample_rate
+
+    def exposition(self) -> List[str]:
+        """Prometheus text exposition lines"""
+        return (
+            exposition(
+                "bot_overload_level", "gauge",
+                "Passive detection degradation level (0 normal, 1 rules, 2 sample, 3 defer)",
+                [({}, int(self._level))]
+            )
+            + exposition(
+                "bot_overload_queue_depth", "gauge", "Handler queue depth at the last evaluation",
+                [({}, self.depth)]
+            )
+            + exposition(
+                "bot_overload_llm_latency_seconds", "gauge", "Smoothed LLM detection latency",
+                [({}, self.latency)]
+            )
+            + exposition(
+                "bot_overload_shed_total", "counter", "Group messages not sent to the LLM, by action",
+                [({"action": action}, count) for action, count in self.shed.items()]
+            )
+            + exposition(
+                "bot_overload_transitions_total", "counter", "Level changes",
+                [({}, self.transitions)]
+            )
+        )
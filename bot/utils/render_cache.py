@@ -0,0 +1,50 @@
+"""Cache of rendered command replies"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, List
+
+
+class RenderCache:
+    """LRU cache of rendered reply pages
+
+    Keys include the ledger version of the database the reply was rendered
+    from (see Database.ledger_version) and, when worker processes share the
+    file, its data version (Database.data_version), so an entry is never
+    served after a transfer or user change, even one made by another
+    worker; stale entries simply age out of the LRU.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: Hashable, render: Callable[[], List[str]]) -> List[str]:
+        """Get cached pages for a key, rendering and storing them on a miss"""
+        if self.maxsize <= 0:
+            return render()
+
+        with self._lock:
+            pages = self._entries.get(key)
+            if pages is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pages
+
+        pages = render()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = pages
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return pages
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
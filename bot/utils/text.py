@@ -0,0 +1,129 @@
+"""Text formatting helpers for Telegram messages"""
+
+import re
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+# Telegram rejects messages longer than this many characters
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# A transfer announcement always states an amount: a digit or currency sign
+_AMOUNT_HINT = re.compile(r"[0-9$€£¥₹]")
+
+# Unambiguous past-tense transfer announcements (the whole message), used
+# instead of the LLM under overload: "sent $50 to @bob", "I paid @bob 50",
+# "@bob I sent you $50", "paid $30 each to @a @b and @c". Questions and
+# plans never match.
+_AMOUNT = r"\$?(?P<whole>\d{1,3}(?:,\d{3})+|\d+)(?P<cents>\.\d{1,2})?"
+_MENTIONS = r"@\w+(?:(?:\s*,\s*|\s+and\s+|\s*&\s*|\s+)@\w+)+"
+_END = r"\s*[.!]*\s*"
+_TRANSFER_PATTERNS = [
+    re.compile(
+        rf"(?:i\s+)?(?:just\s+)?(?:sent|transferred|paid|gave)\s+{_AMOUNT}\s+to\s+(?P<users>@\w+){_END}",
+        re.IGNORECASE
+    ),
+    re.compile(
+        rf"(?:i\s+)?(?:just\s+)?(?:sent|paid)\s+(?P<users>@\w+)\s+{_AMOUNT}{_END}",
+        re.IGNORECASE
+    ),
+    re.compile(
+        rf"(?P<users>@\w+),?\s+i\s+(?:just\s+)?(?:sent|transferred|paid)\s+you\s+{_AMOUNT}{_END}",
+        re.IGNORECASE
+    ),
+    re.compile(
+        rf"(?:i\s+)?(?:just\s+)?(?:sent|transferred|paid|gave)\s+{_AMOUNT}\s+each\s+to\s+(?P<users>{_MENTIONS}){_END}",
+        re.IGNORECASE
+    )
+]
+_MENTION = re.compile(r"@(\w+)")
+
+# Room kept free in each page for the " (12/34)" page marker
+_PAGE_MARKER_RESERVE = 16
+
+
+def paginate(
+    lines: Iterable[str],
+    header: str = "",
+    footer: str = "",
+    limit: int = TELEGRAM_MESSAGE_LIMIT
+) -> List[str]:
+    """
+    Split lines into messages that fit Telegram's length limit
+    
+    The header starts every page (with a "(page/total)" marker when there
+    is more than one page) and the footer ends the last page. Lines are
+    never split unless a single line is longer than a page.
+    
+    Returns:
+        List of message texts, at least one
+    """
+    budget = limit - len(header) - _PAGE_MARKER_RESERVE
+    if budget <= len(footer):
+        raise ValueError("Header and footer leave no room for content")
+    
+    pages: List[List[str]] = [[]]
+    size = 0
+    for line in lines:
+        # Hard-split lines that can never fit on one page
+        while len(line) + 1 > budget:
+            if pages[-1]:
+                pages.append([])
+            pages[-1].append(line[:budget - 1])
+            pages.append([])
+            line = line[budget - 1:]
+            size = 0
+        
+        if size + len(line) + 1 > budget:
+            pages.append([])
+            size = 0
+        pages[-1].append(line)
+        size += len(line) + 1
+    
+    if size + len(footer) > budget:
+        pages.append([])
+    if not pages[-1] and len(pages) > 1 and not footer:
+        pages.pop()
+    
+    total = len(pages)
+    messages = []
+    for number, page in enumerate(pages, 1):
+        page_header = header
+        if total > 1 and header:
+            title, newline, rest = header.partition("\n")
+            page_header = f"{title} ({number}/{total}){newline}{rest}"
+        text = page_header + "\n".join(page)
+        if number == total and footer:
+            text += ("\n" if page else "") + footer
+        messages.append(text)
+    return messages
+
+
+def mentions_amount(text: str) -> bool:
+    """Cheap pre-filter: could this message announce a transfer?
+    
+    Messages without any digit or currency sign are never sent to the LLM
+    when catching up on a backlog.
+    """
+    return bool(_AMOUNT_HINT.search(text))
+
+
+class ParsedTransfer(NamedTuple):
+    """Transfer recognized by the rule-based parser (amount is per receiver)"""
+    to_usernames: Tuple[str, ...]
+    amount: float
+
+
+def parse_transfer(text: str) -> Optional[ParsedTransfer]:
+    """Rule-based transfer detection for clear-cut announcements
+    
+    Only matches a handful of fixed phrasings, so a match is as reliable as
+    a high-confidence LLM answer; anything else returns None.
+    """
+    text = text.strip()
+    for pattern in _TRANSFER_PATTERNS:
+        match = pattern.fullmatch(text)
+        if match:
+            whole, cents = match.group("whole"), match.group("cents") or ""
+            amount = float(whole.replace(",", "") + cents)
+            if amount > 0:
+                return ParsedTransfer(tuple(_MENTION.findall(match.group("users"))), amount)
+    return None
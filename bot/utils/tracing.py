@@ -0,0 +1,337 @@
+"""Lightweight tracing with OpenTelemetry-compatible JSON export"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """A timed operation in a trace
+
+    Spans only live in memory until their trace finishes; whether they are
+    exported is decided then (see Tracer).
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace: "_Trace", name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.tracer._span_ended(self)
+
+    def end_with_future(self, future):
+        """Done callback ending the span when an asyncio future resolves"""
+        if future.cancelled():
+            self.attributes["cancelled"] = True
+            self.end()
+        else:
+            self.end(future.exception())
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+class _Trace:
+    __slots__ = ("tracer", "trace_id", "sampled", "spans", "open", "dropped")
+
+    def __init__(self, tracer: "Tracer", sampled: bool):
+        self.tracer = tracer
+        self.trace_id = _new_id(128)
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.open = 0
+        self.dropped = 0
+
+
+class _SpanContext:
+    """Context manager making a span current for the enclosed block"""
+
+    __slots__ = ("span", "_token")
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.span.end(exc)
+        return False
+
+
+class _NullContext:
+    """Shared no-op context used when nothing is being traced"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullContext()
+
+
+class FileExporter:
+    """Appends finished traces to a file as OTLP/JSON lines
+
+    Each line is an ExportTraceServiceRequest ({"resourceSpans": [...]}) as
+    written by the OpenTelemetry collector's file exporter, so the file can
+    be replayed into a collector or loaded by tools that read OTLP JSON.
+    Writes happen on a background thread; traces are dropped (and counted)
+    if the writer falls more than `max_queue` traces behind.
+    """
+
+    def __init__(self, path: str, service_name: str = "balance-bot", max_queue: int = 1000):
+        self.path = path
+        self.service_name = service_name
+        self.dropped = 0
+        self.exported = 0
+        self._queue: "queue.Queue[Optional[List[Span]]]" = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                spans = self._queue.get()
+                if spans is None:
+                    return
+                try:
+                    f.write(json.dumps(self.encode(spans), separators=(",", ":")) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                    self.exported += 1
+                except Exception as e:
+                    logger.error(f"Failed to write trace: {e}")
+
+    def encode(self, spans: List[Span]) -> Dict[str, Any]:
+        """OTLP/JSON representation of one trace"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes({"service.name": self.service_name, "process.pid": os.getpid()})},
+                "scopeSpans": [{
+                    "scope": {"name": "bot"},
+                    "spans": [_encode_span(span) for span in spans]
+                }]
+            }]
+        }
+
+    def shutdown(self, timeout: float = 5.0):
+        """Write what is queued and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+def _value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": " ".join(str(value).split())}
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _value(value)} for key, value in attributes.items() if value is not None]
+
+
+def _encode_span(span: Span) -> Dict[str, Any]:
+    encoded = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _attributes(span.attributes)
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    if span.error:
+        encoded["status"] = {"code": STATUS_ERROR, "message": span.error}
+    return encoded
+
+
+class Tracer:
+    """Records spans per trace and exports sampled or slow traces
+
+    A trace is sampled up front with probability `sample_rate`. Unsampled
+    traces are still recorded in memory (at most `max_spans` spans each) so
+    that a trace whose root span takes `slow_seconds` or longer is exported
+    in full; with `slow_seconds` = 0 they aren't recorded at all. A trace is
+    finished once its root span and every child have ended, which may be
+    after the handler returned (e.g. a queued reply being sent).
+    """
+
+    def __init__(self, exporter, sample_rate: float = 0.01, slow_seconds: float = 2.0, max_spans: int = 256):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.traces = 0
+        self.sampled = 0
+        self.slow = 0
+
+    def start_trace(self, name: str, kind: int = KIND_SERVER, **attributes) -> Optional[Span]:
+        """Root span of a new trace (None if this trace isn't recorded)"""
+        self.traces += 1
+        sampled = random.random() < self.sample_rate
+        if not sampled and not self.slow_seconds:
+            return None
+        return self._start(_Trace(self, sampled), name, None, kind, attributes)
+
+    def _start(self, trace: _Trace, name: str, parent_id: Optional[str], kind: int, attributes) -> Optional[Span]:
+        with self._lock:
+            if len(trace.spans) >= self.max_spans:
+                trace.dropped += 1
+                return None
+            span = Span(trace, name, parent_id, kind, attributes)
+            trace.spans.append(span)
+            trace.open += 1
+        return span
+
+    def _span_ended(self, span: Span):
+        trace = span.trace
+        with self._lock:
+            trace.open -= 1
+            if trace.open:
+                return
+        root = trace.spans[0]
+        if root.end_ns is None:
+            return
+        slow = self.slow_seconds and root.duration >= self.slow_seconds
+        if slow:
+            self.slow += 1
+            root.attributes["trace.slow"] = True
+        if trace.sampled:
+            self.sampled += 1
+        if trace.dropped:
+            root.attributes["trace.dropped_spans"] = trace.dropped
+        if trace.sampled or slow:
+            self.exporter.export(trace.spans)
+
+    def exposition(self) -> List[str]:
+        """Tracer metrics in Prometheus text format (see bot.utils.metrics)"""
+        from bot.utils.metrics import exposition  # metrics imports this module
+        return exposition(
+            "bot_traces_total", "counter", "Update traces by outcome",
+            [
+                ({"outcome": "started"}, self.traces),
+                ({"outcome": "sampled"}, self.sampled),
+                ({"outcome": "slow"}, self.slow),
+                ({"outcome": "written"}, self.exporter.exported),
+                ({"outcome": "dropped"}, self.exporter.dropped)
+            ]
+        )
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+
+_tracer: Optional[Tracer] = None
+
+
+def configure(tracer: Optional[Tracer]):
+    """Install the process-wide tracer (None disables tracing)"""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def trace(name: str, **attributes):
+    """Context manager for the root span of an update (child if already in a trace)"""
+    parent = _current.get()
+    if parent is not None:
+        return span(name, **attributes)
+    if _tracer is None:
+        return _NULL
+    root = _tracer.start_trace(name, **attributes)
+    return _SpanContext(root) if root is not None else _NULL
+
+
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Context manager for a child span of the current span (no-op outside a trace)"""
+    parent = _current.get()
+    if parent is None:
+        return _NULL
+    child = parent.trace.tracer._start(parent.trace, name, parent.span_id, kind, attributes)
+    return _SpanContext(child) if child is not None else _NULL
+
+
+def start_span(name: str, kind: int = KIND_INTERNAL, **attributes) -> Optional[Span]:
+    """Child span of the current span ended explicitly with Span.end()
+
+    For work that outlives the current block, e.g. a message handed to the
+    sender queue. Returns None outside a trace.
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    return parent.trace.tracer._start(parent.trace, name, parent.span_id, kind, attributes)
+
+
+def db_span(query: str):
+    """Client span for one SQL statement (no-op outside a trace)"""
+    parent = _current.get()
+    if parent is None:
+        return _NULL
+    return span(query.split(None, 1)[0].upper(), KIND_CLIENT, **{"db.system": "sqlite", "db.statement": query})
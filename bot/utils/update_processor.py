@@ -0,0 +1,110 @@
+"""Concurrent update processing with per-chat ordering"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, List, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from bot.utils.update_tracker import UpdateTracker
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatSlot:
+    """Lock shared by all in-flight updates of one chat"""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates from different chats concurrently, one chat at a time
+
+    Updates of the same chat wait on a per-chat FIFO lock, so they run
+    strictly in arrival order. At most `max_concurrent_updates` handlers run
+    at once across all chats. Updates waiting for their chat do not hold a
+    concurrency slot, so one busy chat cannot starve the others.
+
+    `max_pending_updates` bounds the number of in-flight update tasks
+    (running plus waiting). It is enforced by the base class semaphore;
+    `pending` is the current number.
+
+    With a `tracker`, updates are marked as begun as soon as they get here,
+    before waiting for their chat or a concurrency slot, so the watermark
+    cannot pass an update that is still queued. Finishing them is left to
+    the caller (the tracker only moves once they finish).
+    """
+
+    def __init__(
+        self,
+        max_concurrent_updates: int,
+        max_pending_updates: int = 4096,
+        tracker: Optional[UpdateTracker] = None
+    ):
+        if max_pending_updates < max_concurrent_updates:
+            raise ValueError("max_pending_updates must be >= max_concurrent_updates")
+        super().__init__(max_pending_updates)
+        self.concurrency = max_concurrent_updates
+        self._running: Optional[asyncio.Semaphore] = None
+        self._chats: Dict[Hashable, _ChatSlot] = {}
+        self.tracker = tracker
+        self.active = 0
+        self.pending = 0
+
+    @staticmethod
+    def chat_key(update: object) -> Optional[Hashable]:
+        """Get the ordering key of an update (its chat id)"""
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def initialize(self) -> None:
+        self._running = asyncio.Semaphore(self.concurrency)
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # Entered in arrival order: the base class semaphore is FIFO
+        if self.tracker is not None and isinstance(update, Update):
+            self.tracker.begin(update.update_id)
+        self.pending += 1
+        try:
+            await self._process(update, coroutine)
+        finally:
+            self.pending -= 1
+
+    async def _process(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.chat_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        slot = self._chats.get(key)
+        if slot is None:
+            slot = self._chats[key] = _ChatSlot()
+        slot.users += 1
+        try:
+            async with slot.lock:
+                await self._run(coroutine)
+        finally:
+            slot.users -= 1
+            if slot.users == 0:
+                del self._chats[key]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        """Run a handler coroutine within the global concurrency cap"""
+        async with self._running:
+            self.active += 1
+            try:
+                await coroutine
+            finally:
+                self.active -= 1
+
+    @property
+    def waiting_chats(self) -> List[Hashable]:
+        """Chats that currently have updates in flight"""
+        return list(self._chats)
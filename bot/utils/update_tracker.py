@@ -0,0 +1,50 @@
+"""Tracking of which updates have been fully processed"""
+
+import heapq
+import threading
+from typing import List, Set
+
+
+class UpdateTracker:
+    """Low watermark of processed Telegram update ids
+    
+    Updates are received in increasing update_id order but, with concurrent
+    processing, finish out of order. `watermark` is the highest id such that
+    every update received up to it has finished, so persisting it and
+    skipping ids at or below it after a restart never loses an update that
+    was still in flight.
+    """
+    
+    def __init__(self, watermark: int = 0):
+        self.watermark = watermark
+        self._in_flight: Set[int] = set()
+        self._finished: List[int] = []
+        self._lock = threading.Lock()
+    
+    def is_processed(self, update_id: int) -> bool:
+        """Whether an update is at or below the watermark"""
+        return update_id <= self.watermark
+    
+    def begin(self, update_id: int):
+        with self._lock:
+            self._in_flight.add(update_id)
+    
+    def finish(self, update_id: int) -> bool:
+        """Mark an update as finished; returns True if the watermark moved"""
+        with self._lock:
+            self._in_flight.discard(update_id)
+            heapq.heappush(self._finished, update_id)
+            
+            oldest = min(self._in_flight, default=None)
+            moved = False
+            while self._finished and (oldest is None or self._finished[0] < oldest):
+                update_id = heapq.heappop(self._finished)
+                if update_id > self.watermark:
+                    self.watermark = update_id
+                    moved = True
+            return moved
+    
+    def advance(self, update_id: int):
+        """Move the watermark past updates handled outside begin/finish"""
+        with self._lock:
+            self.watermark = max(self.watermark, update_id)
@@ -0,0 +1,81 @@
+"""Tests for AdminHandlers"""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from telegram import Chat, Message, Update, User
+from bot.handlers.admin_handlers import AdminHandlers
+from bot.models.shard_router import ShardRouter
+from bot.services.sender_service import Priority, SenderService
+from bot.utils.config import BotConfig
+from bot.utils.profiler import Profiler
+
+ADMIN = 1
+
+
+def make_update(user_id: int, chat_id: int = -100, text: str = "/dbstats") -> Update:
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP)
+    user = User(id=user_id, first_name="user", is_bot=False)
+    message = Message(
+        message_id=1, date=datetime.now(timezone.utc),
+        chat=chat, from_user=user, text=text
+    )
+    return Update(update_id=1, message=message)
+
+
+def make_handlers(**kwargs) -> AdminHandlers:
+    config = BotConfig(token="test", admin_user_ids=[ADMIN])
+    return AdminHandlers(config, export_service=None, **kwargs)
+
+
+def queued(sender: SenderService, chat_id: int = -100):
+    return [(message.priority, message.text) for message in sender._queues.get(chat_id, [])]
+
+
+class TestAdminHandlers:
+    """Test AdminHandlers"""
+
+    @pytest.mark.asyncio
+    async def test_replies_go_through_the_sender(self):
+        sender = SenderService()
+        handlers = make_handlers(sender=sender)
+        context = SimpleNamespace(args=[])
+
+        await handlers.show_db_stats(make_update(ADMIN), context)
+        await handlers.show_db_stats(make_update(2), context)
+
+        assert queued(sender) == [
+            (Priority.REPLY, "ℹ️ Query instrumentation is disabled (DB_INSTRUMENTATION=false)."),
+            (Priority.INFO, "❌ This command is only available to bot admins.")
+        ]
+
+    @pytest.mark.asyncio
+    async def test_export_of_a_group_without_shard(self, tmp_path):
+        sender = SenderService()
+        router = ShardRouter(str(tmp_path / "shards"))
+        handlers = make_handlers(sender=sender, shard_router=router)
+
+        await handlers.export_ledger(make_update(ADMIN), SimpleNamespace(args=[]))
+
+        assert queued(sender) == [(Priority.REPLY, "ℹ️ No transactions recorded in this group yet.")]
+        assert not router.exists(-100)
+
+    @pytest.mark.asyncio
+    async def test_quick_second_profile_is_refused(self, tmp_path):
+        sender = SenderService()
+        profiler = Profiler(str(tmp_path), interval=0.001)
+        handlers = make_handlers(sender=sender, profiler=profiler)
+        context = SimpleNamespace(args=["30"])
+
+        await handlers.run_profile(make_update(ADMIN, text="/profile 30"), context)
+        await handlers.run_profile(make_update(ADMIN, text="/profile 30"), context)
+        profiler.stop()
+        await handlers._profile_task
+
+        texts = [text for _, text in queued(sender)]
+        assert texts[:2] == [
+            "🔬 Profiling for 30s...",
+            "ℹ️ A profiling session is already running. Use /profile stop to end it."
+        ]
+        # Only one session ran (sending its document fails here, without a bot)
+        assert not any("A profiling session is already running" in text for text in texts[2:])
@@ -0,0 +1,134 @@
+"""Tests for backlog catch-up: update tracking, state and bulk processing"""
+
+from datetime import datetime, timezone
+import pytest
+from telegram import Chat, Message, Update, User
+from bot.models.database import Database, init_database
+from bot.services.ai_service import TransferDetection
+from bot.services.balance_service import BalanceService
+from bot.services.state_service import StateService
+from bot.handlers.group_handlers import GroupHandlers
+from bot.utils.update_tracker import UpdateTracker
+from bot.utils.text import mentions_amount
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create test database"""
+    db = Database(str(tmp_path / "test.db"))
+    init_database(db)
+    yield db
+    db.close()
+
+
+class FakeAI:
+    """Detects "sent <amount> to @<user>" and counts LLM calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def detect_transfers(self, messages, group_id=None):
+        self.calls.append(len(messages))
+        detections = []
+        for text, _, _ in messages:
+            words = text.split()
+            if words[0] == "sent":
+                detections.append(TransferDetection(
+                    is_transfer=True, to_username=words[3].lstrip("@"),
+                    amount=float(words[1].lstrip("$")), confidence=0.95, reasoning=""
+                ))
+            else:
+                detections.append(TransferDetection(is_transfer=False, confidence=0.9, reasoning=""))
+        return detections
+
+
+def make_update(update_id: int, chat_id: int, user_id: int, username: str, text: str) -> Update:
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP)
+    user = User(id=user_id, first_name=username, username=username, is_bot=False)
+    message = Message(
+        message_id=update_id, date=datetime.now(timezone.utc),
+        chat=chat, from_user=user, text=text
+    )
+    return Update(update_id=update_id, message=message)
+
+
+class TestUpdateTracker:
+    """Test UpdateTracker"""
+
+    def test_watermark_waits_for_oldest_in_flight(self):
+        tracker = UpdateTracker(10)
+        for update_id in (11, 12, 13):
+            tracker.begin(update_id)
+
+        assert not tracker.finish(12)
+        assert tracker.watermark == 10
+        assert tracker.finish(11)
+        assert tracker.watermark == 12
+        assert tracker.finish(13)
+        assert tracker.watermark == 13
+        assert tracker.is_processed(13)
+
+
+class TestStateService:
+    """Test StateService"""
+
+    def test_last_update_id_round_trip(self, db):
+        state = StateService(db)
+        assert state.get_last_update_id() == 0
+        state.set_last_update_id(41)
+        state.set_last_update_id(42)
+        assert StateService(db).get_last_update_id() == 42
+
+
+class TestNestedTransactions:
+    """Test savepoints inside Database.transaction"""
+
+    def test_inner_failure_keeps_outer_work(self, db):
+        with db.transaction():
+            db.execute("INSERT INTO users (telegram_user_id) VALUES (1)")
+            with pytest.raises(RuntimeError):
+                with db.transaction():
+                    db.execute("INSERT INTO users (telegram_user_id) VALUES (2)")
+                    raise RuntimeError("boom")
+
+        rows = db.fetchall("SELECT telegram_user_id FROM users")
+        assert [row['telegram_user_id'] for row in rows] == [1]
+
+
+class TestProcessBacklog:
+    """Test GroupHandlers.process_backlog"""
+
+    @pytest.mark.asyncio
+    async def test_backlog_is_batched_and_summarized(self, db):
+        balance_service = BalanceService(db)
+        ai = FakeAI()
+        handlers = GroupHandlers(ai, balance_service, balance_service.user_service)
+        updates = [
+            make_update(1, -1, 2, "bob", "hello everyone"),
+            make_update(2, -1, 1, "alice", "sent $10 to @bob"),
+            make_update(3, -1, 1, "alice", "lunch was 12 bucks"),
+            make_update(4, -2, 3, "carol", "sent $5 to @dave"),
+            make_update(5, -1, 2, "bob", "sent $3 to @alice"),
+            make_update(2, -1, 1, "alice", "sent $10 to @bob"),  # redelivered
+        ]
+
+        summaries = {}
+        await handlers.process_backlog(updates, summaries, batch_size=2)
+
+        # "hello everyone" has no amount and never reaches the LLM
+        assert ai.calls == [2, 2]
+        assert [t.amount for t in summaries[-1].transfers] == [10.0, 3.0]
+        assert summaries[-1].messages == 4
+        assert summaries[-2].problems == ["@carol → dave: user not found"]
+
+        alice = balance_service.user_service.get_by_telegram_id(1)
+        assert alice.balance == pytest.approx(993.0)
+
+        text = summaries[-1].format()[0]
+        assert text.startswith("📥 Caught up on 4 messages")
+        assert "2 transfers recorded" in text
+
+    def test_mentions_amount(self):
+        assert mentions_amount("sent 5 to bob")
+        assert mentions_amount("paid @bob $")
+        assert not mentions_amount("see you tomorrow")
@@ -24,66 +24,207 @@ def balance_service(temp_db):
     return BalanceService(temp_db)
 
 
+@pytest.fixture
+def users(balance_service):
+    """Two registered users with the default balance"""
+    alice = balance_service.user_service.get_or_create_user(1, "alice", "Alice")
+    bob = balance_service.user_service.get_or_create_user(2, "bob", "Bob")
+    return alice, bob
+
+
+def balance(balance_service, user):
+    return balance_service.user_service.get_by_id(user.id).balance
+
+
 class TestBalanceService:
     """Test BalanceService"""
     
-    def test_transfer_success(self, balance_service):
-        result = balance_service.transfer("person_a", "person_b", 100.0)
+    def test_transfer_success(self, balance_service, users):
+        alice, bob = users
+        result = balance_service.transfer_by_user_id(alice.id, bob.id, 100.0)
         assert result.success is True
         assert result.transaction is not None
-        assert balance_service.get_balance("person_a") == 900.0
-        assert balance_service.get_balance("person_b") == 1100.0
+        assert balance(balance_service, alice) == 900.0
+        assert balance(balance_service, bob) == 1100.0
     
-    def test_transfer_insufficient_funds(self, balance_service):
-        result = balance_service.transfer("person_a", "person_b", 2000.0)
+    def test_transfer_insufficient_funds(self, balance_service, users):
+        alice, bob = users
+        result = balance_service.transfer_by_user_id(alice.id, bob.id, 2000.0)
         assert result.success is False
         assert "Insufficient funds" in result.message
-        assert balance_service.get_balance("person_a") == 1000.0
+        assert balance(balance_service, alice) == 1000.0
     
-    def test_transfer_negative_amount(self, balance_service):
-        result = balance_service.transfer("person_a", "person_b", -50.0)
+    def test_transfer_negative_amount(self, balance_service, users):
+        alice, bob = users
+        result = balance_service.transfer_by_user_id(alice.id, bob.id, -50.0)
         assert result.success is False
         assert "positive" in result.message.lower()
     
-    def test_transfer_same_user(self, balance_service):
-        result = balance_service.transfer("person_a", "person_a", 50.0)
+    def test_transfer_same_user(self, balance_service, users):
+        alice, _ = users
+        result = balance_service.transfer_by_user_id(alice.id, alice.id, 50.0)
         assert result.success is False
-        assert "same user" in result.message.lower()
+        assert "yourself" in result.message.lower()
     
-    def test_transfer_nonexistent_user(self, balance_service):
-        result = balance_service.transfer("person_a", "person_z", 50.0)
+    def test_transfer_nonexistent_user(self, balance_service, users):
+        alice, _ = users
+        result = balance_service.transfer_by_user_id(alice.id, 999, 50.0)
         assert result.success is False
         assert "not found" in result.message.lower()
     
-    def test_get_all_balances(self, balance_service):
+    def test_get_all_balances(self, balance_service, users):
         balance_text = balance_service.get_all_balances()
-        assert "Person A" in balance_text
-        assert "Person B" in balance_text
+        assert "@alice" in balance_text
+        assert "@bob" in balance_text
         assert "$1000.00" in balance_text
+        assert "Users: 2" in balance_text
     
-    def test_transaction_history(self, balance_service):
-        balance_service.transfer("person_a", "person_b", 100.0)
-        balance_service.transfer("person_b", "person_a", 50.0)
+    def test_get_all_balances_empty(self, balance_service):
+        assert "No users" in balance_service.get_all_balances()
+    
+    def test_transaction_history(self, balance_service, users):
+        alice, bob = users
+        assert "No transactions" in balance_service.get_transaction_history()
+        
+        balance_service.transfer_by_user_id(alice.id, bob.id, 100.0)
+        balance_service.transfer_by_user_id(bob.id, alice.id, 50.0)
         
         history = balance_service.get_transaction_history()
         assert "Recent Transactions" in history
         assert "$100.00" in history
         assert "$50.00" in history
     
-    def test_reset_all_balances(self, balance_service):
-        balance_service.transfer("person_a", "person_b", 100.0)
-        balance_service.reset_all_balances(500.0)
+    def test_multiple_transfers(self, balance_service, users):
+        alice, bob = users
+        balance_service.transfer_by_user_id(alice.id, bob.id, 100.0)
+        balance_service.transfer_by_user_id(alice.id, bob.id, 200.0)
+        balance_service.transfer_by_user_id(bob.id, alice.id, 50.0)
         
-        assert balance_service.get_balance("person_a") == 500.0
-        assert balance_service.get_balance("person_b") == 500.0
+        assert balance(balance_service, alice) == 750.0
+        assert balance(balance_service, bob) == 1250.0
+        assert balance_service.get_user_balance(1) == 750.0
+
+
+class TestIdempotentTransfers:
+    """Test duplicate (group_id, message_id) handling"""
+    
+    def test_duplicate_message_is_rejected_atomically(self, balance_service):
+        alice = balance_service.user_service.get_or_create_user(1, "alice")
+        bob = balance_service.user_service.get_or_create_user(2, "bob")
         
-        history = balance_service.get_transaction_history()
-        assert "No transactions" in history
+        first = balance_service.transfer_by_user_id(alice.id, bob.id, 100.0, message_id=7, group_id=-100)
+        second = balance_service.transfer_by_user_id(alice.id, bob.id, 100.0, message_id=7, group_id=-100)
+        
+        assert first.success is True
+        assert second.success is False
+        assert second.duplicate is True
+        # The rejected duplicate must not have debited anyone
+        assert balance_service.user_service.get_by_id(alice.id).balance == 900.0
+        assert balance_service.user_service.get_by_id(bob.id).balance == 1100.0
+        assert balance_service.transaction_service.exists_for_message(-100, 7)
     
-    def test_multiple_transfers(self, balance_service):
-        balance_service.transfer("person_a", "person_b", 100.0)
-        balance_service.transfer("person_a", "person_b", 200.0)
-        balance_service.transfer("person_b", "person_a", 50.0)
+    def test_same_message_id_in_other_group(self, balance_service):
+        alice = balance_service.user_service.get_or_create_user(1, "alice")
+        bob = balance_service.user_service.get_or_create_user(2, "bob")
         
-        assert balance_service.get_balance("person_a") == 750.0
-        assert balance_service.get_balance("person_b") == 1250.0
+        balance_service.transfer_by_user_id(alice.id, bob.id, 10.0, message_id=7, group_id=-100)
+        result = balance_service.transfer_by_user_id(alice.id, bob.id, 10.0, message_id=7, group_id=-200)
+        assert result.success is True
+
+
+class TestTransferMany:
+    """Test multi-receiver transfers"""
+    
+    @pytest.fixture
+    def group(self, balance_service):
+        user_service = balance_service.user_service
+        return [user_service.get_or_create_user(i, name) for i, name in enumerate(["alice", "bob", "carol", "dave"], 1)]
+    
+    def test_split_is_recorded_in_one_go(self, balance_service, group):
+        alice, bob, carol, dave = group
+        result = balance_service.transfer_many(
+            alice.id, [(bob.id, 30.0), (carol.id, 30.0), (dave.id, 40.0)], message_id=5, group_id=-100
+        )
+        
+        assert result.success is True
+        assert [t.to_user_id for t in result.transactions] == [bob.id, carol.id, dave.id]
+        # Sender balances run down as if the transfers were made one by one
+        assert [t.balance_from for t in result.transactions] == [970.0, 940.0, 900.0]
+        assert result.transaction == result.transactions[-1]
+        assert balance(balance_service, alice) == 900.0
+        assert balance(balance_service, bob) == 1030.0
+        assert balance(balance_service, dave) == 1040.0
+        assert balance_service.transaction_service.get_count() == 3
+    
+    def test_insufficient_funds_records_nothing(self, balance_service, group):
+        alice, bob, carol, _ = group
+        result = balance_service.transfer_many(alice.id, [(bob.id, 600.0), (carol.id, 600.0)])
+        
+        assert result.success is False
+        assert "Insufficient funds" in result.message
+        assert balance(balance_service, alice) == 1000.0
+        assert balance_service.transaction_service.get_count() == 0
+    
+    def test_redelivered_split_is_a_duplicate(self, balance_service, group):
+        alice, bob, carol, _ = group
+        transfers = [(bob.id, 10.0), (carol.id, 10.0)]
+        balance_service.transfer_many(alice.id, transfers, message_id=5, group_id=-100)
+        second = balance_service.transfer_many(alice.id, transfers, message_id=5, group_id=-100)
+        
+        assert second.duplicate is True
+        assert balance(balance_service, alice) == 980.0
+        assert balance_service.transaction_service.get_count() == 2
+    
+    def test_repeated_receiver_is_merged_and_self_rejected(self, balance_service, group):
+        alice, bob, _, _ = group
+        result = balance_service.transfer_many(alice.id, [(bob.id, 10.0), (bob.id, 5.0)])
+        assert [t.amount for t in result.transactions] == [15.0]
+        
+        result = balance_service.transfer_many(alice.id, [(bob.id, 10.0), (alice.id, 5.0)])
+        assert result.success is False
+        assert balance(balance_service, alice) == 985.0
+    
+    def test_get_by_usernames(self, balance_service, group):
+        balance_service.user_service.get_or_create_user(9, None, "Erin")
+        users = balance_service.user_service.get_by_usernames(["@Bob", "carol", "erin", "zed"])
+        assert {name: user.telegram_user_id for name, user in users.items()} == {"@Bob": 2, "carol": 3, "erin": 9}
+
+
+class TestUserHistory:
+    """Test a user's own statement"""
+    
+    @pytest.fixture
+    def group(self, balance_service):
+        user_service = balance_service.user_service
+        alice, bob, carol = (user_service.get_or_create_user(i, name) for i, name in enumerate(["alice", "bob", "carol"], 1))
+        for amount, (sender, receiver) in enumerate([(alice, bob), (bob, alice), (carol, bob), (alice, carol), (bob, alice)], 1):
+            balance_service.transfer_by_user_id(sender.id, receiver.id, amount * 10)
+        return alice, bob, carol
+    
+    def test_keyset_pages(self, balance_service, group):
+        alice, _, _ = group
+        transactions = balance_service.transaction_service
+        
+        first = transactions.get_by_user(alice.id, limit=2)
+        assert [t.id for t in first] == [5, 4]
+        assert [t.id for t in transactions.get_by_user(alice.id, limit=2, before_id=4)] == [2, 1]
+        assert transactions.get_by_user(alice.id, before_id=1) == []
+    
+    def test_running_balance(self, balance_service, group):
+        alice, _, _ = group
+        lines = balance_service.get_user_history(alice.id, limit=3)
+        
+        assert lines[0].startswith("+$50.00 from @bob | balance $1020.00")
+        assert lines[1].startswith("-$40.00 to @carol | balance $970.00")
+        assert lines[2].startswith("+$20.00 from @bob | balance $1010.00")
+        assert lines[-1] == "⏭ Older: /myhistory 2"
+        assert balance_service.get_user_history(alice.id, before_id=2)[0].startswith("-$10.00 to @bob")
+    
+    def test_each_side_is_an_index_range_scan(self, temp_db):
+        for column in ("from_user_id", "to_user_id"):
+            plan = " ".join(row['detail'] for row in temp_db.fetchall(
+                f"EXPLAIN QUERY PLAN SELECT id FROM transactions WHERE {column} = ? AND id < ? ORDER BY id DESC",
+                (1, 10)
+            ))
+            assert f"idx_transactions_{column[:-3]}" in plan
+            assert "TEMP B-TREE" not in plan
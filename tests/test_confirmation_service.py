@@ -0,0 +1,74 @@
+"""Tests for ConfirmationService"""
+
+import asyncio
+import pytest
+from types import SimpleNamespace
+from bot.services.confirmation_service import ConfirmationService, TransferConfirmation
+
+
+class FakeSender:
+    """Captures queued messages"""
+
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, chat_id, text, priority=None, **kwargs):
+        self.messages.append((chat_id, text))
+
+    def reply_text(self, message, text, priority=None, **kwargs):
+        self.messages.append((message.chat_id, text))
+
+
+def message(chat_id: int, message_id: int = 1):
+    return SimpleNamespace(chat_id=chat_id, message_id=message_id)
+
+
+def confirmation(sender: str, receiver: str, amount: float, from_balance: float, to_balance: float):
+    return TransferConfirmation(sender, receiver, amount, from_balance, to_balance)
+
+
+class TestConfirmationService:
+    """Test ConfirmationService"""
+
+    @pytest.mark.asyncio
+    async def test_burst_is_coalesced(self):
+        sender = FakeSender()
+        service = ConfirmationService(sender, window=0.05)
+
+        service.add(message(-1), confirmation("@alice", "@bob", 10, 990, 1010))
+        service.add(message(-1), confirmation("@bob", "@carol", 5, 1005, 1005))
+        service.add(message(-1), confirmation("@alice", "@carol", 1, 989, 1006))
+        service.add(message(-2), confirmation("@dave", "@erin", 2, 998, 1002))
+        await asyncio.sleep(0.1)
+
+        assert len(sender.messages) == 2
+        chat_id, summary = sender.messages[0]
+        assert chat_id == -1
+        assert "3 transfers recorded" in summary
+        assert "@alice: $989.00" in summary
+        assert "@carol: $1006.00" in summary
+        assert "Transfer recorded!" in sender.messages[1][1]
+        assert service.confirmations == 4
+        assert service.messages == 2
+
+    @pytest.mark.asyncio
+    async def test_max_batch_flushes_early(self):
+        sender = FakeSender()
+        service = ConfirmationService(sender, window=10, max_batch=2)
+
+        service.add(message(-1), confirmation("@a", "@b", 1, 1, 1))
+        service.add(message(-1), confirmation("@a", "@b", 1, 0, 2))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert len(sender.messages) == 1
+
+    @pytest.mark.asyncio
+    async def test_single_uses_formatter_and_stop_flushes(self):
+        sender = FakeSender()
+        service = ConfirmationService(sender, window=10, formatter=lambda c: f"AI: {c.amount}")
+
+        service.add(message(-1), confirmation("@a", "@b", 7, 1, 1))
+        await service.stop()
+
+        assert sender.messages == [(-1, "AI: 7")]
@@ -0,0 +1,77 @@
+"""Tests for ExportService"""
+
+import csv
+import gzip
+import json
+import pytest
+import tempfile
+from pathlib import Path
+from bot.models.database import Database, init_database
+from bot.services.balance_service import BalanceService
+from bot.services.export_service import ExportService
+
+
+@pytest.fixture
+def temp_db():
+    """Create temporary database for testing"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "test.db"
+        db = Database(str(db_path))
+        init_database(db)
+        yield db
+        db.close()
+
+
+@pytest.fixture
+def seeded_db(temp_db):
+    """Database with two users and a few transfers in two groups"""
+    balance_service = BalanceService(temp_db)
+    alice = balance_service.user_service.get_or_create_user(1, "alice", "Alice")
+    bob = balance_service.user_service.get_or_create_user(2, "bob", "Bob")
+    for i in range(5):
+        balance_service.transfer_by_user_id(alice.id, bob.id, 10.0, message_id=i, group_id=-100)
+    for i in range(2):
+        balance_service.transfer_by_user_id(bob.id, alice.id, 5.0, message_id=i, group_id=-200)
+    return temp_db
+
+
+class TestExportService:
+    """Test ExportService"""
+
+    def test_csv_export_reads_in_chunks(self, seeded_db, tmp_path):
+        service = ExportService(seeded_db, chunk_size=2)
+        output = tmp_path / "ledger.csv"
+        count = service.export(str(output), 'csv')
+        assert count == 7
+
+        with open(output, newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert [int(row['id']) for row in rows] == list(range(1, 8))
+        assert rows[0]['from_username'] == "alice"
+        assert rows[0]['to_username'] == "bob"
+
+    def test_jsonl_gzip_export(self, seeded_db, tmp_path):
+        service = ExportService(seeded_db, chunk_size=3)
+        output = tmp_path / "ledger.jsonl.gz"
+        count = service.export(str(output), 'jsonl', compress=True)
+        assert count == 7
+
+        with gzip.open(output, 'rt') as f:
+            rows = [json.loads(line) for line in f]
+        assert len(rows) == 7
+        assert rows[-1]['amount'] == 5.0
+
+    def test_group_filter(self, seeded_db):
+        service = ExportService(seeded_db, chunk_size=1)
+        rows = list(service.iter_rows(group_id=-200))
+        assert len(rows) == 2
+        assert all(row['group_id'] == -200 for row in rows)
+
+    def test_empty_ledger(self, temp_db):
+        service = ExportService(temp_db)
+        assert list(service.iter_rows()) == []
+
+    def test_unknown_format(self, seeded_db, tmp_path):
+        service = ExportService(seeded_db)
+        with pytest.raises(ValueError):
+            service.export(str(tmp_path / "ledger.xml"), 'xml')
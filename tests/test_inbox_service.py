@@ -0,0 +1,106 @@
+"""Tests for InboxService and InboxConsumers"""
+
+import asyncio
+import pytest
+from bot.models.database import Database, init_database
+from bot.services.inbox_service import InboxConsumers, InboxService
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create test database"""
+    db = Database(str(tmp_path / "test.db"))
+    init_database(db)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def inbox(db):
+    return InboxService(db, max_attempts=2)
+
+
+class TestInboxService:
+    """Test InboxService"""
+
+    def test_append_is_idempotent(self, inbox):
+        assert inbox.append(-1, 1, {"text": "a"})
+        assert not inbox.append(-1, 1, {"text": "a"})
+        assert inbox.counts()["pending"] == 1
+
+    def test_claims_keep_group_order(self, inbox):
+        inbox.append(-1, 1, {})
+        inbox.append(-1, 2, {})
+        inbox.append(-2, 1, {})
+
+        first = inbox.claim()
+        second = inbox.claim()
+        # Group -1 has a message in progress, so its next one waits
+        assert (first.group_id, first.message_id) == (-1, 1)
+        assert (second.group_id, second.message_id) == (-2, 1)
+        assert inbox.claim() is None
+
+        inbox.complete(first.id)
+        assert inbox.claim().message_id == 2
+
+    def test_fail_retries_then_parks(self, inbox):
+        inbox.append(-1, 1, {})
+        assert inbox.fail(inbox.claim(), "boom") == "pending"
+        assert inbox.fail(inbox.claim(), "boom") == "failed"
+        assert inbox.claim() is None
+
+        assert inbox.retry_failed() == 1
+        assert inbox.claim().attempts == 1
+
+    def test_recover_after_crash(self, inbox):
+        inbox.append(-1, 1, {"text": "sent $5 to @bob"})
+        inbox.claim()
+
+        assert inbox.recover() == 1
+        assert inbox.claim().payload == {"text": "sent $5 to @bob"}
+
+    def test_workers_see_only_their_groups(self, db):
+        InboxService(db, worker_id=1, workers=2).append(-1, 1, {})
+        assert InboxService(db, worker_id=0, workers=2).claim() is None
+        assert InboxService(db, worker_id=1, workers=2).claim().group_id == -1
+
+    def test_rows_follow_their_group_when_workers_change(self, db):
+        # Left behind by worker 1 of 2: one in progress, one pending, one failed
+        old = InboxService(db, worker_id=1, workers=2, max_attempts=1)
+        for message_id in (1, 2, 3):
+            old.append(-1 - 2 * message_id, message_id, {})
+        old.claim()
+        old.fail(old.claim(), "boom")
+
+        # A single process owns them all
+        inbox = InboxService(db)
+        assert inbox.counts() == {"pending": 1, "processing": 1, "done": 0, "failed": 1, "deferred": 0}
+        assert inbox.recover() == 1
+        assert inbox.retry_failed() == 1
+        assert sorted(inbox.claim().message_id for _ in range(3)) == [1, 2, 3]
+
+
+class TestInboxConsumers:
+    """Test InboxConsumers"""
+
+    @pytest.mark.asyncio
+    async def test_consumers_process_and_mark_done(self, inbox):
+        processed = []
+
+        async def process(payload):
+            if payload["n"] == 2:
+                raise ValueError("bad message")
+            processed.append(payload["n"])
+
+        consumers = InboxConsumers(inbox, process, consumers=2, poll_interval=0.01)
+        await consumers.start()
+        for n in range(4):
+            inbox.append(-1, n, {"n": n})
+        consumers.notify()
+        await asyncio.sleep(0.2)
+        await consumers.stop()
+
+        assert processed == [0, 1, 3]
+        counts = inbox.counts()
+        assert counts["done"] == 3
+        assert counts["failed"] == 1
@@ -0,0 +1,83 @@
+"""Tests for logging configuration"""
+
+import gzip
+import json
+import logging
+import tempfile
+from pathlib import Path
+import pytest
+from bot.utils.config import BotConfig
+from bot.utils.logger import setup_logging, stop_logging
+
+
+@pytest.fixture
+def log_dir():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield Path(tmpdir)
+        stop_logging()
+        logging.getLogger().setLevel(logging.WARNING)
+
+
+def make_config(log_dir: Path, **kwargs) -> BotConfig:
+    return BotConfig(
+        token="test",
+        database_url=str(log_dir / "bot.db"),
+        log_file=str(log_dir / "bot.log"),
+        **kwargs
+    )
+
+
+class TestSetupLogging:
+    """Test the queue-based logging pipeline"""
+
+    def test_records_reach_file_through_listener(self, log_dir):
+        setup_logging(make_config(log_dir))
+        logging.getLogger("bot.test").info("transfer %s -> %s", "alice", "bob")
+        stop_logging()
+
+        text = (log_dir / "bot.log").read_text()
+        assert "transfer alice -> bob" in text
+
+    def test_json_lines_with_extra_fields(self, log_dir):
+        setup_logging(make_config(log_dir, log_json=True))
+        logger = logging.getLogger("bot.test")
+        logger.warning("slow update", extra={"chat_id": -100})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.error("failed", exc_info=True)
+        stop_logging()
+
+        entries = [json.loads(line) for line in (log_dir / "bot.log").read_text().splitlines()]
+        slow = next(entry for entry in entries if entry["message"] == "slow update")
+        assert slow["level"] == "WARNING"
+        assert slow["logger"] == "bot.test"
+        assert slow["chat_id"] == -100
+        failed = next(entry for entry in entries if entry["message"] == "failed")
+        assert "ValueError: boom" in failed["exception"]
+
+    def test_size_rotation_is_compressed(self, log_dir):
+        setup_logging(make_config(log_dir, log_max_bytes=200, log_backup_count=2))
+        logger = logging.getLogger("bot.test")
+        for i in range(20):
+            logger.info("line %d %s", i, "x" * 40)
+        stop_logging()
+
+        rotated = log_dir / "bot.log.1.gz"
+        assert rotated.exists()
+        assert "line" in gzip.decompress(rotated.read_bytes()).decode()
+        assert not (log_dir / "bot.log.3.gz").exists()
+
+    def test_worker_processes_use_their_own_file(self, log_dir):
+        setup_logging(make_config(log_dir), "worker-1")
+        logging.getLogger("bot.test").info("from worker")
+        stop_logging()
+
+        assert "from worker" in (log_dir / "bot.worker-1.log").read_text()
+
+    def test_setup_twice_keeps_one_queue_handler(self, log_dir):
+        config = make_config(log_dir)
+        setup_logging(config)
+        setup_logging(config)
+        root = logging.getLogger()
+        assert sum(type(h).__name__ == "_QueueHandler" for h in root.handlers) == 1
@@ -0,0 +1,107 @@
+"""Tests for the metrics registry"""
+
+import urllib.request
+import pytest
+from bot.utils.config import BotConfig
+from bot.utils.metrics import MetricsServer, Registry, instrument
+from bot.services.bot_service import BotService
+
+
+class TestRegistry:
+    """Test Registry rendering"""
+
+    def test_counter_gauge_histogram_exposition(self):
+        registry = Registry()
+        updates = registry.counter("updates", "Updates", ["handler"])
+        in_flight = registry.gauge("in_flight", "In flight")
+        seconds = registry.histogram("seconds", "Latency", ["stage"], buckets=(0.1, 1))
+
+        updates.labels(handler="balances").inc()
+        updates.labels(handler="balances").inc()
+        in_flight.inc()
+        stage = seconds.labels(stage="llm")
+        stage.observe(0.05)
+        stage.observe(0.5)
+        stage.observe(5)
+
+        text = registry.render()
+        assert '# TYPE updates counter' in text
+        assert 'updates_total{handler="balances"} 2.0' in text
+        assert 'in_flight 1.0' in text
+        assert 'seconds_bucket{stage="llm",le="0.1"} 1' in text
+        assert 'seconds_bucket{stage="llm",le="1.0"} 2' in text
+        assert 'seconds_bucket{stage="llm",le="+Inf"} 3' in text
+        assert 'seconds_count{stage="llm"} 3' in text
+
+    def test_label_values_are_escaped(self):
+        registry = Registry()
+        registry.counter("c", "C", ["q"]).labels(q='say "hi"\n').inc()
+        assert 'c_total{q="say \\"hi\\"\\n"} 1.0' in registry.render()
+
+    def test_collectors_and_duplicates(self):
+        registry = Registry()
+        registry.counter("c", "C")
+        with pytest.raises(ValueError):
+            registry.counter("c", "C")
+        registry.add_collector(lambda: ["queue_depth 3"])
+        assert "queue_depth 3" in registry.render()
+
+
+class TestInstrument:
+    """Test handler instrumentation"""
+
+    @pytest.mark.asyncio
+    async def test_counts_errors(self):
+        from bot.utils.metrics import HANDLER_ERRORS, IN_FLIGHT, UPDATES
+
+        async def failing(update, context):
+            raise RuntimeError("boom")
+
+        handler = instrument("test_failing", failing)
+        with pytest.raises(RuntimeError):
+            await handler(None, None)
+
+        assert UPDATES.labels(handler="test_failing").value == 1
+        assert HANDLER_ERRORS.labels(handler="test_failing").value == 1
+        assert IN_FLIGHT._default().value == 0
+
+
+class TestMetricsServer:
+    """Test the HTTP endpoint"""
+
+    def test_serves_metrics(self):
+        registry = Registry()
+        registry.counter("served", "Served").inc()
+        server = MetricsServer("127.0.0.1", 0, registry)
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                assert "served_total 1.0" in response.read().decode()
+        finally:
+            server.stop()
+
+
+class TestBotServiceMetrics:
+    """Test the BotService collector"""
+
+    def test_scrape_reads_cached_inbox_counts(self, tmp_path):
+        config = BotConfig(
+            token="test", database_url=str(tmp_path / "bot.db"), enable_ai=False,
+            inbox_consumers=1, profile_dir=str(tmp_path / "profiles")
+        )
+        service = BotService(config)
+        service.inbox.append(-1, 1, {"text": "hi"})
+
+        # Nothing cached yet: the scrape exports no inbox counts rather than querying
+        assert not any("bot_inbox_messages" in line for line in service._collect_metrics())
+
+        assert service._queue_depth() == 1
+
+        def fail():
+            raise AssertionError("scrape must not query the database")
+
+        service.inbox.counts = fail
+        assert 'bot_inbox_messages{status="pending"} 1' in service._collect_metrics()
+        service.db.close()
+        service.export_db.close()
@@ -0,0 +1,189 @@
+"""Tests for overload control of passive transfer detection"""
+
+from datetime import datetime, timezone
+import pytest
+from telegram import Chat, Message, Update, User
+from bot.models.database import Database, init_database
+from bot.services.ai_service import TransferDetection
+from bot.services.balance_service import BalanceService
+from bot.services.inbox_service import InboxService
+from bot.handlers.group_handlers import GroupHandlers
+from bot.utils.overload import Level, OverloadController
+from bot.utils.text import ParsedTransfer, parse_transfer
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create test database"""
+    db = Database(str(tmp_path / "test.db"))
+    init_database(db)
+    yield db
+    db.close()
+
+
+def make_update(update_id: int, chat_id: int, user_id: int, username: str, text: str) -> Update:
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP)
+    user = User(id=user_id, first_name=username, username=username, is_bot=False)
+    message = Message(
+        message_id=update_id, date=datetime.now(timezone.utc),
+        chat=chat, from_user=user, text=text
+    )
+    return Update(update_id=update_id, message=message)
+
+
+class FakeAI:
+    """Detects nothing and counts LLM calls"""
+
+    def __init__(self):
+        self.single = 0
+        self.batches = []
+
+    def detect_transfer(self, message, sender_username=None, sender_first_name=None, group_id=None):
+        self.single += 1
+        return TransferDetection(is_transfer=False, confidence=0.9, reasoning="")
+
+    def detect_transfers(self, messages, group_id=None):
+        self.batches.append(len(messages))
+        return [TransferDetection(is_transfer=False, confidence=0.9, reasoning="") for _ in messages]
+
+    def generate_confirmation_message(self, from_user_display, to_user_display, amount, **kwargs):
+        return f"{from_user_display} -> {to_user_display}: {amount}"
+
+
+class TestOverloadController:
+    """Test level selection"""
+
+    def test_levels_follow_queue_depth(self):
+        depth = [0]
+        controller = OverloadController(lambda: depth[0], queue_threshold=100)
+        assert controller.evaluate(0) == Level.NORMAL
+
+        depth[0] = 150
+        assert controller.evaluate(1) == Level.RULES
+        depth[0] = 450
+        assert controller.evaluate(2) == Level.DEFER
+
+    def test_steps_down_one_level_after_hold(self):
+        depth = [450]
+        controller = OverloadController(lambda: depth[0], queue_threshold=100, hold_seconds=10)
+        controller.evaluate(0)
+
+        depth[0] = 0
+        assert controller.evaluate(1) == Level.DEFER
+        assert controller.evaluate(5) == Level.DEFER
+        assert controller.evaluate(11) == Level.SAMPLE
+        assert controller.evaluate(21) == Level.RULES
+        assert controller.evaluate(31) == Level.NORMAL
+        assert controller.transitions == 4
+
+    def test_llm_latency_raises_level(self):
+        controller = OverloadController(lambda: 0, latency_threshold=2.0)
+        for _ in range(20):
+            controller.observe_latency(5.0)
+        assert controller.evaluate() == Level.SAMPLE
+        assert "bot_overload_level 2" in controller.exposition()
+
+
+class TestParseTransfer:
+    """Test the rule-based parser"""
+
+    def test_clear_announcements(self):
+        assert parse_transfer("sent $50 to @bob") == ParsedTransfer(("bob",), 50.0)
+        assert parse_transfer("I transferred 1,200.50 to @alice!") == ParsedTransfer(("alice",), 1200.5)
+        assert parse_transfer("I paid @bob 20") == ParsedTransfer(("bob",), 20.0)
+        assert parse_transfer("@carol I sent you $75.") == ParsedTransfer(("carol",), 75.0)
+        assert parse_transfer("paid $30 each to @a, @b and @c") == ParsedTransfer(("a", "b", "c"), 30.0)
+
+    def test_everything_else_is_left_to_the_llm(self):
+        assert parse_transfer("should I send $5 to @bob?") is None
+        assert parse_transfer("I will send $5 to @bob") is None
+        assert parse_transfer("sent $50 to @bob for lunch") is None
+        assert parse_transfer("sent $0 to @bob") is None
+        assert parse_transfer("sent $30 to @a @b") is None
+
+
+class TestSheddingInHandlers:
+    """Test GroupHandlers under overload"""
+
+    @pytest.mark.asyncio
+    async def test_defer_level(self, db):
+        balance_service = BalanceService(db)
+        ai = FakeAI()
+        controller = OverloadController(lambda: 0)
+        controller._level = Level.DEFER
+        controller._evaluated_at = float("inf")
+        inbox = InboxService(db)
+        handlers = GroupHandlers(
+            ai, balance_service, balance_service.user_service, overload=controller, deferred=inbox
+        )
+        replies = []
+
+        async def reply(update, text, priority=None, **kwargs):
+            replies.append(text)
+
+        handlers._reply = reply
+        balance_service.user_service.get_or_create_user(telegram_user_id=2, username="bob")
+
+        await handlers.process_group_message(make_update(1, -1, 1, "alice", "sent $10 to @bob"))
+        await handlers.process_group_message(make_update(2, -1, 1, "alice", "lunch was 12 bucks"))
+        await handlers.process_group_message(make_update(3, -1, 1, "alice", "see you later"))
+
+        # The clear announcement is recorded by rules, nothing reaches the LLM
+        assert ai.single == 0
+        assert replies == ["@alice -> @bob: 10.0"]
+        assert controller.shed == {"rules": 1, "skipped": 1, "deferred": 1}
+        assert [item.message_id for item in inbox.deferred(10)] == [2]
+
+        # Kept across a restart, then detected once load is back to normal
+        restarted = GroupHandlers(
+            ai, balance_service, balance_service.user_service, overload=controller, deferred=InboxService(db)
+        )
+        assert await restarted._process_deferred(10) == 1
+        assert ai.batches == [1]
+        assert inbox.deferred(10) == []
+        assert inbox.counts()["done"] == 1
+
+    @pytest.mark.asyncio
+    async def test_deferred_inbox_message_is_not_completed(self, db):
+        balance_service = BalanceService(db)
+        controller = OverloadController(lambda: 0)
+        controller._level = Level.DEFER
+        controller._evaluated_at = float("inf")
+        inbox = InboxService(db)
+        handlers = GroupHandlers(
+            FakeAI(), balance_service, balance_service.user_service,
+            inbox=inbox, overload=controller, deferred=inbox
+        )
+
+        update = make_update(1, -1, 1, "alice", "lunch was 12 bucks")
+        inbox.append(-1, 1, update.to_dict())
+        item = inbox.claim()
+        await handlers.process_group_message(update)
+        inbox.complete(item.id)
+
+        assert inbox.counts()["deferred"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rule_parsed_split_gets_one_confirmation(self, db):
+        balance_service = BalanceService(db)
+        controller = OverloadController(lambda: 0)
+        controller._level = Level.RULES
+        controller._evaluated_at = float("inf")
+        handlers = GroupHandlers(
+            FakeAI(), balance_service, balance_service.user_service, overload=controller, deferred=InboxService(db)
+        )
+        replies = []
+
+        async def reply(update, text, priority=None, **kwargs):
+            replies.append(text)
+
+        handlers._reply = reply
+        for user_id, name in ((2, "bob"), (3, "carol")):
+            balance_service.user_service.get_or_create_user(telegram_user_id=user_id, username=name)
+
+        await handlers.process_group_message(make_update(1, -1, 1, "alice", "paid $30 each to @bob and @carol"))
+
+        assert len(replies) == 1
+        assert replies[0].startswith("✅ 2 transfers recorded!")
+        assert "• @alice: $940.00" in replies[0]
+        assert balance_service.transaction_service.get_count() == 2
@@ -0,0 +1,85 @@
+"""Tests for the sampling profiler"""
+
+import asyncio
+import tempfile
+import threading
+import time
+import pytest
+from bot.utils.profiler import Profiler, SamplingProfiler
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name="busy", daemon=True)
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+class TestSamplingProfiler:
+    """Test SamplingProfiler"""
+
+    def test_samples_busy_thread(self, busy_thread):
+        result = SamplingProfiler(interval=0.001).run(0.2)
+
+        assert result.samples > 10
+        busy = [stack for stack in result.stacks if stack.startswith("busy;")]
+        assert busy
+        assert all("busy_loop (test_profiler.py:" in stack for stack in busy)
+
+        for line in result.collapsed().splitlines():
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0
+
+        names = [name for name, _, _ in result.top(20)]
+        assert any(name.startswith("busy_loop") for name in names)
+        assert "self%" in result.format_summary()
+
+    def test_idle_threads_are_skipped(self):
+        stop = threading.Event()
+        waiter = threading.Thread(target=stop.wait, name="waiter", daemon=True)
+        waiter.start()
+        try:
+            result = SamplingProfiler(interval=0.001).run(0.05)
+        finally:
+            stop.set()
+            waiter.join()
+        assert not any(stack.startswith("waiter;") for stack in result.stacks)
+
+
+class TestProfiler:
+    """Test Profiler sessions"""
+
+    @pytest.mark.asyncio
+    async def test_session_writes_collapsed_file(self, busy_thread):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            profiler = Profiler(tmpdir, interval=0.001)
+            result, path = await profiler.profile(0.1)
+
+            assert path.parent.samefile(tmpdir)
+            assert path.read_text() == result.collapsed()
+            assert not profiler.running
+
+    @pytest.mark.asyncio
+    async def test_one_session_at_a_time_and_stop(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            profiler = Profiler(tmpdir, interval=0.001)
+            session = asyncio.ensure_future(profiler.profile(30))
+            await asyncio.sleep(0.05)
+
+            assert profiler.running
+            with pytest.raises(RuntimeError):
+                await profiler.profile(1)
+
+            started = time.monotonic()
+            profiler.stop()
+            result, _ = await session
+            assert time.monotonic() - started < 5
+            assert result.duration < 30
@@ -0,0 +1,70 @@
+"""Tests for QueryStats instrumentation"""
+
+import logging
+import pytest
+import tempfile
+from pathlib import Path
+from bot.models.database import Database, init_database
+from bot.models.query_stats import QueryStats, normalize_sql
+from bot.services.user_service import UserService
+
+
+@pytest.fixture
+def stats():
+    """Create query stats that treat every statement as slow"""
+    return QueryStats(slow_query_ms=0.0)
+
+
+@pytest.fixture
+def instrumented_db(stats):
+    """Create temporary instrumented database"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = Database(str(Path(tmpdir) / "test.db"), stats)
+        init_database(db)
+        stats.reset()
+        yield db
+        db.close()
+
+
+class TestQueryStats:
+    """Test QueryStats"""
+    
+    def test_normalize_sql(self):
+        assert normalize_sql("SELECT *\n  FROM users WHERE id = 5 AND name = 'bob'") == \
+            "SELECT * FROM users WHERE id = ? AND name = ?"
+    
+    def test_records_calls_and_rows(self, instrumented_db, stats):
+        service = UserService(instrumented_db)
+        service.get_or_create_user(1, "alice")
+        service.get_or_create_user(2, "bob")
+        service.get_all()
+        
+        by_sql = {s.sql: s for s in stats.snapshot()}
+        lookup = by_sql["SELECT * FROM users WHERE telegram_user_id = ?"]
+        assert lookup.calls == 2
+        assert by_sql["SELECT * FROM users ORDER BY created_at"].rows == 2
+        assert sum(lookup.buckets) == lookup.calls
+    
+    def test_executemany_is_recorded(self, instrumented_db, stats):
+        service = UserService(instrumented_db)
+        alice = service.get_or_create_user(1, "alice")
+        bob = service.get_or_create_user(2, "bob")
+        with instrumented_db.transaction():
+            service.update_balances([(alice.id, 900.0), (bob.id, 1100.0)])
+        
+        by_sql = {s.sql: s for s in stats.snapshot()}
+        update = by_sql["UPDATE users SET balance = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?"]
+        assert (update.calls, update.rows) == (1, 2)
+        assert update.plan is not None
+    
+    def test_slow_query_logs_plan(self, instrumented_db, stats, caplog):
+        service = UserService(instrumented_db)
+        with caplog.at_level(logging.WARNING, logger="bot.models.query_stats"):
+            service.get_by_username("ali")
+        
+        assert "Slow query" in caplog.text
+        assert "SCAN users" in caplog.text
+    
+    def test_report(self, instrumented_db, stats):
+        UserService(instrumented_db).get_user_count()
+        assert "SELECT COUNT(*)" in stats.format_report()
@@ -0,0 +1,93 @@
+"""Tests for RenderCache and paginate"""
+
+from types import SimpleNamespace
+import pytest
+from bot.handlers.group_handlers import GroupHandlers
+from bot.models.database import Database, init_database
+from bot.services.balance_service import BalanceService
+from bot.utils.render_cache import RenderCache
+from bot.utils.text import paginate
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create test database"""
+    db = Database(str(tmp_path / "test.db"))
+    init_database(db)
+    yield db
+    db.close()
+
+
+class TestPaginate:
+    """Test paginate"""
+
+    def test_short_text_is_one_page(self):
+        assert paginate(["a", "b"], header="Title\n\n", footer="end") == ["Title\n\na\nb\nend"]
+
+    def test_long_text_is_split_with_markers(self):
+        lines = [f"{i}. " + "x" * 50 for i in range(300)]
+        pages = paginate(lines, header="Title\n\n", footer="Total")
+
+        assert len(pages) > 1
+        assert all(len(page) <= 4096 for page in pages)
+        assert pages[0].startswith(f"Title (1/{len(pages)})\n\n")
+        assert pages[-1].endswith("Total")
+        # Every line appears exactly once, in order
+        body = [line for page in pages for line in page.split("\n")[2:] if line.startswith(tuple("0123456789"))]
+        assert body == lines
+
+
+class TestRenderCache:
+    """Test RenderCache"""
+
+    def test_invalidated_by_ledger_change(self, db):
+        service = BalanceService(db)
+        alice = service.user_service.get_or_create_user(1, "alice")
+        bob = service.user_service.get_or_create_user(2, "bob")
+        cache = RenderCache()
+        renders = []
+
+        def render():
+            renders.append(db.ledger_version)
+            return [service.get_all_balances()]
+
+        first = cache.get_or_render(("balances", db.ledger_version), render)
+        assert cache.get_or_render(("balances", db.ledger_version), render) is first
+        assert cache.hits == 1
+
+        service.transfer_by_user_id(alice.id, bob.id, 10.0)
+        second = cache.get_or_render(("balances", db.ledger_version), render)
+        assert second != first
+        assert len(renders) == 2
+
+    def test_lru_eviction_and_disabled(self):
+        cache = RenderCache(maxsize=1)
+        cache.get_or_render("a", lambda: ["a"])
+        cache.get_or_render("b", lambda: ["b"])
+        assert len(cache) == 1
+
+        disabled = RenderCache(maxsize=0)
+        disabled.get_or_render("a", lambda: ["a"])
+        assert len(disabled) == 0
+
+    @pytest.mark.parametrize("shared", [False, True])
+    def test_data_version_checked_only_for_shared_databases(self, db, tmp_path, shared):
+        service = BalanceService(db)
+        handlers = GroupHandlers(None, service, service.user_service, shared_database=shared)
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=-1))
+        checks = []
+        data_version = db.data_version
+        db.data_version = lambda: checks.append(1) or data_version()
+
+        def render():
+            return [str(service.user_service.get_user_count())]
+
+        assert handlers._cached_pages("users", update, db, render) == ["0"]
+        # Another worker process adds a user through its own connection
+        other = Database(str(tmp_path / "test.db"))
+        BalanceService(other).user_service.get_or_create_user(1, "alice")
+        other.close()
+
+        pages = handlers._cached_pages("users", update, db, render)
+        assert pages == (["1"] if shared else ["0"])
+        assert len(checks) == (2 if shared else 0)
@@ -0,0 +1,104 @@
+"""Tests for the daily transfer rollups"""
+
+import asyncio
+import pytest
+from bot.models.database import Database, init_database
+from bot.services.balance_service import BalanceService
+from bot.services.rollup_service import RollupService, parse_period
+
+GROUP = -100
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create test database"""
+    db = Database(str(tmp_path / "test.db"))
+    init_database(db)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def users(db):
+    user_service = BalanceService(db).user_service
+    return [user_service.get_or_create_user(i, name) for i, name in enumerate(("alice", "bob", "carol"), 1)]
+
+
+def rollups_from_raw(db):
+    """What the rollups should hold, computed from the raw ledger"""
+    groups = db.fetchall(
+        """
+        SELECT COALESCE(group_id, 0), date(created_at), COUNT(*), SUM(amount)
+        FROM transactions GROUP BY 1, 2 ORDER BY 1, 2
+        """
+    )
+    return [tuple(row) for row in groups]
+
+
+def group_rollups(db):
+    return [tuple(row) for row in db.fetchall("SELECT * FROM daily_group_stats ORDER BY group_id, day")]
+
+
+class TestRollups:
+    """Test incremental updates and backfill"""
+
+    def test_transfers_are_counted_as_they_commit(self, db, users):
+        alice, bob, carol = users
+        balance_service = BalanceService(db)
+        balance_service.transfer_by_user_id(alice.id, bob.id, 10, message_id=1, group_id=GROUP)
+        balance_service.transfer_many(alice.id, [(bob.id, 5), (carol.id, 7)], message_id=2, group_id=GROUP)
+        # Rejected duplicate and failed transfers leave no trace
+        balance_service.transfer_by_user_id(alice.id, bob.id, 10, message_id=1, group_id=GROUP)
+        balance_service.transfer_by_user_id(carol.id, bob.id, 5000, message_id=3, group_id=GROUP)
+
+        assert group_rollups(db) == rollups_from_raw(db)
+        user = db.fetchone("SELECT * FROM daily_user_stats WHERE user_id = ?", (alice.id,))
+        assert (user['sent_count'], user['sent_volume'], user['received_count']) == (3, 22, 0)
+        assert RollupService(db).backfilled
+
+    def test_backfill_adds_older_history_once(self, db, users):
+        alice, bob, carol = users
+        balance_service = BalanceService(db)
+
+        # A ledger from before the rollups existed
+        db.execute("DROP TRIGGER trg_transactions_rollup")
+        db.execute("DELETE FROM bot_state")
+        for i in range(7):
+            balance_service.transfer_by_user_id(alice.id, (bob, carol)[i % 2].id, i + 1, message_id=i, group_id=GROUP)
+        balance_service.transfer_by_user_id(bob.id, carol.id, 3)
+        db.execute("PRAGMA user_version = 0")
+        init_database(db)
+
+        # Counted by the trigger while the backfill hasn't reached it yet
+        balance_service.transfer_by_user_id(carol.id, alice.id, 100, message_id=50, group_id=GROUP)
+
+        rollups = RollupService(db, chunk_size=3)
+        assert rollups.backfill_progress() == (0, 8)
+        assert rollups.backfill_chunk()
+        assert rollups.backfill_progress() == (3, 8)
+        assert "⏳ Older history still being added (37%)." in rollups.format_stats(GROUP)
+
+        asyncio.run(rollups.backfill())
+        assert not rollups.backfill_chunk()
+        assert group_rollups(db) == rollups_from_raw(db)
+
+    def test_stats_read_from_rollups(self, db, users):
+        alice, bob, carol = users
+        balance_service = BalanceService(db)
+        balance_service.transfer_by_user_id(alice.id, bob.id, 10, message_id=1, group_id=GROUP)
+        balance_service.transfer_by_user_id(bob.id, carol.id, 40, message_id=2, group_id=GROUP)
+        balance_service.transfer_by_user_id(alice.id, carol.id, 5, message_id=3, group_id=GROUP)
+        balance_service.transfer_by_user_id(carol.id, alice.id, 99, message_id=4, group_id=-200)
+
+        lines = RollupService(db).format_stats(GROUP, "month")
+        assert lines[0].startswith("📈 Last 30 days")
+        assert lines[1] == "💸 3 transfers, $55.00 volume"
+        assert lines[4:6] == ["1. @bob: $40.00 in 1 transfers", "2. @alice: $15.00 in 2 transfers"]
+        assert lines[-1].endswith(": 3 transfers, $55.00")
+
+        assert RollupService(db).format_stats(-300) == ["📈 No transfers in the last 7 days."]
+
+    def test_parse_period(self):
+        assert parse_period([]) == "week"
+        assert parse_period(["Month"]) == "month"
+        assert parse_period(["year"]) is None
@@ -0,0 +1,187 @@
+"""Tests for scheduled and recurring transfers"""
+
+import asyncio
+from datetime import datetime, timezone
+import pytest
+from bot.models.database import Database, init_database
+from bot.services.balance_service import BalanceService
+from bot.services.schedule_service import DAILY, MONTHLY, ONCE, WEEKLY, ScheduleService, occurrence
+
+GROUP = -100
+
+
+def ts(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create test database"""
+    db = Database(str(tmp_path / "test.db"))
+    init_database(db)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def balance_service(db):
+    return BalanceService(db)
+
+
+@pytest.fixture
+def users(balance_service):
+    return [
+        balance_service.user_service.get_or_create_user(telegram_user_id=i, username=name)
+        for i, name in enumerate(("alice", "bob", "carol"), 1)
+    ]
+
+
+def make_service(db, balance_service, **kwargs):
+    return ScheduleService(db, lambda group_id: balance_service, **kwargs)
+
+
+class TestOccurrence:
+    """Test run time arithmetic"""
+
+    def test_fixed_periods(self):
+        start = ts(2024, 1, 1, 9)
+        assert occurrence(start, DAILY, 3) == ts(2024, 1, 4, 9)
+        assert occurrence(start, WEEKLY, 2) == ts(2024, 1, 15, 9)
+        assert occurrence(start, ONCE, 5) == start
+
+    def test_monthly_keeps_day_of_month(self):
+        start = ts(2024, 1, 31, 9)
+        assert occurrence(start, MONTHLY, 1) == ts(2024, 2, 29, 9)
+        assert occurrence(start, MONTHLY, 2) == ts(2024, 3, 31, 9)
+        assert occurrence(start, MONTHLY, 12) == ts(2025, 1, 31, 9)
+
+
+class TestScheduleService:
+    """Test running schedules"""
+
+    def test_runs_only_due_schedules(self, db, balance_service, users):
+        alice, bob, carol = users
+        service = make_service(db, balance_service)
+        now = ts(2024, 1, 1, 12)
+        service.create(GROUP, alice.id, bob.id, 10, DAILY, now - 60)
+        service.create(GROUP, alice.id, carol.id, 5, ONCE, now + 600)
+
+        results = service.run_due(now)
+        assert [(s.to_user_id, r.success) for s, r in results] == [(bob.id, True)]
+        assert balance_service.user_service.get_by_id(bob.id).balance == 1010
+        assert service.run_due(now) == []
+
+        # The daily one moved to tomorrow; the one-off ran and finished
+        results = service.run_due(now + 601)
+        assert [s.to_user_id for s, _ in results] == [carol.id]
+        assert [s.next_run_at for s in service.list_for_group(GROUP)] == [now - 60 + 86400]
+
+    def test_downtime_runs_once_and_skips_forward(self, db, balance_service, users):
+        alice, bob, _ = users
+        service = make_service(db, balance_service)
+        start = ts(2024, 1, 1, 9)
+        schedule = service.create(GROUP, alice.id, bob.id, 10, DAILY, start)
+
+        now = start + 5 * 86400 + 60
+        assert len(service.run_due(now)) == 1
+        assert service.get(schedule.id).next_run_at == start + 6 * 86400
+        assert balance_service.transaction_service.get_count() == 1
+
+    def test_failures_are_recorded_and_dont_block_others(self, db, balance_service, users):
+        alice, bob, carol = users
+        service = make_service(db, balance_service)
+        now = ts(2024, 1, 1)
+        broke = service.create(GROUP, bob.id, carol.id, 5000, WEEKLY, now)
+        service.create(GROUP, alice.id, carol.id, 10, WEEKLY, now)
+
+        results = service.run_due(now)
+        assert [r.success for _, r in results] == [False, True]
+        assert "Insufficient funds" in service.get(broke.id).last_error
+        assert service.get(broke.id).active
+        assert service.failures == 1 and service.runs == 1
+
+        text = ScheduleService.format_results(results)[GROUP]
+        assert f"#{broke.id}: ❌ Insufficient funds" in text
+        assert "$10.00 from @alice to @carol" in text
+
+    def test_restart_does_not_pay_twice(self, db, balance_service, users):
+        alice, bob, carol = users
+        now = ts(2024, 1, 1)
+        schedule = make_service(db, balance_service).create(GROUP, alice.id, bob.id, 10, DAILY, now)
+        make_service(db, balance_service).create(GROUP, alice.id, carol.id, 10, DAILY, now)
+
+        # The transfer was made but the process died before the schedule advanced
+        balance_service.transfer_by_user_id(alice.id, bob.id, 10, schedule.run_message_id, GROUP)
+
+        restarted = make_service(db, balance_service)
+        results = restarted.run_due(now)
+        assert [(r.duplicate, r.success) for _, r in results] == [(True, False), (False, True)]
+        assert restarted.get(schedule.id).next_run_at == now + 86400
+        # The duplicate's savepoint rollback leaves the other run of the batch in place
+        assert balance_service.transaction_service.get_count() == 2
+        assert balance_service.user_service.get_by_id(alice.id).balance == 980
+        assert f"#{schedule.id}" not in ScheduleService.format_results(results)[GROUP]
+
+    def test_cancelled_schedules_are_skipped(self, db, balance_service, users):
+        alice, bob, _ = users
+        service = make_service(db, balance_service)
+        now = ts(2024, 1, 1)
+        service.run_due(now)
+        schedule = service.create(GROUP, alice.id, bob.id, 10, DAILY, now)
+        assert service.pending == 1
+
+        assert service.cancel(schedule.id)
+        assert not service.cancel(schedule.id)
+        assert service.run_due(now) == []
+        assert service.list_for_group(GROUP) == []
+
+    def test_loads_a_page_at_a_time_in_batches(self, db, balance_service, users):
+        alice, bob, _ = users
+        service = make_service(db, balance_service, batch_size=4, page_size=5, horizon=60)
+        now = ts(2024, 1, 1)
+        for i in range(12):
+            service.create(GROUP, alice.id, bob.id, 1, ONCE, now - i)
+        service.create(GROUP, alice.id, bob.id, 1, ONCE, now + 3600)
+
+        batches = []
+        while True:
+            results = service.run_due(now)
+            if not results:
+                break
+            batches.append(len(results))
+            # Never more than a page plus a batch's leftovers in memory
+            assert service.pending < 5 + 4
+        assert batches == [4, 4, 4]
+        assert balance_service.transaction_service.get_count() == 12
+        assert len(service.list_for_group(GROUP)) == 1
+
+    def test_schedules_follow_their_group_when_workers_change(self, db, balance_service, users):
+        alice, bob, _ = users
+        now = ts(2024, 1, 1)
+        # Group -101 belongs to worker 1 of 2
+        schedule = make_service(db, balance_service, worker_id=1, workers=2).create(
+            -101, alice.id, bob.id, 10, DAILY, now
+        )
+        assert make_service(db, balance_service, worker_id=0, workers=2).run_due(now) == []
+
+        # Back to a single process, which runs every group
+        results = make_service(db, balance_service).run_due(now)
+        assert [s.id for s, r in results if r.success] == [schedule.id]
+
+    @pytest.mark.asyncio
+    async def test_run_wakes_up_for_new_schedules(self, db, balance_service, users):
+        alice, bob, _ = users
+        service = make_service(db, balance_service)
+        announced = []
+
+        async def notify(results):
+            announced.extend(ScheduleService.format_results(results).values())
+
+        await service.start(notify)
+        await asyncio.sleep(0.01)
+        service.create(GROUP, alice.id, bob.id, 10, ONCE, ts(2024, 1, 1))
+        await asyncio.sleep(0.05)
+        await service.stop()
+
+        assert len(announced) == 1
+        assert 'bot_schedule_runs_total{result="ok"} 1' in service.exposition()
@@ -0,0 +1,145 @@
+"""Tests for SenderService"""
+
+import asyncio
+import time
+import pytest
+from telegram.error import RetryAfter
+from bot.services.sender_service import Priority, SenderService, TokenBucket
+
+
+class FakeBot:
+    """Records sent messages; can raise RetryAfter for the first N sends, or `error`"""
+
+    def __init__(self, flood_waits: int = 0, error: Exception = None):
+        self.sent = []
+        self.flood_waits = flood_waits
+        self.error = error
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.error:
+            raise self.error
+        if self.flood_waits:
+            self.flood_waits -= 1
+            raise RetryAfter(0)
+        self.sent.append((chat_id, text))
+        return text
+
+
+async def drain(sender, bot, *futures):
+    """Start the sender and wait for the given futures"""
+    await sender.start(bot)
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    await sender.stop()
+    return results
+
+
+class TestTokenBucket:
+    """Test TokenBucket"""
+
+    def test_delay_after_capacity_used(self):
+        bucket = TokenBucket(rate=2.0, capacity=1)
+        now = bucket.updated
+        assert bucket.delay(now) == 0
+        bucket.consume(now)
+        assert bucket.delay(now) == pytest.approx(0.5)
+
+
+class TestSenderService:
+    """Test SenderService"""
+
+    @pytest.mark.asyncio
+    async def test_priority_order(self):
+        sender = SenderService()
+        bot = FakeBot()
+        info = sender.send_message(-1, "info", Priority.INFO)
+        reply = sender.send_message(-2, "reply", Priority.REPLY)
+        confirmation = sender.send_message(-3, "confirmation", Priority.CONFIRMATION)
+
+        await drain(sender, bot, info, reply, confirmation)
+        assert [text for _, text in bot.sent] == ["confirmation", "reply", "info"]
+
+    @pytest.mark.asyncio
+    async def test_per_chat_rate_limit(self):
+        sender = SenderService(group_rate_per_minute=600)  # 10/s, burst 600
+        sender.group_capacity = 1
+        bot = FakeBot()
+        futures = [sender.send_message(-1, str(i)) for i in range(3)]
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await drain(sender, bot, *futures)
+        # One token up front, then 0.1s per message
+        assert loop.time() - started >= 0.18
+        assert [text for _, text in bot.sent] == ["0", "1", "2"]
+
+    @pytest.mark.asyncio
+    async def test_retry_after_requeues(self):
+        sender = SenderService()
+        bot = FakeBot(flood_waits=2)
+        future = sender.send_message(-1, "hello", Priority.CONFIRMATION)
+
+        results = await drain(sender, bot, future)
+        assert results == ["hello"]
+        assert sender.retried == 2
+        assert sender.sent == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_info_dropped(self):
+        sender = SenderService(info_ttl=0)
+        bot = FakeBot()
+        info = sender.send_message(-1, "info", Priority.INFO)
+        await asyncio.sleep(0.01)
+        confirmation = sender.send_message(-1, "done", Priority.CONFIRMATION)
+
+        results = await drain(sender, bot, info, confirmation)
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert bot.sent == [(-1, "done")]
+        assert sender.dropped == 1
+
+    @pytest.mark.asyncio
+    async def test_unexpected_errors_fail_the_future(self):
+        sender = SenderService()
+        future = sender.send_message(-1, "hello")
+
+        results = await drain(sender, FakeBot(error=OSError("connection reset")), future)
+        assert isinstance(results[0], OSError)
+        assert sender.failed == 1
+
+    @pytest.mark.asyncio
+    async def test_floods_in_two_chats_pause_everything(self):
+        sender = SenderService()
+        futures = [sender.send_message(-1, "a"), sender.send_message(-2, "b")]
+
+        await sender.start(FakeBot(error=RetryAfter(30)))
+        while sender.retried < 2:
+            await asyncio.sleep(0.01)
+        # The second chat's flood wait overlaps the first's
+        assert sender.global_bucket.delay(time.monotonic()) > 29
+        await sender.stop(timeout=0)
+        assert all(future.cancelled() for future in futures)
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_chat_does_not_hold_back_others(self):
+        sender = SenderService(group_rate_per_minute=60)
+        sender.group_capacity = 1
+        bot = FakeBot()
+        # -1 has a long queue but only one token; -2's message goes right after
+        futures = [sender.send_message(-1, f"a{i}", Priority.CONFIRMATION) for i in range(50)]
+        other = sender.send_message(-2, "b", Priority.INFO)
+
+        await sender.start(bot)
+        await asyncio.wait_for(other, timeout=0.5)
+        assert [text for _, text in bot.sent] == ["a0", "b"]
+        assert sender.queue_depth == 49
+        await sender.stop(timeout=0)
+        assert sum(future.cancelled() for future in futures) == 49
+
+    @pytest.mark.asyncio
+    async def test_idle_buckets_are_pruned(self):
+        sender = SenderService()
+        futures = [sender.send_message(-i, "hi") for i in range(1, 6)]
+        await drain(sender, FakeBot(), *futures)
+        assert len(sender._buckets) == 5
+
+        sender._prune_buckets(time.monotonic() + 3600)
+        assert sender._buckets == {}
@@ -0,0 +1,84 @@
+"""Tests for ShardRouter"""
+
+import sqlite3
+import pytest
+from bot.models.shard_router import ShardRouter
+from bot.services.balance_service import BalanceService
+
+
+@pytest.fixture
+def router(tmp_path):
+    """Create shard router with a small LRU"""
+    router = ShardRouter(str(tmp_path / "shards"), max_open=2)
+    yield router
+    router.close()
+
+
+class TestShardRouter:
+    """Test ShardRouter"""
+
+    def test_groups_are_isolated(self, router):
+        service_a = BalanceService(router.get(-1))
+        service_b = BalanceService(router.get(-2))
+        service_a.user_service.get_or_create_user(1, "alice")
+
+        assert service_a.user_service.get_user_count() == 1
+        assert service_b.user_service.get_user_count() == 0
+
+    def test_lru_evicts_and_reopens(self, router):
+        router.get(-1).execute("INSERT INTO users (telegram_user_id) VALUES (1)")
+        router.get(-2)
+        router.get(-3)
+
+        assert router.open_count == 2
+        # Evicted shard is reopened from disk with its data intact
+        row = router.get(-1).fetchone("SELECT COUNT(*) as count FROM users")
+        assert row['count'] == 1
+        assert router.open_count == 2
+
+    def test_cross_shard_queries(self, router):
+        for group_id in (-1, -2, -3):
+            router.get(group_id).execute(
+                "INSERT INTO users (telegram_user_id) VALUES (?)", (abs(group_id),)
+            )
+
+        assert router.group_ids() == [-3, -2, -1]
+        hot = router.get(-1)
+        results = router.fetchall_all("SELECT telegram_user_id FROM users")
+        assert sorted(row['telegram_user_id'] for _, row in results) == [1, 2, 3]
+        assert router.fetchone_all("SELECT COUNT(*) as count FROM users")[0][1]['count'] == 1
+
+        # Read through temporary handles: the LRU is left as it was
+        assert router.open_count == 2
+        assert hot.fetchone("SELECT 1")[0] == 1
+
+    def test_read_only_never_creates_a_shard(self, router):
+        assert not router.exists(-1)
+        with pytest.raises(sqlite3.OperationalError):
+            with router.read_only(-1) as db:
+                db.fetchone("SELECT 1")
+        assert not router.exists(-1)
+
+    def test_pinned_shards_are_not_evicted(self, router):
+        with router.pinned(-1) as first, router.pinned(-2) as second:
+            shard = router.get(-3)
+
+            # Over the limit while pinned; the shard just opened is usable too
+            assert router.open_count == 3
+            for db in (first, second, shard):
+                assert db.fetchone("SELECT COUNT(*) FROM users")[0] == 0
+
+            router.get(-4)
+            assert router.open_count == 3
+            assert first.fetchone("SELECT 1")[0] == 1
+
+        assert router.open_count == 2
+
+    def test_evicted_handle_does_not_reconnect(self, router):
+        evicted = router.get(-1)
+        router.get(-2)
+        router.get(-3)
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            evicted.fetchone("SELECT 1")
+        assert router.open_count == 2
@@ -0,0 +1,132 @@
+"""Tests for update tracing"""
+
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+import pytest
+from bot.models.database import Database, init_database
+from bot.utils import metrics, tracing
+
+
+class ListExporter:
+    """Collects exported traces"""
+
+    def __init__(self):
+        self.traces = []
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, spans):
+        self.traces.append(spans)
+        self.exported += 1
+
+    def shutdown(self):
+        pass
+
+
+@pytest.fixture
+def exporter():
+    exporter = ListExporter()
+    yield exporter
+    tracing.configure(None)
+
+
+def install(exporter, sample_rate=1.0, slow_seconds=0.0):
+    tracer = tracing.Tracer(exporter, sample_rate, slow_seconds)
+    tracing.configure(tracer)
+    return tracer
+
+
+class TestTracer:
+    """Test Tracer sampling and span trees"""
+
+    def test_stage_and_db_spans_nest_under_root(self, exporter):
+        install(exporter)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = Database(str(Path(tmpdir) / "test.db"))
+            init_database(db)
+            with tracing.trace("group_message", chat_id=-1):
+                with metrics.stage("user_upsert").time():
+                    db.fetchone("SELECT COUNT(*) FROM users")
+            db.close()
+
+        assert len(exporter.traces) == 1
+        root, stage, statement = exporter.traces[0]
+        assert root.name == "group_message" and root.parent_id is None
+        assert stage.name == "user_upsert" and stage.parent_id == root.span_id
+        assert statement.name == "SELECT" and statement.parent_id == stage.span_id
+        assert statement.attributes["db.statement"] == "SELECT COUNT(*) FROM users"
+        assert len({span.trace.trace_id for span in exporter.traces[0]}) == 1
+
+    def test_unsampled_fast_trace_is_not_exported(self, exporter):
+        tracer = install(exporter, sample_rate=0.0, slow_seconds=10.0)
+        with tracing.trace("fast"):
+            with tracing.span("child"):
+                pass
+        assert exporter.traces == []
+        assert tracer.traces == 1
+
+    def test_slow_trace_is_exported_in_full(self, exporter):
+        tracer = install(exporter, sample_rate=0.0, slow_seconds=0.01)
+        with tracing.trace("slow"):
+            with tracing.span("child"):
+                pass
+            with tracing.span("wait"):
+                time.sleep(0.02)
+        assert [span.name for span in exporter.traces[0]] == ["slow", "child", "wait"]
+        assert exporter.traces[0][0].attributes["trace.slow"] is True
+        assert tracer.slow == 1
+
+    def test_no_spans_outside_trace(self, exporter):
+        install(exporter)
+        with tracing.span("orphan") as span:
+            assert span is None
+        assert tracing.start_span("orphan") is None
+        assert exporter.traces == []
+
+    def test_errors_are_recorded(self, exporter):
+        install(exporter)
+        with pytest.raises(ValueError):
+            with tracing.trace("root"):
+                raise ValueError("boom")
+        assert exporter.traces[0][0].error == "ValueError: boom"
+
+    @pytest.mark.asyncio
+    async def test_trace_waits_for_send_span(self, exporter):
+        install(exporter)
+        future = asyncio.get_running_loop().create_future()
+        with tracing.trace("command"):
+            span = tracing.start_span("send", tracing.KIND_CLIENT)
+            future.add_done_callback(span.end_with_future)
+
+        # The handler is done but its reply is still queued
+        assert exporter.traces == []
+        future.set_result(None)
+        await asyncio.sleep(0)
+        assert [span.name for span in exporter.traces[0]] == ["command", "send"]
+
+
+class TestFileExporter:
+    """Test OTLP/JSON output"""
+
+    def test_writes_otlp_json_lines(self, exporter):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "traces" / "bot.jsonl"
+            file_exporter = tracing.FileExporter(str(path))
+            install(file_exporter)
+            with tracing.trace("root", update_id=7):
+                with tracing.span("child", sampled=True):
+                    pass
+            file_exporter.shutdown()
+
+            lines = path.read_text().splitlines()
+        assert len(lines) == 1
+        spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root, child = spans
+        assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+        assert child["parentSpanId"] == root["spanId"]
+        assert {"key": "update_id", "value": {"intValue": "7"}} in root["attributes"]
+        assert {"key": "sampled", "value": {"boolValue": True}} in child["attributes"]
+        assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
@@ -0,0 +1,96 @@
+"""Tests for ChatOrderedUpdateProcessor"""
+
+import asyncio
+import pytest
+from telegram import Chat, Message, Update
+from bot.utils.update_processor import ChatOrderedUpdateProcessor
+from bot.utils.update_tracker import UpdateTracker
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    """Build a minimal group message update"""
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP)
+    message = Message(message_id=update_id, date=None, chat=chat, text="hi")
+    return Update(update_id=update_id, message=message)
+
+
+async def run_updates(processor, updates, handler):
+    """Dispatch updates the way Application does with concurrent updates"""
+    await processor.initialize()
+    tasks = [
+        asyncio.ensure_future(processor.process_update(update, handler(update)))
+        for update in updates
+    ]
+    await asyncio.gather(*tasks)
+    await processor.shutdown()
+
+
+class TestChatOrderedUpdateProcessor:
+    """Test ChatOrderedUpdateProcessor"""
+
+    @pytest.mark.asyncio
+    async def test_order_kept_within_chat(self):
+        processor = ChatOrderedUpdateProcessor(8)
+        processed = []
+
+        async def handler(update):
+            # Earlier updates sleep longer; ordering must still hold per chat
+            await asyncio.sleep(0.01 * (10 - update.update_id % 10))
+            processed.append((update.effective_chat.id, update.update_id))
+
+        updates = [make_update(i, -1 - i % 3) for i in range(30)]
+        await run_updates(processor, updates, handler)
+
+        for chat_id in (-1, -2, -3):
+            ids = [uid for cid, uid in processed if cid == chat_id]
+            assert ids == sorted(ids)
+        assert processor.waiting_chats == []
+
+    @pytest.mark.asyncio
+    async def test_chats_run_concurrently_within_cap(self):
+        processor = ChatOrderedUpdateProcessor(4)
+        peak = 0
+
+        async def handler(update):
+            nonlocal peak
+            peak = max(peak, processor.active)
+            await asyncio.sleep(0.02)
+
+        updates = [make_update(i, -i) for i in range(12)]
+        await run_updates(processor, updates, handler)
+
+        assert peak == 4
+
+    @pytest.mark.asyncio
+    async def test_queued_updates_hold_back_the_watermark(self):
+        tracker = UpdateTracker(8)
+        processor = ChatOrderedUpdateProcessor(4, tracker=tracker)
+        release = asyncio.Event()
+        started = []
+        watermarks = {}
+
+        async def handler(update):
+            started.append(update.update_id)
+            if update.update_id == 9:
+                await release.wait()
+            tracker.finish(update.update_id)
+            watermarks[update.update_id] = tracker.watermark
+
+        async def release_after_chat_b():
+            while 11 not in watermarks:
+                await asyncio.sleep(0)
+            release.set()
+
+        # 9 and 10 in chat A, 11 in chat B: 11 finishes, then 9 while 10 is
+        # still queued behind it
+        updates = [make_update(9, -1), make_update(10, -1), make_update(11, -2)]
+        await asyncio.gather(run_updates(processor, updates, handler), release_after_chat_b())
+
+        assert started == [9, 11, 10]
+        assert watermarks[11] == 8
+        assert watermarks[9] == 9
+        assert tracker.watermark == 11
+
+    def test_pending_must_cover_concurrency(self):
+        with pytest.raises(ValueError):
+            ChatOrderedUpdateProcessor(8, max_pending_updates=4)
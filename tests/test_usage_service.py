@@ -0,0 +1,104 @@
+"""Tests for LLM usage accounting"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from bot.models.database import Database, init_database
+from bot.services.usage_service import ERROR, FALLBACK, HIT, MISS, UsageService, token_usage
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create test database"""
+    db = Database(str(tmp_path / "test.db"))
+    init_database(db)
+    yield db
+    db.close()
+
+
+def usage_rows(db):
+    return db.fetchone("SELECT COUNT(*) FROM llm_usage")[0]
+
+
+class TestTokenUsage:
+    """Test reading token counts off model responses"""
+
+    def test_usage_metadata(self):
+        message = SimpleNamespace(usage_metadata={"input_tokens": 120, "output_tokens": 30})
+        assert token_usage(message) == (120, 30)
+
+    def test_provider_token_usage(self):
+        message = SimpleNamespace(
+            usage_metadata=None,
+            response_metadata={"token_usage": {"prompt_tokens": 80, "completion_tokens": 12}}
+        )
+        assert token_usage(message) == (80, 12)
+
+    def test_missing(self):
+        assert token_usage(SimpleNamespace()) == (0, 0)
+
+
+class TestUsageService:
+    """Test buffering, batched writes and rollups"""
+
+    def test_records_are_buffered_until_flush(self, db):
+        usage = UsageService(db)
+        usage.record("detect", "small", -100, 0.25, HIT, 100, 20)
+        usage.record("detect", "small", -100, 0.10, MISS, 90, 15)
+        assert usage_rows(db) == 0
+
+        assert usage.flush() == 2
+        assert usage.flush() == 0
+        row = db.fetchone("SELECT * FROM llm_usage WHERE outcome = 'hit'")
+        assert row['group_id'] == -100
+        assert row['latency_ms'] == 250
+        assert row['prompt_tokens'] == 100
+
+    def test_full_buffer_drops(self, db):
+        usage = UsageService(db, max_buffer=2)
+        for _ in range(3):
+            usage.record("detect", "small", 1, 0.1, MISS)
+        assert usage.dropped == 1
+        assert usage.flush() == 2
+
+    def test_rollups(self, db):
+        usage = UsageService(db, prompt_price=1.0, completion_price=3.0)
+        usage.record("detect", "small", -1, 0.1, HIT, 1000, 100)
+        usage.record("detect", "small", -1, 0.3, ERROR)
+        usage.record("detect_batch", "small", -2, 0.2, FALLBACK, 500, 50)
+        usage.flush()
+
+        groups = {row['group_id']: row for row in usage.group_rollup(0)}
+        assert groups[-1]['calls'] == 2
+        assert groups[-1]['errors'] == 1
+        assert groups[-1]['max_latency_ms'] == 300
+        assert groups[-2]['fallbacks'] == 1
+
+        days = usage.daily_rollup(0)
+        assert len(days) == 1
+        assert days[0]['prompt_tokens'] == 1500
+
+        assert usage.cost(1_000_000, 1_000_000) == 4.0
+        text = usage.format_stats(1)
+        assert "By group:" in text and "By day:" in text and "$" in text
+
+    def test_rollups_ignore_old_calls(self, db):
+        usage = UsageService(db)
+        assert "No LLM calls" in usage.format_stats()
+        usage.record("detect", "small", 1, 0.1, MISS)
+        usage.flush()
+        assert usage.group_rollup(int(time.time()) + 60) == []
+
+    @pytest.mark.asyncio
+    async def test_run_flushes_periodically_and_on_cancel(self, db):
+        usage = UsageService(db, flush_interval=0.01)
+        task = asyncio.ensure_future(usage.run())
+        usage.record("detect", "small", 1, 0.1, MISS)
+        await asyncio.sleep(0.05)
+        assert usage_rows(db) == 1
+
+        usage.record("confirmation", "small", 1, 0.1, HIT)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert usage_rows(db) == 2
@@ -27,31 +27,53 @@ def user_service(temp_db):
 class TestUserService:
     """Test UserService"""
     
-    def test_get_by_name(self, user_service):
-        user = user_service.get_by_name("person_a")
-        assert user is not None
-        assert user.name == "person_a"
+    def test_get_or_create_user(self, user_service):
+        user = user_service.get_or_create_user(1, "alice", "Alice")
+        assert user.id is not None
+        assert user.username == "alice"
         assert user.balance == 1000.0
+        
+        again = user_service.get_or_create_user(1, "alice", "Alice")
+        assert again.id == user.id
+        assert user_service.get_user_count() == 1
+    
+    def test_get_or_create_updates_changed_info(self, user_service):
+        user = user_service.get_or_create_user(1, "alice", "Alice")
+        renamed = user_service.get_or_create_user(1, "alice2", "Alice")
+        assert renamed.id == user.id
+        assert renamed.username == "alice2"
+    
+    def test_get_by_username(self, user_service):
+        user_service.get_or_create_user(1, "alice", "Alice")
+        user = user_service.get_by_username("@Alice")
+        assert user is not None
+        assert user.telegram_user_id == 1
+    
+    def test_get_by_username_falls_back_to_names(self, user_service):
+        user_service.get_or_create_user(1, None, "Charlie", "Brown")
+        assert user_service.get_by_username("charlie").telegram_user_id == 1
+        assert user_service.get_by_username("brown").telegram_user_id == 1
+        assert user_service.get_by_username("nobody") is None
+        assert user_service.get_by_username("") is None
     
     def test_get_by_id(self, user_service):
-        user = user_service.get_by_name("person_a")
-        user_by_id = user_service.get_by_id(user.id)
-        assert user_by_id.name == "person_a"
+        user = user_service.get_or_create_user(1, "alice")
+        assert user_service.get_by_id(user.id).username == "alice"
+        assert user_service.get_by_id(999) is None
     
     def test_get_all(self, user_service):
+        user_service.get_or_create_user(1, "alice")
+        user_service.get_or_create_user(2, "bob")
         users = user_service.get_all()
         assert len(users) == 2
-        assert any(u.name == "person_a" for u in users)
-        assert any(u.name == "person_b" for u in users)
+        assert {u.username for u in users} == {"alice", "bob"}
     
-    def test_create_user(self, user_service):
-        new_user = user_service.create("person_c", 500.0)
-        assert new_user.name == "person_c"
-        assert new_user.balance == 500.0
-        assert new_user.id is not None
+    def test_default_balance(self, temp_db):
+        user = UserService(temp_db, default_balance=500.0).get_or_create_user(1, "alice")
+        assert user.balance == 500.0
     
     def test_update_balance(self, user_service):
-        user = user_service.get_by_name("person_a")
+        user = user_service.get_or_create_user(1, "alice")
         success = user_service.update_balance(user.id, 750.0)
         assert success is True
         
@@ -59,18 +81,6 @@ class TestUserService:
         assert updated_user.balance == 750.0
     
     def test_update_balance_negative_fails(self, user_service):
-        user = user_service.get_by_name("person_a")
+        user = user_service.get_or_create_user(1, "alice")
         with pytest.raises(ValueError):
             user_service.update_balance(user.id, -100.0)
-    
-    def test_reset_all_balances(self, user_service):
-        user_service.reset_all_balances(2000.0)
-        users = user_service.get_all()
-        for user in users:
-            assert user.balance == 2000.0
-    
-    def test_delete_user(self, user_service):
-        user = user_service.create("temp_user", 100.0)
-        user_service.delete(user.id)
-        deleted_user = user_service.get_by_id(user.id)
-        assert deleted_user is None
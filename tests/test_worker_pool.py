@@ -0,0 +1,89 @@
+"""Tests for WorkerPool routing and supervision"""
+
+from datetime import datetime, timezone
+import pytest
+from telegram import Chat, Message, Update, User
+from bot.utils.config import BotConfig
+from bot.services import worker_pool
+from bot.services.worker_pool import WorkerPool, worker_index
+
+
+class FakeQueue:
+    """Collects forwarded items"""
+
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+class FakeProcess:
+    """Stands in for a worker process"""
+
+    def __init__(self, alive: bool = True, exitcode=None):
+        self.alive = alive
+        self.exitcode = exitcode
+
+    def is_alive(self):
+        return self.alive
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP)
+    user = User(id=1, first_name="alice", is_bot=False)
+    message = Message(message_id=update_id, date=datetime.now(timezone.utc), chat=chat, from_user=user, text="sent $5 to @bob")
+    return Update(update_id=update_id, message=message)
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(BotConfig(token="test", workers=3, worker_restart_delay=1))
+    pool._queues = [FakeQueue() for _ in range(3)]
+    return pool
+
+
+class TestWorkerPool:
+    """Test WorkerPool"""
+
+    def test_worker_index_is_stable_per_chat(self):
+        assert worker_index(-1001, 4) == worker_index(-1001, 4)
+        assert {worker_index(-1000 - i, 4) for i in range(8)} == {0, 1, 2, 3}
+        assert worker_index(None, 4) == 0
+
+    @pytest.mark.asyncio
+    async def test_forward_routes_by_chat(self, pool):
+        for update_id, chat_id in enumerate([-10, -11, -10, -12, -10]):
+            await pool.forward(make_update(update_id, chat_id), None)
+
+        queue = pool._queues[worker_index(-10, 3)]
+        chat_updates = [item for item in queue.items if item["message"]["chat"]["id"] == -10]
+        assert [item["update_id"] for item in chat_updates] == [0, 2, 4]
+        assert sum(pool.forwarded) == 5
+
+        # The worker rebuilds the same update from the dict
+        update = Update.de_json(queue.items[0], None)
+        assert update.effective_chat.id == -10
+        assert update.effective_message.text == "sent $5 to @bob"
+
+    def test_global_send_rate_is_split(self, pool):
+        assert pool.worker_config.send_global_rate == pytest.approx(10.0)
+
+    def test_crashed_worker_restarts_with_backoff(self, pool, monkeypatch):
+        spawned = []
+        monkeypatch.setattr(pool, "_spawn", lambda index: spawned.append(index))
+        pool._processes = [FakeProcess(), FakeProcess(alive=False, exitcode=1), FakeProcess()]
+        pool._started_at = [0.0, 0.0, 0.0]
+
+        pool.check_workers(10.0)
+        assert spawned == []
+        pool.check_workers(11.0)
+        assert spawned == [1]
+        assert pool.restarts == 1
+
+        # Crashing again soon after waits twice as long
+        pool._restart_at[1] = None
+        pool._started_at[1] = 11.0
+        pool.check_workers(12.0)
+        assert pool._restart_at[1] == pytest.approx(14.0)
+        assert worker_pool.MAX_RESTART_DELAY >= pool._restart_delay[1]